@@ -33,6 +33,8 @@ from cmdb.handlers.agent_handler import agent_urls
 from cmdb.handlers.asset_mongodb_handler import mongodb_urls
 from cmdb.handlers.asset_k8s_cluster_handler import cluster_urls
 from cmdb.handlers.cloud_billing_handler import cloud_billing_urls
+from cmdb.handlers.asset_change_handler import asset_change_urls
+from cmdb.handlers.executor_handler import executor_urls
 
 urls = []
 urls.extend(biz_urls)
@@ -66,4 +68,6 @@ urls.extend(secret_urls)
 urls.extend(agent_urls)
 urls.extend(mongodb_urls)
 urls.extend(cluster_urls)
-urls.extend(cloud_billing_urls)
\ No newline at end of file
+urls.extend(cloud_billing_urls)
+urls.extend(asset_change_urls)
+urls.extend(executor_urls)
\ No newline at end of file
@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Date    : 2026/10/16
+Desc    : 资产变更查询
+"""
+
+from abc import ABC
+from concurrent.futures import ThreadPoolExecutor
+
+from tornado.concurrent import run_on_executor
+
+from libs.base_handler import BaseHandler
+from services.asset_change_service import get_asset_change_list
+
+
+class AssetChangeHandler(BaseHandler, ABC):
+    _thread_pool = ThreadPoolExecutor(3)
+
+    @run_on_executor(executor="_thread_pool")
+    def async_get_change_list(self):
+        return get_asset_change_list(**self.params)
+
+    async def get(self):
+        """按实例ID游标分页查询两天快照之间的变更"""
+        res = await self.async_get_change_list()
+        return self.write(res)
+
+
+asset_change_urls = [
+    (r"/api/v2/cmdb/asset/change/", AssetChangeHandler,
+     {"handle_name": "配置平台-基础功能-资产变更", "method": ["GET"]}),
+]
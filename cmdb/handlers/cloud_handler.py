@@ -16,7 +16,6 @@ from enum import Enum
 from importlib import import_module
 
 from tornado.ioloop import IOLoop
-from concurrent.futures import ThreadPoolExecutor
 from tornado.concurrent import run_on_executor
 from apscheduler.schedulers.tornado import TornadoScheduler
 from apscheduler.jobstores.base import BaseJobStore
@@ -24,6 +23,8 @@ from apscheduler.jobstores.memory import MemoryJobStore
 from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 
 from libs.base_handler import BaseHandler
+from libs.cloud_client import credential_cache
+from libs.incremental_sync import need_full_sync, run_full_sync
 from models.models_utils import get_all_cloud_interval
 from services.cloud_service import opt_obj, get_cloud_settings, get_cloud_sync_log, update_cloud_settings
 from libs.mycrypt import mc
@@ -77,7 +78,13 @@ class CloudModuleLoader:
             try:
                 module_path = self.provider_paths[provider]
                 module = import_module(module_path)
-                self.modules_cache[provider] = {"mapping": getattr(module, "mapping"), "main": getattr(module, "main")}
+                self.modules_cache[provider] = {
+                    "mapping": getattr(module, "mapping"),
+                    "main": getattr(module, "main"),
+                    # 支持增量同步的云厂商提供 incremental_main 以及增量覆盖的资源 INCREMENTAL_RESOURCES
+                    "incremental": getattr(module, "incremental_main", None),
+                    "incremental_resources": getattr(module, "INCREMENTAL_RESOURCES", []),
+                }
             except (ImportError, AttributeError) as e:
                 print(f"导入{provider}模块时出错: {e}")
                 return None
@@ -89,6 +96,16 @@ class CloudModuleLoader:
         module = self.get_module(provider)
         return module["main"] if module else None
 
+    def get_incremental_function(self, provider: str) -> Optional[Callable]:
+        """获取指定云厂商的增量同步函数，不支持增量时返回None"""
+        module = self.get_module(provider)
+        return module["incremental"] if module else None
+
+    def get_incremental_resources(self, provider: str) -> List[str]:
+        """获取增量同步覆盖的资源类型"""
+        module = self.get_module(provider)
+        return module["incremental_resources"] if module else []
+
     def get_resource_mapping(self, provider: str) -> Dict:
         """获取指定云厂商的资源映射"""
         module = self.get_module(provider)
@@ -126,11 +143,32 @@ class CloudService:
 def get_job_func(cloud_name, account_id, _executors):
     def job_func():
         sync_func = cloud_loader.get_sync_function(cloud_name)
-        if sync_func:
-            try:
+        if not sync_func:
+            return
+        incremental_func = cloud_loader.get_incremental_function(cloud_name)
+        try:
+            if not incremental_func:
                 sync_func(account_id=account_id, executors=_executors)
-            except Exception as e:
-                print(f"执行{cloud_name}同步任务出错: {e}")
+                return
+            # 两次全量对账之间只做增量，增量失败时回退到全量
+            if not need_full_sync(account_id):
+                try:
+                    incremental_ok = incremental_func(account_id=account_id)
+                except Exception as e:
+                    incremental_ok = False
+                    logging.error(f"执行{cloud_name}增量同步出错，回退全量同步: {e}")
+                if incremental_ok:
+                    # 增量只覆盖部分资源，其余资源仍按账号的同步间隔全量同步
+                    incremental_resources = cloud_loader.get_incremental_resources(cloud_name)
+                    resources = [
+                        k for k in cloud_loader.get_resource_mapping(cloud_name) if k not in incremental_resources
+                    ]
+                    if resources:
+                        sync_func(account_id=account_id, resources=resources, executors=_executors)
+                    return
+            run_full_sync(cloud_name, account_id, lambda: sync_func(account_id=account_id, executors=_executors))
+        except Exception as e:
+            print(f"执行{cloud_name}同步任务出错: {e}")
 
     return job_func
 
@@ -183,6 +221,8 @@ class CloudSettingHandler(BaseHandler, ABC):
         data = json.loads(self.request.body.decode("utf-8"))
         access_key = data.get("access_key", None).strip()
         res = update_cloud_settings(data)
+        # 密钥可能已变更，清除解密后的凭证缓存
+        credential_cache.invalidate()
 
         add_cloud_jobs()
         if len(access_key) < 110:
@@ -201,6 +241,7 @@ class CloudSettingHandler(BaseHandler, ABC):
         # bool值取反
         new_data["is_enable"] = not is_enable
         res = opt_obj.handle_update(new_data)
+        credential_cache.invalidate()
 
         add_cloud_jobs()
         return self.write(res)
@@ -208,6 +249,7 @@ class CloudSettingHandler(BaseHandler, ABC):
     def delete(self):
         data = json.loads(self.request.body.decode("utf-8"))
         res = opt_obj.handle_delete(data)
+        credential_cache.invalidate()
         add_cloud_jobs()
         return self.write(res)
 
@@ -221,7 +263,7 @@ class SyncLogHandler(BaseHandler, ABC):
 
 
 class CloudSyncHandler(BaseHandler, ABC):
-    _thread_pool = ThreadPoolExecutor(3)
+    _thread_pool = global_executors.get_pool("cloud_manual", 3)
 
     def __init__(self, *args, **kwargs):
         super(CloudSyncHandler, self).__init__(*args, **kwargs)
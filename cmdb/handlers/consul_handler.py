@@ -9,7 +9,8 @@ Desc:  Consul
 import json
 from abc import ABC
 from libs.base_handler import BaseHandler
-from libs.consul_registry import ConsulOpt
+from libs.consul_registry import ConsulOpt, preview_consul_sync
+from libs.thread_pool import global_executors
 from concurrent.futures import ThreadPoolExecutor
 from tornado.concurrent import run_on_executor
 
@@ -54,9 +55,24 @@ class ConsulInstanceHandlers(BaseHandler, ABC):
         return self.write(res)
 
 
+class ConsulSyncDiffHandlers(BaseHandler, ABC):
+    _thread_pool = global_executors.get_pool("consul_preview", 1)
+
+    @run_on_executor(executor='_thread_pool')
+    def async_sync_diff(self):
+        return preview_consul_sync()
+
+    async def get(self):
+        """预览CMDB与consul的差异，不写入consul"""
+        res = await self.async_sync_diff()
+        return self.write(res)
+
+
 consul_urls = [
     (r"/api/v2/cmdb/consul/service/", ConsulServiceHandlers,
      {"handle_name": "配置平台-监控-consul服务列表", "method": ["ALL"]}),
     (r"/api/v2/cmdb/consul/instance/", ConsulInstanceHandlers,
      {"handle_name": "配置平台-监控-consul发现管理", "method": ["ALL"]}),
+    (r"/api/v2/cmdb/consul/sync/diff/", ConsulSyncDiffHandlers,
+     {"handle_name": "配置平台-监控-consul同步差异", "method": ["GET"]}),
 ]
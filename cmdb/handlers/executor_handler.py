@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Date    : 2026/10/16
+Desc    : 后台线程池和Kafka发送状态
+"""
+
+from abc import ABC
+
+from libs.base_handler import BaseHandler
+from libs.kafka_utils import producer
+from libs.thread_pool import global_executors
+
+
+class ExecutorMetricsHandler(BaseHandler, ABC):
+    def get(self):
+        """各线程池排队数、运行数、合并/拒绝次数以及排队和执行耗时分布"""
+        return self.write(dict(code=0, msg="获取成功", data=global_executors.metrics()))
+
+
+class KafkaMetricsHandler(BaseHandler, ABC):
+    def get(self):
+        """发送、投递成功/失败、落盘、重发和死信数量，以及本地队列和落盘文件大小"""
+        return self.write(dict(code=0, msg="获取成功", data=producer.metrics()))
+
+
+executor_urls = [
+    (r"/api/v2/cmdb/executor/metrics/", ExecutorMetricsHandler,
+     {"handle_name": "配置平台-基础功能-线程池状态", "method": ["GET"]}),
+    (r"/api/v2/cmdb/kafka/metrics/", KafkaMetricsHandler,
+     {"handle_name": "配置平台-基础功能-Kafka发送状态", "method": ["GET"]}),
+]
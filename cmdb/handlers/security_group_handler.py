@@ -38,10 +38,10 @@ class SecurityGroupHandler(BaseHandler, ABC):
 
 class SecurityGroupRefsHandler(BaseHandler, ABC):
     def get(self):
-        sg_id = self.params.get('sg_id')
-        asset_type = self.params.get('asset_type', 'server')
+        sg_id = self.params.pop('sg_id', None)
+        asset_type = self.params.pop('asset_type', 'server')
         if asset_type == 'server':
-            res = get_server_for_security_group(sg_id)
+            res = get_server_for_security_group(sg_id, **self.params)
             return self.write(res)
 
         return self.write(dict(code=-1, msg='类型错误'))
@@ -20,7 +20,8 @@ from models.tree import TreeModels, TreeAssetModels
 from websdk2.db_context import DBContext
 from websdk2.model_utils import queryset_to_list
 from services.tree_service import get_biz_name, get_tree_by_api, add_tree_by_api, put_tree_by_api, patch_tree_by_api, \
-    del_tree_by_api, get_tree_info_by_api
+    del_tree_by_api, get_tree_info_by_api, get_tree_etag
+from libs.tree_cache import tree_cache
 from services.tree_asset_service import get_tree_env_list, get_tree_form_env_list, get_tree_form_module_list, \
     get_tree_form_set_list, register_asset, del_tree_asset, get_tree_asset_by_api, add_tree_asset_by_api, \
     update_tree_asset_by_api, get_server_tree_for_api, get_tree_module_list, update_tree_leaf, del_tree_leaf,\
@@ -31,6 +32,13 @@ from models import asset_mapping as mapping
 
 class TreeHandler(BaseHandler, ABC):
     def get(self):
+        # 树未变更时直接返回304，不读取快照
+        etag = get_tree_etag(**self.params)
+        if etag:
+            self.set_header("Etag", etag)
+            if self.check_etag_header():
+                self.set_status(304)
+                return
         res = get_tree_by_api(**self.params)
         return self.write(res)
 
@@ -299,6 +307,7 @@ class TreeRegisterHandler(BaseHandler, ABC):
         self.add_region(server_list)
         self.add_module(server_list)
         self.add_hosts(server_list)
+        tree_cache.bump(*{row['biz_id'] for row in server_list})
 
         return self.write({"code": 0, "msg": "注册成功"})
 
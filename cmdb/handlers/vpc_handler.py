@@ -13,6 +13,7 @@ from abc import ABC
 from libs.base_handler import BaseHandler
 from services.asset_vswitch_service import get_vswitch_list_for_api, opt_obj, update_field
 from services.asset_vpc_service import opt_obj as opt_obj_vpc, get_vpc_list_for_api
+from services.asset_server_service import get_servers_by_relation
 
 
 class AssetVPCHandler(BaseHandler, ABC):
@@ -51,7 +52,24 @@ class AsseVswitchHandler(BaseHandler, ABC):
         self.write(res)
 
 
+class AssetVPCRefsHandler(BaseHandler, ABC):
+    def get(self):
+        vpc_id = self.params.pop('vpc_id', None)
+        res = get_servers_by_relation('vpc', vpc_id, **self.params)
+        return self.write(res)
+
+
+class AssetVswitchRefsHandler(BaseHandler, ABC):
+    def get(self):
+        vswitch_id = self.params.pop('vswitch_id', None)
+        res = get_servers_by_relation('vswitch', vswitch_id, **self.params)
+        return self.write(res)
+
+
 vpc_urls = [
     (r"/api/v2/cmdb/vpc/", AssetVPCHandler, {"handle_name": "CMDB-云商-虚拟局域网管理", "method": ["ALL"]}),
     (r"/api/v2/cmdb/vswitch/", AsseVswitchHandler, {"handle_name": "CMDB-云商-虚拟子网管理", "method": ["ALL"]}),
+    (r"/api/v2/cmdb/vpc/refs/", AssetVPCRefsHandler, {"handle_name": "CMDB-云商-虚拟局域网关联主机", "method": ["GET"]}),
+    (r"/api/v2/cmdb/vswitch/refs/", AssetVswitchRefsHandler,
+     {"handle_name": "CMDB-云商-虚拟子网关联主机", "method": ["GET"]}),
 ]
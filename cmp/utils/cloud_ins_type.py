@@ -8,8 +8,50 @@ Date    : 2023/8/11 16:46
 Desc    : 申购订单
 """
 
+import json
+import logging
+
+from websdk2.cache_context import cache_conn
+from websdk2.configs import configs
+
 from libs.qcloud.utils import QCloudAPI
 from models import TENCENT_LIST
+from models.models_utils import get_cloud_config
+from settings import settings
+
+if configs.can_import:
+    configs.import_dict(**settings)
+
+# 实例类型目录 账号/地域/可用区 -> {实例类型: 配置}
+INS_TYPE_CATALOG_KEY = "cmdb:cmp:ins_type:{}:{}:{}"
+
+
+def _catalog_ttl() -> int:
+    # 两个同步周期内有效，同步失败一次不影响下单
+    return int(configs.get("cmp_catalog_sync_interval", 21600)) * 2
+
+
+def sync_tx_ins_type_catalog(account_id: str = None):
+    """按地域拉取腾讯云全部实例类型配置，按可用区写入Redis"""
+    redis_conn = cache_conn()
+    for conf in get_cloud_config(cloud_name="qcloud", account_id=account_id):
+        for region in [r.strip() for r in (conf.get("region") or "").split(",") if r.strip()]:
+            error, tx_data = QCloudAPI(region=region, account_id=conf["account_id"]).get_cvm_ins_type_configs()
+            if error or not tx_data or tx_data.get("Error"):
+                logging.error(f"同步腾讯云实例类型失败 {conf['account_id']} {region}: {error or tx_data}")
+                continue
+            zones = {}
+            for item in tx_data.get("InstanceTypeConfigSet") or []:
+                zones.setdefault(item["Zone"], {})[item["InstanceType"]] = json.dumps(
+                    dict(cpu=item["CPU"], memory=item["Memory"], gpu=item["GPU"]))
+            pipe = redis_conn.pipeline()
+            for zone, mapping in zones.items():
+                key = INS_TYPE_CATALOG_KEY.format(conf["account_id"], region, zone)
+                pipe.delete(key)
+                pipe.hset(key, mapping=mapping)
+                pipe.expire(key, _catalog_ttl())
+            pipe.execute()
+            logging.info(f"同步腾讯云实例类型 {conf['account_id']} {region} 可用区{len(zones)}个")
 
 
 class CloudInsType:
@@ -21,6 +63,16 @@ class CloudInsType:
         region = data["region"]
         zone = data["zone"]
         instance_type = data["instance_type"]
+        key = INS_TYPE_CATALOG_KEY.format(self.account_id, region, zone)
+        try:
+            cached = cache_conn().hget(key, instance_type)
+        except Exception as err:
+            logging.error(f"读取实例类型目录失败: {err}")
+            cached = None
+        if cached:
+            return dict(msg='获取成功', code=0, data=json.loads(cached))
+
+        # 目录未同步或新上线的实例类型，实时查询后补充到目录
         tx_api = QCloudAPI(region=region, account_id=self.account_id)
         error, tx_data = tx_api.get_cvm_ins_type(zone=zone, instance_type=instance_type)
         if error:
@@ -34,6 +86,13 @@ class CloudInsType:
             memory=tx_config["Memory"],
             gpu=tx_config["GPU"]
         )
+        try:
+            redis_conn = cache_conn()
+            redis_conn.hset(key, instance_type, json.dumps(res_data))
+            if redis_conn.ttl(key) < 0:
+                redis_conn.expire(key, _catalog_ttl())
+        except Exception as err:
+            logging.error(f"写入实例类型目录失败: {err}")
         return dict(msg='获取成功', code=0, data=res_data)
 
     def get_cds_ins_type(self, data):
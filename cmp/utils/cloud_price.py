@@ -7,8 +7,27 @@ Date    : 2023/7/26 10:47
 Desc    : 获取云实例计费
 """
 
+import hashlib
+import json
+import logging
+
+from websdk2.cache_context import cache_conn
+from websdk2.configs import configs
+
 from libs.qcloud.utils import QCloudAPI
 from models import TENCENT_LIST
+from settings import settings
+
+if configs.can_import:
+    configs.import_dict(**settings)
+
+PRICE_CACHE_KEY = "cmdb:cmp:price:{}"
+
+
+def _price_cache_key(account_id: str, region: str, params: dict) -> str:
+    """相同账号、地域和询价参数命中同一个缓存，参数顺序不影响"""
+    raw = json.dumps(dict(account_id=account_id, region=region, params=params), sort_keys=True, default=str)
+    return PRICE_CACHE_KEY.format(hashlib.sha1(raw.encode("utf-8")).hexdigest())
 
 
 class CloudPrice:
@@ -43,6 +62,15 @@ class CloudPrice:
         if disk_type and disk_size:
             params["DataDisks"] = [dict(DiskType=disk_type, DiskSize=disk_size)]
 
+        cache_key = _price_cache_key(self.account_id, region, params)
+        try:
+            cached = cache_conn().get(cache_key)
+        except Exception as err:
+            logging.error(f"读取询价缓存失败: {err}")
+            cached = None
+        if cached:
+            return dict(msg='获取成功', code=0, data=json.loads(cached))
+
         tx_api = QCloudAPI(region=region, account_id=self.account_id)
         error, tx_data = tx_api.get_price_ins(params=params)
         if error:
@@ -58,6 +86,11 @@ class CloudPrice:
             bandwidth_dis_count_price=tx_data["Price"]["BandwidthPrice"]["DiscountPrice"],
             bandwidth_original_price=tx_data["Price"]["BandwidthPrice"]["OriginalPrice"],
         )
+        # 只缓存成功的报价
+        try:
+            cache_conn().set(cache_key, json.dumps(res_data), ex=int(configs.get("cmp_price_cache_ttl", 600)))
+        except Exception as err:
+            logging.error(f"写入询价缓存失败: {err}")
         return dict(msg='获取成功', code=0, data=res_data)
 
     def get_cds_vm_price(self, data):
@@ -1,6 +1,6 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.engine.url import URL
 
 from models.business import Base as BusinessBase
@@ -53,6 +53,28 @@ def create():
     print('[Success] 表结构创建成功!')
 
 
+def upgrade():
+    """create_all 不会修改已有的表，按模型补齐已有表中缺少的列，如同步摘要 content_hash、同步日志的数量统计"""
+    inspector = inspect(engine)
+    bases = (ABase, CloudBase, ServerBase, EventBase, BusinessBase, TagBase, TreeBase, CloudRegionBase, DomainBase,
+             OrderBase, AuditBase, EnvBase, SecretBase, AgentBase, CbbAreaBase)
+    tables = {table.name: table for base in bases for table in base.metadata.sorted_tables}
+    with engine.begin() as conn:
+        for table_name, table in tables.items():
+            if not inspector.has_table(table_name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table_name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                if not column.nullable and column.server_default is None:
+                    print(f'[Warning] {table_name}.{column.name} 不允许为空且没有默认值，请手动添加')
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE `{table_name}` ADD COLUMN `{column.name}` {column_type} NULL'))
+                print(f'[Success] {table_name} 添加列 {column.name}')
+
+
 def drop():
     ABase.metadata.drop_all(engine)
     CloudBase.metadata.drop_all(engine)
@@ -67,3 +89,4 @@ def drop():
 
 if __name__ == '__main__':
     create()
+    upgrade()
@@ -10,6 +10,7 @@ Desc    : 云解析DNS记录
 import time
 import datetime
 import logging
+from collections import defaultdict
 from typing import *
 from shortuuid import uuid
 from concurrent.futures import ThreadPoolExecutor
@@ -17,6 +18,7 @@ from websdk2.configs import configs
 from websdk2.model_utils import queryset_to_list, insert_or_update
 from websdk2.db_context import DBContext
 from sqlalchemy import event
+from sqlalchemy.dialects.mysql import insert as mysql_insert
 
 from models.domain import DomainOptLog
 from models.domain import DomainName, DomainRecords, DomainSyncLog
@@ -27,6 +29,8 @@ from libs.domain.qcloud_domain import QCloud
 from libs.domain.godaddy_domain import GoDaddy
 from libs.domain.aliyun_domain import AliYun
 from libs.kafka_utils import producer
+from libs.search_index import index_rows
+from libs.sync_scheduler import sync_scheduler
 from libs.thread_pool import global_executors
 
 from settings import settings
@@ -121,15 +125,7 @@ def domain_main(cloud_name):
         try:
             domain_list = obj.describe_domains()
             if not domain_list: return
-            for domain in domain_list:
-                # print(domain, cloud_name, account_id, domain)
-                data_sync_domain(cloud_name, account_id, domain)
-                if isinstance(domain, dict):
-                    record_list = obj.record_generator(**domain)
-                else:
-                    record_list = obj.record_generator(domain)
-                data_sync_record(cloud_name, account_id, record_list)
-
+            sync_domains(obj, cloud_name, account_id, domain_list)
         except Exception as err:
             with DBContext('w', None, True) as session:
                 session.add(DomainSyncLog(present=f'{cloud_name} DNS', alias_name=name,
@@ -141,6 +137,33 @@ def domain_main(cloud_name):
                                       access_id=account_id, state="正常", record='同步结束，耗时： %.3f s' % duration))
 
 
+def sync_domains(obj, cloud_name: str, account_id: str, domain_list: list) -> None:
+    """
+    并发同步账号下的域名，每个域名申请一次云厂商令牌，限流配置同云资产同步
+    """
+
+    def sync_one(domain):
+        sync_scheduler.acquire(cloud_name, account_id)
+        sync_start = datetime.datetime.now()
+        data_sync_domain(cloud_name, account_id, domain)
+        if isinstance(domain, dict):
+            record_list = obj.record_generator(**domain)
+        else:
+            record_list = obj.record_generator(domain)
+        seen_records = data_sync_record(cloud_name, account_id, record_list)
+        # 记录全部拉取成功后，每个域名对账一次
+        for domain_name, record_ids in seen_records.items():
+            mark_expired(DomainRecords, domain_name=domain_name, seen_record_ids=record_ids, sync_start=sync_start)
+
+    max_workers = int(configs.get("domain_sync_workers", 5))
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="domain-sync") as executor:
+        futures = [executor.submit(sync_one, domain) for domain in domain_list]
+        errors = [f.exception() for f in futures if f.exception()]
+    if errors:
+        # 单个域名失败不影响其他域名，汇总后由调用方记录同步日志
+        raise Exception(f"{len(errors)}个域名同步失败: {errors[0]}")
+
+
 def data_sync_domain(cloud_name, account_id, domain):
     with DBContext('w', None, True) as session:
         if cloud_name in ['阿里云', 'aliyun', 'AliYun']:
@@ -228,120 +251,145 @@ def data_sync_domain(cloud_name, account_id, domain):
             pass
 
 
-def data_sync_record(cloud_name, account_id, record_list):
+# 解析记录已存在时更新的字段，行中没有的字段(厂商不提供)不更新，保留CMDB中的值
+RECORD_UPDATE_COLUMNS = ('domain_name', 'domain_rr', 'domain_type', 'domain_value', 'domain_ttl', 'domain_mx',
+                         'line', 'weight', 'state', 'remark', 'account', 'update_time')
+
+
+def _record_row(cloud_name: str, account_id: str, domain_name: str, record) -> Optional[dict]:
+    """
+    将云上的解析记录转换为DomainRecords的列，GoDaddy没有记录ID，由调用方补充
+    厂商不提供的字段不放入行中，新增时取表默认值，已有记录不覆盖
+    """
+    if cloud_name in ['阿里云', 'aliyun', 'AliYun']:
+        return dict(domain_name=domain_name,
+                    record_id=record.get('RecordId'),
+                    domain_rr=record.get('RR', ''),
+                    domain_type=record.get('Type', ''),
+                    domain_value=record.get('Value', ''),
+                    domain_ttl=int(record.get('TTL', 600)),
+                    domain_mx=int(record.get('Weight', 0)),
+                    line=record.get('Line', 'unknown'),
+                    state=record.get('Status', 'unknown'),
+                    remark=record.get('Remark', 'unknown'),
+                    account=account_id)
+
+    elif cloud_name in ['腾讯云', 'qcloud', 'QCloud', 'dnspod', 'DNSPod']:
+        return dict(domain_name=domain_name,
+                    record_id=str(record.RecordId),
+                    domain_rr=record.Name,
+                    domain_type=record.Type,
+                    domain_value=record.Value,
+                    domain_ttl=record.TTL,
+                    domain_mx=record.MX,
+                    line=record.Line,
+                    weight=record.Weight,
+                    state='DISABLE' if record.Status == 'DISABLE' else 'ENABLE',
+                    remark=record.Remark,
+                    account=account_id)
+
+    elif cloud_name in ['GoDaddy', 'godaddy']:
+        return dict(domain_name=domain_name,
+                    record_id=None,
+                    domain_rr=record.get('name', ''),
+                    domain_type=record.get('type', ''),
+                    domain_value=record.get('data', ''),
+                    domain_ttl=int(record.get('ttl', 600)),
+                    domain_mx=int(record.get('mx', 0)),
+                    line=record.get('line', 'default'),
+                    state=record.get('status', 'ENABLE'),
+                    account=account_id)
+    return None
+
+
+def data_sync_record(cloud_name, account_id, record_list) -> Dict[str, Set[str]]:
+    """
+    批量写入解析记录
+    :return: {域名: 本次同步到的记录ID}
+    """
+    rows_by_domain: Dict[str, Dict[str, dict]] = defaultdict(dict)
+    no_id_rows: Dict[str, List[dict]] = defaultdict(list)
+    for record_info in record_list:
+        domain_name = record_info.get('domain_name')
+        try:
+            row = _record_row(cloud_name, account_id, domain_name, record_info.get('data_dict'))
+        except Exception as err:
+            logging.error(f'{cloud_name} 解析域名记录出错 {err}')
+            continue
+        if not row:
+            continue
+        if row['record_id']:
+            rows_by_domain[domain_name][row['record_id']] = row
+        else:
+            no_id_rows[domain_name].append(row)
+
+    now = datetime.datetime.now()
+    batch_size = int(configs.get("sync_upsert_batch_size", 500))
     with DBContext('w', None, True) as session:
-        for record_info in record_list:
-            domain_name = record_info.get('domain_name')
-            record = record_info.get('data_dict')
-            if cloud_name in ['阿里云', 'aliyun', 'AliYun']:
-                try:
-                    record_id = record.get('RecordId')
-                    session.add(
-                        insert_or_update(DomainRecords, f"domain_name='{domain_name}' and record_id='{record_id}'",
-                                         domain_name=domain_name,
-                                         record_id=record_id,
-                                         domain_rr=record.get('RR', ''),
-                                         domain_type=record.get('Type', ''),
-                                         domain_value=record.get('Value', ''),
-                                         domain_ttl=int(record.get('TTL', 600)),
-                                         domain_mx=int(record.get('Weight', 0)),
-                                         line=record.get('Line', 'unknown'),
-                                         state=record.get('Status', 'unknown'),
-                                         remark=record.get('Remark', 'unknown'),
-                                         account=account_id))
-                    # session.commit()
-                except Exception as err:
-                    logging.info(f'{cloud_name} 更新域名记录出错 {err}')
-
-            elif cloud_name in ['腾讯云', 'qcloud', 'QCloud', 'dnspod', 'DNSPod']:
-                record_id = str(record.RecordId)
-                state = 'DISABLE' if record.Status == 'DISABLE' else 'ENABLE'
-                try:
-                    session.add(
-                        insert_or_update(DomainRecords, f"domain_name='{domain_name}' and record_id='{record_id}'",
-                                         domain_name=domain_name, record_id=record_id,
-                                         domain_rr=record.Name,
-                                         domain_type=record.Type,
-                                         domain_value=record.Value,
-                                         domain_ttl=record.TTL,
-                                         domain_mx=record.MX,
-                                         line=record.Line,
-                                         weight=record.Weight,
-                                         state=state,
-                                         remark=record.Remark,
-                                         account=account_id
-                                         ))
-                    # session.commit()
-                except Exception as err:
-                    logging.error(f'{cloud_name} 更新域名记录出错 {err}')
-
-            elif cloud_name == 'GoDaddy':
-                record_ex = session.query(DomainRecords).filter(DomainRecords.domain_rr == record.get('name'),
-                                                                DomainRecords.domain_type == record.get('type'),
-                                                                DomainRecords.domain_value == record.get('data'),
-                                                                DomainRecords.account == account_id,
-                                                                DomainRecords.domain_name == domain_name).first()
-
-                if record_ex:
-                    session.query(DomainRecords).filter(DomainRecords.domain_rr == record.get('name'),
-                                                        DomainRecords.domain_type == record.get('type'),
-                                                        DomainRecords.domain_value == record.get('data'),
-                                                        DomainRecords.account == account_id,
-                                                        DomainRecords.domain_name == domain_name).update(
-                        {
-                            DomainRecords.domain_rr: record.get('name', ''),
-                            DomainRecords.domain_type: record.get('type', ''),
-                            DomainRecords.domain_value: record.get('data', ''),
-                            DomainRecords.domain_ttl: int(record.get('ttl', 600)),
-                            DomainRecords.domain_mx: record.get('mx', 0),
-                            DomainRecords.line: record.get('line', 'default'),
-                            DomainRecords.state: record.get('status', 'ENABLE'),
-                            DomainRecords.account: account_id})
-                else:
-                    new_record = DomainRecords(domain_name=domain_name,
-                                               record_id=str(uuid()),
-                                               domain_rr=record.get('name', ''),
-                                               domain_type=record.get('type', ''),
-                                               domain_value=record.get('data', ''),
-                                               domain_ttl=int(record.get('ttl', 600)),
-                                               domain_mx=int(record.get('mx', 0)),
-                                               line=record.get('line', 'default'),
-                                               state=record.get('status', 'ENABLE'),
-                                               account=account_id)
-                    session.add(new_record)
-            ##
-            mark_expired(DomainRecords, domain_name=domain_name, record_id=record_id)
-
-
-def mark_expired(resource_model, domain_name: Optional[str], record_id: Optional[str]):
+        # GoDaddy按 主机记录+类型+值 匹配已有记录，沿用已有记录ID
+        for domain_name, rows in no_id_rows.items():
+            existing = {(rr, t, v): record_id for rr, t, v, record_id in session.query(
+                DomainRecords.domain_rr, DomainRecords.domain_type, DomainRecords.domain_value,
+                DomainRecords.record_id).filter(DomainRecords.account == account_id,
+                                                DomainRecords.domain_name == domain_name)}
+            for row in rows:
+                key = (row['domain_rr'], row['domain_type'], row['domain_value'])
+                row['record_id'] = existing.setdefault(key, str(uuid()))
+                rows_by_domain[domain_name][row['record_id']] = row
+
+        for domain_name, rows in rows_by_domain.items():
+            # 只有新增或搜索字段变化的记录需要重建搜索索引
+            indexed = {record_id: (rr, value, remark) for record_id, rr, value, remark in session.query(
+                DomainRecords.record_id, DomainRecords.domain_rr, DomainRecords.domain_value,
+                DomainRecords.remark).filter(DomainRecords.domain_name == domain_name)}
+            rows = list(rows.values())
+            # 同一厂商的行字段相同，按行中实际存在的字段更新
+            update_columns = [c for c in RECORD_UPDATE_COLUMNS if c == 'update_time' or c in rows[0]]
+            for i in range(0, len(rows), batch_size):
+                stmt = mysql_insert(DomainRecords).values(
+                    [dict(row, create_time=now, update_time=now) for row in rows[i:i + batch_size]])
+                session.execute(stmt.on_duplicate_key_update({c: stmt.inserted[c] for c in update_columns}))
+            # 行中没有备注时索引沿用库中的备注，新增记录为表默认值
+            docs = [dict(row, remark=row['remark'] if 'remark' in row else
+                         indexed.get(row['record_id'], (None, None, 'unknown'))[2]) for row in rows]
+            index_rows(session, "dns", [
+                doc for doc in docs if indexed.get(doc['record_id']) != (
+                    doc.get('domain_rr'), doc.get('domain_value'), doc.get('remark'))])
+    return {domain_name: set(rows) for domain_name, rows in rows_by_domain.items()}
+
+
+def mark_expired(resource_model, domain_name: Optional[str], seen_record_ids: Set[str],
+                 sync_start: datetime.datetime):
     """
-    根据时间标记过期的数据
+    按域名对账一次：本次没有同步到的记录超过2小时未更新标记过期，过期超过2小时删除
+    本次同步到的记录刚刷新了 update_time，按时间过滤时不会被选中
     """
+    # 2小时
+    _hours_ago = min(datetime.datetime.now() - datetime.timedelta(hours=2), sync_start)
     with DBContext('w', None, True, **settings) as session:
-        # 2小时
-        _hours_ago = datetime.datetime.now() - datetime.timedelta(hours=2)
         # 过期
-        session.query(resource_model).filter(
-            resource_model.domain_name == domain_name, record_id == record_id, resource_model.state != '过期',
-            resource_model.update_time <= _hours_ago).update({resource_model.state: '过期'})
+        expired_count = session.query(resource_model).filter(
+            resource_model.domain_name == domain_name, resource_model.state != '过期',
+            resource_model.update_time <= _hours_ago).update({resource_model.state: '过期'},
+                                                             synchronize_session=False)
 
-        records_to_delete = session.query(resource_model).filter(
-            resource_model.domain_name == domain_name, record_id == record_id,
-            resource_model.state == '过期', resource_model.update_time <= _hours_ago).all()
+        records_to_delete = session.query(
+            resource_model.id, resource_model.record_id, resource_model.domain_rr, resource_model.domain_value,
+            resource_model.domain_type).filter(
+            resource_model.domain_name == domain_name, resource_model.state == '过期',
+            resource_model.update_time <= _hours_ago).all()
 
         for r in records_to_delete:
             logging.warning(
-                f'删除{domain_name} 记录ID：{record_id} 记录：{r.domain_rr}，值：{r.domain_value}，类型：{r.domain_type}')
-            session.delete(r)
-        # session.query(resource_model).filter(resource_model.domain_name == domain_name, record_id == record_id,
-        #                                      resource_model.state == '过期',
-        #                                      resource_model.update_time <= _hours_ago).delete(
-        #     synchronize_session=False)
+                f'删除{domain_name} 记录ID：{r.record_id} 记录：{r.domain_rr}，值：{r.domain_value}，类型：{r.domain_type}')
+        if records_to_delete:
+            session.query(resource_model).filter(resource_model.id.in_([r.id for r in records_to_delete])).delete(
+                synchronize_session=False)
+    logging.info(f'{domain_name} 同步记录{len(seen_record_ids)}条，标记过期{expired_count}条，删除{len(records_to_delete)}条')
 
 
 def async_domain_info():
-    executor = global_executors.general_executor
-    executor.submit(all_domain_sync_index)
+    global_executors.submit_unique("domain", all_domain_sync_index)
 
 
 @event.listens_for(DomainOptLog, "after_insert")
@@ -363,6 +411,10 @@ def after_opt_log_insert(mapper, connection, target):
         except Exception as e:
             logging.error(f"发送操作日志到Kafka失败: {e}")
 
+    if producer.is_async:
+        # 异步模式下 send 只入本地队列，不占用通用线程池
+        send_message(target)
+        return
     executor = global_executors.general_executor
     executor.submit(send_message, target)
 
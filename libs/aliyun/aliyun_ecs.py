@@ -9,10 +9,12 @@ Desc   : 阿里云  ECS
 
 import json
 import logging
+from functools import partial
 from typing import *
 from aliyunsdkcore.client import AcsClient
 from aliyunsdkecs.request.v20140526.DescribeInstancesRequest import DescribeInstancesRequest
-from models.models_utils import server_task, mark_expired, server_task_batch, mark_expired_by_sync
+from libs.async_collector import AsyncCollector
+from models.models_utils import server_task, mark_expired, server_task_batch, mark_expired_by_sync, get_all_agent_info
 
 
 def get_run_type(val: str) -> str:
@@ -60,31 +62,41 @@ def get_outer_ip(outer_ip_list) -> str:
     return outer_ip
 
 
-class AliyunEcsClient:
+class AliyunEcsClient(AsyncCollector):
+    paging = "page"
+
     def __init__(self, access_id: str, access_key: str, region: str, account_id: str):
-        self.page_number = 1  # 实例状态列表的页码。起始值：1 默认值：1
         self.page_size = 100  # 分页查询时设置的每页行数。最大值：100 默认值：10
         self._access_id = access_id
         self._access_key = access_key
         self._region = region
         self._accountID = account_id
-        self.__client = AcsClient(self._access_id, self._access_key, self._region)
 
-    def get_describe_info(self) -> Union[None, dict]:
+    def make_client(self):
+        return AcsClient(self._access_id, self._access_key, self._region)
+
+    def describe_page(self, page_number: int) -> Tuple[list, Optional[int]]:
         """
-        :return: bool, data, ToTal
+        获取一页ECS信息
+        :return: 当前页实例, 实例总数
         """
-        try:
-            request = DescribeInstancesRequest()
-            # request.set_accept_format('json')
-            request.set_PageNumber(self.page_number)
-            request.set_PageSize(self.page_size)
-            response = self.__client.do_action_with_exception(request)
-            response_data = json.loads(str(response, encoding="utf8"))
-        except Exception as err:
-            logging.error(f'获取ECS信息失败:{err}')
-            return None
-        return response_data['Instances']
+        request = DescribeInstancesRequest()
+        request.set_PageNumber(page_number)
+        request.set_PageSize(self.page_size)
+        response = self.client.do_action_with_exception(request)
+        response_data = json.loads(str(response, encoding="utf8"))
+        return response_data['Instances']['Instance'], response_data.get('TotalCount')
+
+    def describe_instances(self, instance_ids: List[str]) -> list:
+        """
+        按实例ID查询ECS，单次最多100个
+        """
+        request = DescribeInstancesRequest()
+        request.set_InstanceIds(json.dumps(instance_ids))
+        request.set_PageSize(self.page_size)
+        response = self.client.do_action_with_exception(request)
+        response_data = json.loads(str(response, encoding="utf8"))
+        return response_data['Instances']['Instance']
 
     def format_data(self, data: Optional[dict]) -> Dict[str, Any]:
         """
@@ -96,6 +108,7 @@ class AliyunEcsClient:
         res: Dict[str, Any] = {}
         vpc_id = data.get('VpcAttributes', {}).get('VpcId', '')
         res['vpc_id'] = vpc_id
+        res['vswitch_id'] = data.get('VpcAttributes', {}).get('VSwitchId', '')
         res['instance_id'] = data.get('InstanceId')
         res['state'] = get_run_type(data.get('Status'))
         res['instance_type'] = data.get('InstanceType')
@@ -141,44 +154,26 @@ class AliyunEcsClient:
 
         return res
 
-    def get_all_ecs(self):
+    def get_all_ecs(self) -> List[Dict[str, Any]]:
         """
-        循环分页获取所有的ECS信息，返回迭代器
+        并发分页获取所有的ECS信息
         """
-        self.page_number = 1
-        while True:
-            data = self.get_describe_info()
-            if not data or 'Instance' not in data: break
-            if not data['Instance']: break
-            self.page_number += 1
-            row = data['Instance']
-            if not row: break
-            yield map(self.format_data, row)
-
-    def sync_cmdb(self, cloud_name: Optional[str] = 'aliyun', resource_type: Optional[str] = 'server') -> Tuple[
-        bool, str]:
+        try:
+            return self.collect_all()
+        except Exception as err:
+            logging.error(f'获取ECS信息失败:{err}')
+            return []
+
+    async def sync_cmdb_async(
+            self, cloud_name: Optional[str] = 'aliyun', resource_type: Optional[str] = 'server'
+    ) -> Tuple[bool, str]:
         """
         同步CMDB
         :return:
         """
-        # 所有的ECS对象，是一个迭代器
-        all_ecs: Generator[map] = self.get_all_ecs()
-        # 处理到一个List里面
-        all_server_list: List[dict] = []
-        for _server_map in all_ecs:
-            all_server_list.extend(list(_server_map))
-
-        if not all_server_list: return False, "ECS列表为空"
-        # 更新资源
-        # ret_state, ret_msg = server_task(account_id=self._accountID, cloud_name=cloud_name, rows=all_server_list)
-        # 标记过期
-        # mark_expired(resource_type=resource_type, account_id=self._accountID)
-        ret_state, ret_msg = server_task_batch(account_id=self._accountID, cloud_name=cloud_name, rows=all_server_list)
-        instance_ids = [row['instance_id'] for row in all_server_list]
-        mark_expired_by_sync(cloud_name=cloud_name, account_id=self._accountID, resource_type=resource_type,
-                             instance_ids=instance_ids, region=self._region)
-
-        return ret_state, ret_msg
+        # 分页边采集边入库，采集完成后标记过期
+        task = partial(server_task_batch, all_agent_info=get_all_agent_info())
+        return await self.stream_to_cmdb_async(task, cloud_name, self._accountID, resource_type, region=self._region)
 
 
 if __name__ == '__main__':
@@ -16,6 +16,7 @@ from models.asset import AssetServerModels, AssetMySQLModels, AssetRedisModels
 from websdk2.db_context import DBContext
 from models.models_utils import cloud_event_task
 from aliyunsdkcore.client import AcsClient
+from aliyunsdkcore.request import CommonRequest
 from aliyunsdkecs.request.v20140526.DescribeInstanceHistoryEventsRequest import DescribeInstanceHistoryEventsRequest
 from aliyunsdkpolardb.request.v20170801.DescribePendingMaintenanceActionRequest import \
     DescribePendingMaintenanceActionRequest
@@ -130,6 +131,43 @@ class AliyunEventClient:
         if not res_list: return []
         return list(map(self._redis_format, res_list))
 
+    def get_changed_instance_ids(self, start_time: datetime.datetime, end_time: datetime.datetime,
+                                 resource_type: Optional[str] = 'ACS::ECS::Instance') -> Dict[str, Set[str]]:
+        """
+        调用操作审计LookupEvents查询时间段内有写操作的实例，用于增量同步
+        :return: {region: {instance_id}}
+        """
+        utc_format = "%Y-%m-%dT%H:%M:%SZ"
+        instance_ids: Set[str] = set()
+        next_token = None
+        while True:
+            request = CommonRequest()
+            request.set_accept_format('json')
+            request.set_domain(f'actiontrail.{self._region}.aliyuncs.com')
+            request.set_method('POST')
+            request.set_version('2020-07-06')
+            request.set_action_name('LookupEvents')
+            request.add_query_param('StartTime', start_time.astimezone(datetime.timezone.utc).strftime(utc_format))
+            request.add_query_param('EndTime', end_time.astimezone(datetime.timezone.utc).strftime(utc_format))
+            request.add_query_param('LookupAttribute.1.Key', 'ResourceType')
+            request.add_query_param('LookupAttribute.1.Value', resource_type)
+            request.add_query_param('MaxResults', 50)
+            if next_token:
+                request.add_query_param('NextToken', next_token)
+            response = self.__client.do_action_with_exception(request)
+            response = json.loads(str(response, encoding="utf8"))
+            for event in response.get('Events') or []:
+                if event.get('eventRW') == 'Read':
+                    continue
+                # resourceName 可能包含多个资源，以分号分隔
+                for name in (event.get('resourceName') or '').split(';'):
+                    if name.startswith('i-'):
+                        instance_ids.add(name)
+            next_token = response.get('NextToken')
+            if not next_token:
+                break
+        return {self._region: instance_ids}
+
     @staticmethod
     def _get_instance_name(service: Optional[str], intanceid: Optional[str]) -> Union[str]:
         """
@@ -31,6 +31,14 @@ class AssetAPI(JumpServerBaseAPI):
             return [item for item in result if item['full_value'] == name]
         return result
 
+    def list_all(self, org_id: str = None) -> List[dict]:
+        """
+        分页获取组织下全部节点
+        :param org_id: 组织id
+        :return:
+        """
+        return super().list_all(url=f'{self.base_url}/api/v1/assets/nodes/', org_id=org_id)
+
     def create(self, name: str = None, parent_id: str = None, org_id: str = None) -> List[dict]:
         """
         创建节点
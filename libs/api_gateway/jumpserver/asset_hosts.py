@@ -66,6 +66,26 @@ class AssetHostsAPI(JumpServerBaseAPI):
                                  url=f'{self.base_url}/api/v1/assets/hosts/',
                                  data=data, org_id=kwargs.get('org_id', None))
 
+    def list_all(self, org_id: str = None, **params) -> List[dict]:
+        """
+        分页获取组织下全部主机资产
+        :param org_id: 组织id
+        :return:
+        """
+        return super().list_all(url=f'{self.base_url}/api/v1/assets/hosts/', params=params, org_id=org_id)
+
+    def update(self, asset_id: str = None, org_id: str = None, **kwargs) -> dict:
+        """
+        更新主机资产的节点和网域
+        :param asset_id: 资产id
+        :param org_id: 组织id
+        :return:
+        """
+        assert asset_id is not None, '资产id不能为空'
+        data = {k: kwargs[k] for k in ('name', 'address', 'nodes', 'domain') if k in kwargs}
+        return self.send_request(method='patch', org_id=org_id, data=data,
+                                 url=f'{self.base_url}/api/v1/assets/hosts/{asset_id}/')
+
     def delete(self, asset_id: str = None,  org_id: str = None) -> List[dict]:
         """
         删除主机资产
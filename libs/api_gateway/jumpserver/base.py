@@ -5,12 +5,14 @@
 
 from datetime import datetime
 import logging
+import threading
 import time
 from functools import wraps
-from typing import Type, Tuple
+from typing import List, Type, Tuple
 
 import requests
 from httpsig import requests_auth
+from requests.adapters import HTTPAdapter
 from websdk2.consts import const
 
 from settings import settings as app_settings
@@ -36,6 +38,10 @@ def retry_on_exception(retries=2, delay=0.5, exceptions: Tuple[Type[Exception]]
 class JumpServerBaseAPI:
 
     DEFAULT_ORG_ID = '00000000-0000-0000-0000-000000000002'
+    # 所有API实例共享一个连接池，复用到JumpServer的HTTPS连接
+    _session = None
+    _session_lock = threading.Lock()
+    pool_size = int(app_settings.get('jms_sync_workers', 10))
 
     def __init__(self, timeout=30, org_id=None):
         self.jms_dict = app_settings[const.JMS_CONFIG_ITEM]
@@ -47,11 +53,25 @@ class JumpServerBaseAPI:
         self.timeout = timeout
         self.org_id = org_id or self.DEFAULT_ORG_ID
 
+    @property
+    def session(self) -> requests.Session:
+        with JumpServerBaseAPI._session_lock:
+            if JumpServerBaseAPI._session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                JumpServerBaseAPI._session = session
+            return JumpServerBaseAPI._session
+
     @property
     def auth(self):
-        signature_headers = ['(request-target)', 'accept', 'date']
-        return requests_auth.HTTPSignatureAuth(key_id=self.key_id, secret=self.secret, algorithm='hmac-sha256',
-                                               headers=signature_headers)
+        # 签名对象只创建一次，每个请求仍按各自的 Date 头签名
+        if getattr(self, '_auth', None) is None:
+            signature_headers = ['(request-target)', 'accept', 'date']
+            self._auth = requests_auth.HTTPSignatureAuth(key_id=self.key_id, secret=self.secret,
+                                                         algorithm='hmac-sha256', headers=signature_headers)
+        return self._auth
 
     @property
     def headers(self):
@@ -75,9 +95,40 @@ class JumpServerBaseAPI:
             headers['X-JMS-ORG'] = org_id
 
         try:
-            response = getattr(requests, method.lower())(url=url, params=params, headers=headers, auth=auth, json=data,
-                                                         timeout=self.timeout)
+            response = self.session.request(method.upper(), url=url, params=params, headers=headers, auth=auth,
+                                            json=data, timeout=self.timeout)
             return response.json() if response.status_code != 204 else response.ok
         except requests.RequestException as e:
             logging.error(f"请求JumpSever发生异常: {e}, url: {url}, params:{params}, data:{data}, method: {method}")
             raise
+
+    def list_all(self, url: str, params: dict = None, org_id: str = None, page_size: int = 500) -> List[dict]:
+        """
+        按 limit/offset 分页拉取列表接口的全部数据
+        :param url: 列表接口地址
+        :param params: 查询参数
+        :param org_id: 组织id
+        :param page_size: 每页数量
+        :return:
+        """
+        items: List[dict] = []
+        offset = 0
+        while True:
+            page_params = dict(params or {}, limit=page_size, offset=offset)
+            result = self.send_request(method='get', url=url, params=page_params, org_id=org_id)
+            if result is False:
+                raise requests.RequestException(f"分页拉取失败: {url}, offset: {offset}")
+            # 不支持分页的接口直接返回列表
+            if isinstance(result, list):
+                return result
+            # 401/403/500 等错误也会返回 JSON，不能当作最后一页，否则调用方会把缺失的数据当作需要新建
+            if not isinstance(result, dict) or 'results' not in result or 'count' not in result:
+                raise requests.RequestException(f"分页拉取返回异常: {url}, offset: {offset}, result: {result}")
+            results = result['results'] or []
+            count = int(result['count'] or 0)
+            if not results and offset < count:
+                raise requests.RequestException(f"分页拉取数据不完整: {url}, offset: {offset}, count: {count}")
+            items.extend(results)
+            offset += len(results)
+            if not results or not result.get('next') or offset >= count:
+                return items
@@ -11,21 +11,16 @@ import traceback
 
 import requests
 from jinja2 import Template
-from sqlalchemy import inspect
 
 from websdk2.configs import configs
-from websdk2.consts import const
 from websdk2.db_context import DBContextV2 as DBContext
-from websdk2.sqlalchemy_pagination import paginate
 
 from websdk2.tools import RedisLock
-from db_sync import engine, default_configs
 from libs import deco
+from libs.asset_snapshot import AssetSnapshot, AssetSnapshotDiff, get_model_columns_map
 from libs.scheduler import scheduler
-from libs.utils import human_date
 from models import asset_mapping, RES_TYPE_MAP
-from models.asset import AssetServerModels, AssetBackupModels
-from services.asset_server_service import _models_to_list
+from models.asset import AssetBackupModels
 
 
 class AssetChangeNotify:
@@ -40,10 +35,7 @@ class AssetChangeNotify:
         @param model: model对象
         @return: {字段名：字段说明}
         """
-        inspect_resp = inspect(engine)
-        model_mate = inspect_resp.get_columns(model.__tablename__,
-                                              schema=default_configs.get(const.DBNAME_KEY))  # 表名，库名
-        return {field["name"]: field["comment"] for field in model_mate}
+        return get_model_columns_map(model)
 
     def __delete_data(self, days=None) -> None:
         """
@@ -51,20 +43,14 @@ class AssetChangeNotify:
         @param days: 需要删除的日期
         @return:
         """
-        if days is None:
-            dest_date = (datetime.datetime.now() - datetime.timedelta(days=60)).strftime("%Y-%m-%d")
-        else:
-            dest_date = (datetime.datetime.now() - datetime.timedelta(days=days)).strftime("%Y-%m-%d")
-
-        with DBContext('w', None, True) as session:
-            session.query(AssetBackupModels).filter(AssetBackupModels.asset_type == self.asset_type,
-                                                    AssetBackupModels.created_day < dest_date).delete(synchronize_session=False)
+        AssetSnapshot(self.asset_type).cleanup(days)
         return
 
-    def get_cmdb_change_day(self, dest_date=None) -> dict:
+    def get_cmdb_change_day(self, dest_date=None, src_date=None) -> dict:
         """
         根据时间和资源类型，比对差异内容并发送通知
         :param dest_date: 需要对比目标日期， 默认是昨天; 格式：2023-11-01
+        :param src_date: 对比的基准日期，默认是今天
         :return: dict()
         """
         # 删除过期的数据
@@ -72,83 +58,50 @@ class AssetChangeNotify:
 
         if dest_date is None:
             dest_date = (datetime.datetime.now() - datetime.timedelta(days=1)).strftime("%Y-%m-%d")
+        if src_date is None:
+            src_date = datetime.datetime.today().strftime("%Y-%m-%d")
 
-        today = datetime.datetime.today().strftime("%Y-%m-%d")
         with DBContext('r', None, True) as session:
-            today_obj = session.query(AssetBackupModels).filter(AssetBackupModels.asset_type == self.asset_type,
-                                                                AssetBackupModels.created_day == today).all()
-            dest_date_obj = session.query(AssetBackupModels).filter(AssetBackupModels.asset_type == self.asset_type,
-                                                                    AssetBackupModels.created_day == dest_date).all()
-
-            if not dest_date_obj or not today_obj:
-                return dict()
+            for day in (src_date, dest_date):
+                has_snapshot = session.query(AssetBackupModels.id).filter(
+                    AssetBackupModels.asset_type == self.asset_type, AssetBackupModels.created_day == day).first()
+                if not has_snapshot:
+                    return dict()
             # 根据资源类型获取资源model对象
             asset_model = asset_mapping.get(self.asset_type)
-
-            dest_data = {i.instance_id: json.loads(i.data) for i in dest_date_obj}
-            # 字段的描述映射
-            columns_map = self.get_model_columns_map(model=asset_model)
-
-            del_list = list()
-            add_list = list()
-            update_list = list()
-            host_change_data = dict()
-
-            for item in today_obj:
-                # 新增的资源
-                if item.instance_id not in dest_data:
-                    add_list.append(item.name)
-                    continue
-                hostname = item.name
-                old_data = dest_data.get(item.instance_id)
-                # 比对差异
-                data = json.loads(item.data)
-                for key, val in data.items():
-                    if key in ["update_time", "create_time", "instance_expired_time"]:
-                        continue
-                    old_val = str(old_data.get(key, ""))
-                    if str(val) != old_val:
-                        if hostname not in host_change_data:
-                            host_change_data[hostname] = list()
-                        logging.info(f"hostname:{hostname};val:{val},old:{old_val}")
-                        # 更新的内容
-                        host_change_data[hostname].append({
-                            "desc": columns_map.get(key, key),
-                            "new": val,
-                            "old": old_val
-                        })
-                        # 更新的资源
-                        if hostname not in update_list:
-                            update_list.append(hostname)
-
-                dest_data.pop(item.instance_id)
-
-            # 统计回收的资源
-            if dest_data:
-                del_list = [i["name"] for i in dest_data.values()]
-
-            data_list = [
-                {
-                    "action": "新增",
-                    "hostname_list": ", ".join(add_list),
-                    "count": len(add_list)
-                },
-                {
-                    "data": host_change_data,
-                    "action": "变更",
-                    "hostname_list": ", ".join(update_list),
-                    "count": len(update_list)
-                },
-                {
-                    "action": "回收",
-                    "hostname_list": ", ".join(del_list),
-                    "count": len(del_list)
-                }]
-            logging.info(f"data_list: {data_list}")
             # 获取资源的汇总数量
             asset_count = session.query(asset_model).count()
-            gen_data = {"data_list": data_list, "total": asset_count}
-        return gen_data
+
+        # 字段的描述映射
+        columns_map = self.get_model_columns_map(model=asset_model)
+        diff = AssetSnapshotDiff(self.asset_type, old_day=dest_date, new_day=src_date, columns_map=columns_map)
+
+        # 卡片只展示前若干台，完整差异通过接口分页查询
+        limit = int(configs.get("asset_change_card_limit", 100))
+        names = {action: [] for action in AssetSnapshotDiff.ACTION_NAMES}
+        counts = dict.fromkeys(AssetSnapshotDiff.ACTION_NAMES, 0)
+        host_change_data = dict()
+        for item in diff.iter_changes():
+            action, hostname = item["action"], item["name"]
+            counts[action] += 1
+            if counts[action] > limit:
+                continue
+            names[action].append(hostname)
+            if action == "update":
+                host_change_data[hostname] = [{"desc": c["desc"], "new": c["new"], "old": c["old"]}
+                                              for c in item["changes"]]
+
+        data_list = []
+        for action, action_name in AssetSnapshotDiff.ACTION_NAMES.items():
+            hostname_list = ", ".join(names[action])
+            if counts[action] > limit:
+                hostname_list += f" 等{counts[action]}台"
+            item = {"action": action_name, "hostname_list": hostname_list, "count": counts[action]}
+            if action == "update":
+                item["data"] = host_change_data
+            data_list.append(item)
+        logging.info(f"资源变更「{self.asset_type}」{dest_date} ➔ {src_date}: {counts}")
+        return {"data_list": data_list, "total": asset_count}
 
     def generate_tmp(self, data) -> str:
         """
@@ -265,33 +218,17 @@ class AssetChangeNotify:
 
 @deco(RedisLock("asset_cmdb_backup_redis_lock_key"))
 def cmdb_backup():
-    """定时每天备份主机资源"""
+    """定时每天备份全部类型的资源快照"""
     logging.info("===开始执行 定时每天备份资源")
-    try:
-        with DBContext('w', None, True) as session:
-            asset_obj = session.query(AssetBackupModels).filter(AssetBackupModels.created_day == human_date()).order_by(
-                "instance_id").all()
-            ins_id_list = [i.instance_id for i in asset_obj]
-
-            page = paginate(session.query(AssetServerModels), page_size=300)
-            data = _models_to_list(page.items)
-            for info in data:
-                instance_id = info["instance_id"]
-                insert_data = dict(
-                    asset_id=info["id"],
-                    name=info["name"],
-                    inner_ip=info["inner_ip"],
-                    instance_id=info["instance_id"],
-                    asset_type="server",
-                    created_day=human_date(),
-                    data=json.dumps(info),
-                )
-                if instance_id not in ins_id_list:
-                    session.add(AssetBackupModels(**insert_data))
-            session.commit()
-        logging.info("===执行完成 定时每天备份资源")
-    except:
-        logging.error(f"===执行失败 定时每天备份资源: {traceback.format_exc()}")
+    for asset_type in asset_mapping:
+        try:
+            snapshot = AssetSnapshot(asset_type)
+            total, stored = snapshot.backup()
+            snapshot.cleanup()
+            logging.info(f"资源快照「{asset_type}」: 共{total}条, 新增内容{stored}条")
+        except Exception:
+            logging.error(f"===执行失败 定时每天备份资源「{asset_type}」: {traceback.format_exc()}")
+    logging.info("===执行完成 定时每天备份资源")
     return
 
 
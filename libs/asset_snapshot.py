@@ -0,0 +1,290 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Date    : 2026/10/16
+Desc    : 资产每日快照与快照差异，内容按摘要去重存储，差异按实例ID归并流式比对
+"""
+
+import datetime
+import hashlib
+import json
+from typing import *
+
+from sqlalchemy import exists, inspect
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from websdk2.configs import configs
+from websdk2.consts import const
+from websdk2.db_context import DBContextV2 as DBContext
+from websdk2.model_utils import model_to_dict
+
+from db_sync import engine, default_configs
+from libs.utils import human_date
+from models import asset_mapping
+from models.asset import AssetBackupModels, AssetBackupPayloadModels
+
+# 易变字段不参与快照摘要和比对
+SNAPSHOT_IGNORE_KEYS = ("update_time", "create_time", "instance_expired_time", "content_hash")
+# 快照唯一键和名称字段，未列出的资产类型使用 instance_id 和 name
+SNAPSHOT_KEY_FIELDS = {"domain": "record_id"}
+SNAPSHOT_NAME_FIELDS = {"vpc": "vpc_name", "security_group": "security_group_name", "domain": "domain_rr"}
+# 快照按实例ID归并时使用的排序规则，按码点排序，与Python字符串比较一致
+SNAPSHOT_COLLATION = "utf8mb4_bin"
+
+
+def _load_data(data) -> dict:
+    """旧版快照把JSON字符串存进了JSON字段"""
+    if isinstance(data, str):
+        return json.loads(data)
+    return data or {}
+
+
+
+def get_model_columns_map(model) -> dict:
+    """
+    获取Model字段和字段映射
+    @param model: model对象
+    @return: {字段名：字段说明}
+    """
+    inspect_resp = inspect(engine)
+    model_mate = inspect_resp.get_columns(model.__tablename__,
+                                          schema=default_configs.get(const.DBNAME_KEY))  # 表名，库名
+    return {field["name"]: field["comment"] for field in model_mate}
+
+
+class AssetSnapshot:
+    """
+    资产每日快照
+    每个实例每天只记录一行摘要，内容按摘要去重存放在快照内容表，
+    与之前快照相比没有变化的资产不会重复存放内容
+    """
+
+    def __init__(self, asset_type: str, chunk_size: int = None):
+        self.asset_type = asset_type
+        self.model = asset_mapping[asset_type]
+        self.chunk_size = int(chunk_size or configs.get("asset_snapshot_chunk_size", 1000))
+        self.key_field = SNAPSHOT_KEY_FIELDS.get(asset_type, "instance_id")
+        self.name_field = SNAPSHOT_NAME_FIELDS.get(asset_type, "name")
+
+    @staticmethod
+    def make_payload(item: dict) -> Tuple[dict, str]:
+        """
+        生成快照内容和摘要
+        @param item: 资产数据
+        @return: (快照内容, 摘要)
+        """
+        payload = {k: v for k, v in item.items() if k not in SNAPSHOT_IGNORE_KEYS}
+        # 扩展字段合并展示，与资产接口保持一致
+        ext_info = payload.pop("ext_info", None)
+        if isinstance(ext_info, dict):
+            payload.update({k: v for k, v in ext_info.items() if k not in SNAPSHOT_IGNORE_KEYS})
+        raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+        return json.loads(raw), hashlib.md5(raw.encode("utf-8")).hexdigest()
+
+    def iter_chunks(self) -> Iterator[List[dict]]:
+        """按主键分批读取全部资产，每批一个短会话"""
+        last_id = 0
+        while True:
+            with DBContext('r', None, None) as session:
+                rows = session.query(self.model).filter(self.model.id > last_id) \
+                    .order_by(self.model.id).limit(self.chunk_size).all()
+                items = [model_to_dict(row) for row in rows]
+            if not items:
+                return
+            yield items
+            last_id = items[-1]["id"]
+
+    def _save_payloads(self, session, payloads: Dict[str, dict]) -> int:
+        """只写入之前没有出现过的内容，返回新增数量"""
+        if not payloads:
+            return 0
+        stored = {h for (h,) in session.query(AssetBackupPayloadModels.data_hash)
+                  .filter(AssetBackupPayloadModels.data_hash.in_(list(payloads)))}
+        rows = [dict(data_hash=h, asset_type=self.asset_type, data=payload)
+                for h, payload in payloads.items() if h not in stored]
+        if rows:
+            stmt = mysql_insert(AssetBackupPayloadModels)
+            session.execute(stmt.on_duplicate_key_update(data_hash=stmt.inserted.data_hash), rows)
+        return len(rows)
+
+    def backup(self, day: str = None) -> Tuple[int, int]:
+        """
+        备份当天快照，重复执行只补充缺失的实例
+        @param day: 快照日期，默认今天
+        @return: (快照数量, 新增内容数量)
+        """
+        day = day or human_date()
+        with DBContext('r', None, None) as session:
+            done = {i for (i,) in session.query(AssetBackupModels.instance_id).filter(
+                AssetBackupModels.asset_type == self.asset_type, AssetBackupModels.created_day == day)}
+
+        total, stored = 0, 0
+        for items in self.iter_chunks():
+            rows, payloads = [], {}
+            for item in items:
+                instance_id = item.get(self.key_field)
+                if not instance_id or instance_id in done:
+                    continue
+                done.add(instance_id)
+                payload, data_hash = self.make_payload(item)
+                payloads[data_hash] = payload
+                rows.append(dict(
+                    asset_id=item["id"],
+                    name=str(item.get(self.name_field) or "")[:128],
+                    inner_ip=item.get("inner_ip") or "",
+                    instance_id=instance_id,
+                    asset_type=self.asset_type,
+                    created_day=day,
+                    data_hash=data_hash,
+                ))
+            if not rows:
+                continue
+            with DBContext('w', None, True) as session:
+                stored += self._save_payloads(session, payloads)
+                session.execute(AssetBackupModels.__table__.insert(), rows)
+                session.commit()
+            total += len(rows)
+        return total, stored
+
+    def cleanup(self, days: int = None) -> None:
+        """
+        删除过期的快照，以及不再被任何快照引用的内容
+        @param days: 保留天数
+        """
+        days = int(days or configs.get("asset_snapshot_keep_days", 60))
+        dest_date = (datetime.datetime.now() - datetime.timedelta(days=days)).strftime("%Y-%m-%d")
+        with DBContext('w', None, True) as session:
+            session.query(AssetBackupModels).filter(AssetBackupModels.asset_type == self.asset_type,
+                                                    AssetBackupModels.created_day < dest_date) \
+                .delete(synchronize_session=False)
+            session.query(AssetBackupPayloadModels).filter(
+                AssetBackupPayloadModels.asset_type == self.asset_type,
+                ~exists().where(AssetBackupModels.data_hash == AssetBackupPayloadModels.data_hash)
+            ).delete(synchronize_session=False)
+            session.commit()
+
+    def iter_day(self, day: str, start_after: str = "") -> Iterator[Tuple[str, str, str, Any]]:
+        """
+        按实例ID顺序分批读取某天的快照
+        @param day: 快照日期
+        @param start_after: 从该实例ID之后开始
+        @return: (instance_id, name, data_hash, 旧版快照内容)
+        """
+        last = start_after or ""
+        # 排序和游标都用二进制排序规则，与Python字符串比较的顺序一致，归并时两侧才能对齐
+        instance_id = AssetBackupModels.instance_id.collate(SNAPSHOT_COLLATION)
+        while True:
+            with DBContext('r', None, None) as session:
+                rows = session.query(AssetBackupModels.instance_id, AssetBackupModels.name,
+                                     AssetBackupModels.data_hash, AssetBackupModels.data) \
+                    .filter(AssetBackupModels.asset_type == self.asset_type,
+                            AssetBackupModels.created_day == day,
+                            instance_id > last) \
+                    .order_by(instance_id).limit(self.chunk_size).all()
+            if not rows:
+                return
+            for instance_id, name, data_hash, data in rows:
+                # 旧版快照没有摘要，按同样的规则计算
+                if not data_hash:
+                    data_hash = self.make_payload(_load_data(data))[1]
+                yield instance_id, name, data_hash, data
+            last = rows[-1][0]
+
+    @staticmethod
+    def load_payloads(session, hashes: Iterable[str]) -> Dict[str, dict]:
+        """按摘要批量读取快照内容"""
+        hashes = list({h for h in hashes if h})
+        if not hashes:
+            return {}
+        rows = session.query(AssetBackupPayloadModels.data_hash, AssetBackupPayloadModels.data) \
+            .filter(AssetBackupPayloadModels.data_hash.in_(hashes)).all()
+        return {h: _load_data(data) for h, data in rows}
+
+
+class AssetSnapshotDiff:
+    """
+    两天快照的差异
+    两侧都按实例ID顺序流式读取并归并，摘要相同的实例直接跳过，
+    摘要不同的实例攒够一批后再批量读取内容逐字段比对
+    """
+    ACTION_NAMES = {"add": "新增", "update": "变更", "delete": "回收"}
+
+    def __init__(self, asset_type: str, old_day: str, new_day: str, columns_map: dict = None,
+                 chunk_size: int = None):
+        self.snapshot = AssetSnapshot(asset_type, chunk_size)
+        self.old_day = old_day
+        self.new_day = new_day
+        self.columns_map = columns_map or {}
+
+    def _iter_unique(self, day: str, start_after: str) -> Iterator[Tuple[str, str, str, Any]]:
+        """旧版快照同一天可能有重复实例，只保留第一条"""
+        last_key = None
+        for row in self.snapshot.iter_day(day, start_after):
+            if row[0] != last_key:
+                last_key = row[0]
+                yield row
+
+    def _iter_joined(self, start_after: str) -> Iterator[Tuple[Optional[tuple], Optional[tuple]]]:
+        """归并两侧快照，产出 (旧快照行, 新快照行)，缺失的一侧为None"""
+        old_rows = self._iter_unique(self.old_day, start_after)
+        new_rows = self._iter_unique(self.new_day, start_after)
+        old, new = next(old_rows, None), next(new_rows, None)
+        while old is not None or new is not None:
+            if new is None or (old is not None and old[0] < new[0]):
+                yield old, None
+                old = next(old_rows, None)
+            elif old is None or new[0] < old[0]:
+                yield None, new
+                new = next(new_rows, None)
+            else:
+                yield old, new
+                old, new = next(old_rows, None), next(new_rows, None)
+
+    def _compare(self, old_data: dict, new_data: dict) -> List[dict]:
+        changes = []
+        for key in sorted(set(old_data) | set(new_data)):
+            if key in SNAPSHOT_IGNORE_KEYS:
+                continue
+            old_val, new_val = old_data.get(key), new_data.get(key)
+            if old_val != new_val:
+                changes.append({"key": key, "desc": self.columns_map.get(key, key), "old": old_val, "new": new_val})
+        return changes
+
+    def _flush(self, batch: List[dict]) -> Iterator[dict]:
+        """批量读取待比对实例的内容，按实例ID顺序产出"""
+        hashes = [ref[0] for item in batch if item["action"] == "update" for ref in item["_pair"]]
+        with DBContext('r', None, None) as session:
+            payloads = self.snapshot.load_payloads(session, hashes)
+        for item in batch:
+            if item["action"] == "update":
+                (old_hash, old_data), (new_hash, new_data) = item.pop("_pair")
+                item["changes"] = self._compare(payloads.get(old_hash) or _load_data(old_data),
+                                                payloads.get(new_hash) or _load_data(new_data))
+                # 摘要规则变化导致的假变更
+                if not item["changes"]:
+                    continue
+            yield item
+
+    def iter_changes(self, start_after: str = "") -> Iterator[dict]:
+        """
+        按实例ID顺序产出差异
+        @param start_after: 从该实例ID之后开始，用于分页
+        @return: {"action": add/update/delete, "instance_id", "name", "changes"}
+        """
+        batch = []
+        for old, new in self._iter_joined(start_after):
+            if old is None:
+                batch.append({"action": "add", "instance_id": new[0], "name": new[1], "changes": []})
+            elif new is None:
+                batch.append({"action": "delete", "instance_id": old[0], "name": old[1], "changes": []})
+            elif old[2] != new[2]:
+                batch.append({"action": "update", "instance_id": new[0], "name": new[1],
+                              "_pair": (old[2:], new[2:])})
+            if len(batch) >= self.snapshot.chunk_size:
+                yield from self._flush(batch)
+                batch = []
+        if batch:
+            yield from self._flush(batch)
+
+
+if __name__ == "__main__":
+    pass
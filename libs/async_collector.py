@@ -0,0 +1,347 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Date    : 2026/10/16
+Desc    : 云资产异步采集基类，统一处理分页、并发预取、单次调用超时与并发上限
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import *
+
+from websdk2.configs import configs
+
+from libs.mycrypt import mc
+from libs.sync_scheduler import sync_scheduler
+from models.models_utils import (
+    UpsertResult,
+    get_cloud_config,
+    mark_expired_by_sync,
+    pop_sync_stats,
+    record_sync_stats,
+)
+from settings import settings
+
+if configs.can_import:
+    configs.import_dict(**settings)
+
+# 云SDK均为同步阻塞调用，统一放到共享线程池中执行，由事件循环调度
+_sdk_executor = ThreadPoolExecutor(
+    max_workers=int(configs.get("sync_sdk_max_workers", 64)), thread_name_prefix="cloud-sdk"
+)
+# 分页写库同样是阻塞调用，放到独立线程池，避免阻塞事件循环上的其他采集器，也不占用SDK调用线程
+_write_executor = ThreadPoolExecutor(
+    max_workers=int(configs.get("sync_write_max_workers", 8)), thread_name_prefix="cloud-write"
+)
+
+
+class AsyncCollector:
+    """
+    异步采集基类
+    子类设置 paging 并实现对应的分页方法以及 format_data:
+      paging = "offset": describe_page(offset) -> (当前页数据, 总数)
+      paging = "page":   describe_page(page_number) -> (当前页数据, 总数)
+      paging = "token":  describe_token_page(next_token) -> (当前页数据, 下一页token)
+    总数已知时并发预取剩余页，总数未知时逐页获取直到不足一页
+    支持增量同步的子类实现 describe_instances(instance_ids) -> 实例数据
+    子类实现 make_client 创建SDK客户端，分页方法中通过 self.client 使用
+    子类实现 sync_cmdb_async 入库，同步调用 sync_cmdb 或由 collect_many 在同一个事件循环中并发驱动
+    """
+
+    paging = "offset"
+    page_size = 100
+    max_concurrency = 10  # 单个采集器同时在途的API调用数
+    call_timeout = 60  # 单次API调用超时(秒)
+    thread_safe_client = False  # SDK客户端可跨线程共用时整个采集器只创建一个
+    rate_limit_key: Optional[Tuple[str, str]] = None  # (云厂商, 账号)，设置后每次API调用前申请令牌
+    sync_stats: Optional[UpsertResult] = None  # 设置后写入统计按采集器单独累计，否则累加到调用线程的统计
+
+    def make_client(self):
+        raise NotImplementedError
+
+    @property
+    def client(self):
+        """
+        SDK客户端，分页方法在共享线程池中并发执行，默认每个线程各自创建，线程之间互不影响
+        """
+        if self.thread_safe_client:
+            client = self.__dict__.get("_client")
+            if client is None:
+                client = self.__dict__["_client"] = self.make_client()
+            return client
+        local = self.__dict__.setdefault("_client_local", threading.local())
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = self.make_client()
+        return client
+
+    def describe_page(self, start: int) -> Tuple[list, Optional[int]]:
+        raise NotImplementedError
+
+    def describe_token_page(self, next_token: Optional[str]) -> Tuple[list, Optional[str]]:
+        raise NotImplementedError
+
+    def describe_instances(self, instance_ids: List[str]) -> list:
+        raise NotImplementedError
+
+    def format_data(self, data) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    async def prepare(self):
+        """分页采集前执行，用于预先查询格式化数据需要关联的信息"""
+
+    async def sync_cmdb_async(self, *args, **kwargs) -> Tuple[bool, str]:
+        raise NotImplementedError
+
+    def sync_cmdb(self, *args, **kwargs) -> Tuple[bool, str]:
+        return run_async(self.sync_cmdb_async(*args, **kwargs))
+
+    async def call(self, func: Callable, *args, **kwargs):
+        """在共享线程池执行一次阻塞的SDK调用，受并发上限、云厂商/账号限流和超时控制"""
+        async with self._semaphore:
+            if self.rate_limit_key:
+                wait_time = sync_scheduler.reserve(*self.rate_limit_key)
+                if wait_time:
+                    await asyncio.sleep(wait_time)
+            loop = asyncio.get_running_loop()
+            return await asyncio.wait_for(
+                loop.run_in_executor(_sdk_executor, partial(func, *args, **kwargs)), timeout=self.call_timeout
+            )
+
+    def _page_start(self, index: int) -> int:
+        return index + 1 if self.paging == "page" else index * self.page_size
+
+    def _format_page(self, items: list) -> List[Dict[str, Any]]:
+        return [row for row in map(self.format_data, items) if row]
+
+    async def collect_pages(self) -> AsyncIterator[List[Dict[str, Any]]]:
+        """按页产出格式化后的数据"""
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        await self.prepare()
+        if self.paging == "token":
+            next_token = None
+            while True:
+                items, next_token = await self.call(self.describe_token_page, next_token)
+                if items:
+                    yield self._format_page(items)
+                if not next_token:
+                    return
+
+        items, total = await self.call(self.describe_page, self._page_start(0))
+        if not items:
+            return
+        yield self._format_page(items)
+
+        if total is not None:
+            # 总数已知，滑动窗口并发预取剩余页，在途页数不超过并发上限
+            page_count = (int(total) + self.page_size - 1) // self.page_size
+            pending: Deque[asyncio.Future] = deque()
+            next_index = 1
+            try:
+                while next_index < page_count or pending:
+                    while next_index < page_count and len(pending) < self.max_concurrency:
+                        start = self._page_start(next_index)
+                        pending.append(asyncio.ensure_future(self.call(self.describe_page, start)))
+                        next_index += 1
+                    items, _ = await pending.popleft()
+                    if items:
+                        yield self._format_page(items)
+            finally:
+                for task in pending:
+                    task.cancel()
+            return
+
+        index = 1
+        while len(items) >= self.page_size:
+            items, _ = await self.call(self.describe_page, self._page_start(index))
+            if not items:
+                return
+            yield self._format_page(items)
+            index += 1
+
+    async def collect(self) -> List[Dict[str, Any]]:
+        rows: List[Dict[str, Any]] = []
+        async for page in self.collect_pages():
+            rows.extend(page)
+        return rows
+
+    def collect_all(self) -> List[Dict[str, Any]]:
+        """同步调用入口，在当前线程的事件循环中完成采集"""
+        return run_async(self.collect())
+
+    async def stream(self, write_page: Callable[[List[Dict[str, Any]]], Any]) -> Set[str]:
+        """
+        边采集边写入，每页数据交给 write_page，返回已同步的实例ID集合
+        write_page 在写库线程池执行，同一采集器的页按顺序写入，写库期间事件循环继续处理其他采集器
+        """
+        loop = asyncio.get_running_loop()
+        seen: Set[str] = set()
+        async for page in self.collect_pages():
+            await loop.run_in_executor(_write_executor, write_page, page)
+            seen.update(row["instance_id"] for row in page if row.get("instance_id"))
+        return seen
+
+    async def stream_to_cmdb_async(
+        self,
+        task: Callable[..., Tuple[bool, str]],
+        cloud_name: str,
+        account_id: str,
+        resource_type: str,
+        region: Optional[str] = None,
+    ) -> Tuple[bool, str]:
+        """
+        流式同步：内存只保留在途的页，已写入的页在后续采集失败时依然保留
+        全部页采集成功后才根据已同步实例ID标记过期，避免误标
+        :param task: models_utils 中的资产写入任务，如 server_task_batch
+        """
+        self.rate_limit_key = (cloud_name, account_id)
+        errors: List[str] = []
+        written = 0
+        stats = UpsertResult()
+
+        def write_page(rows: List[Dict[str, Any]]):
+            nonlocal written
+            ok, msg = task(cloud_name=cloud_name, account_id=account_id, rows=rows)
+            # 写入统计记录在写库线程上，在同一次调用中取出
+            stats.merge(pop_sync_stats())
+            if ok:
+                written += len(rows)
+            else:
+                errors.append(msg)
+
+        try:
+            seen = await self.stream(write_page)
+        except Exception as err:
+            msg = f"{cloud_name}-{account_id}-{resource_type} 采集中断，已写入{written}条: {err}"
+            logging.error(msg)
+            return False, msg
+        finally:
+            if self.sync_stats is not None:
+                self.sync_stats.merge(stats)
+            else:
+                record_sync_stats(stats)
+
+        if not seen:
+            return False, f"{resource_type}列表为空"
+        await asyncio.get_running_loop().run_in_executor(
+            _write_executor,
+            partial(
+                mark_expired_by_sync,
+                cloud_name=cloud_name,
+                account_id=account_id,
+                resource_type=resource_type,
+                instance_ids=list(seen),
+                region=region,
+            ),
+        )
+        if errors:
+            return False, errors[0]
+        return True, f"{cloud_name}-{account_id}-{resource_type} task写入数据库完成, 共{written}条"
+
+    async def collect_instances(self, instance_ids: List[str]) -> List[Dict[str, Any]]:
+        """按实例ID分批并发查询，每批不超过一页"""
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        instance_ids = list(dict.fromkeys(instance_ids))
+        batches = [instance_ids[i : i + self.page_size] for i in range(0, len(instance_ids), self.page_size)]
+        pages = await asyncio.gather(*(self.call(self.describe_instances, batch) for batch in batches))
+        return [row for page in pages for row in self._format_page(page or [])]
+
+    def sync_instances(
+        self, task: Callable[..., Tuple[bool, str]], cloud_name: str, account_id: str, instance_ids: List[str]
+    ) -> Tuple[bool, str]:
+        """
+        增量同步：只重新查询变更事件涉及的实例并写入
+        查询不到的实例(已释放)不在这里处理，由下一次全量同步标记
+        """
+        if not instance_ids:
+            return True, "没有变更的实例"
+        self.rate_limit_key = (cloud_name, account_id)
+        rows = run_async(self.collect_instances(instance_ids))
+        if not rows:
+            return True, f"{len(instance_ids)}个变更实例均已不存在"
+        return task(cloud_name=cloud_name, account_id=account_id, rows=rows)
+
+
+def run_async(coro: Awaitable):
+    """在没有运行中事件循环的线程里执行协程"""
+    return asyncio.run(coro)
+
+
+async def collect_many(collectors: List[AsyncCollector]) -> List[Tuple[bool, str, float]]:
+    """
+    同一个事件循环并发驱动多个采集器入库，返回每个采集器的 (是否成功, 消息, 耗时)
+    每个采集器的写入统计单独记录在 sync_stats 中
+    """
+
+    async def run(collector: AsyncCollector) -> Tuple[bool, str, float]:
+        collector.sync_stats = UpsertResult()
+        start_time = time.time()
+        try:
+            is_success, msg = await collector.sync_cmdb_async()
+        except Exception as err:
+            logging.exception(f"采集器同步异常: {err}")
+            is_success, msg = False, f"同步异常: {err}"
+        return is_success, msg, time.time() - start_time
+
+    return await asyncio.gather(*(run(c) for c in collectors))
+
+
+def run_collectors(cloud_name: str, conf: Dict[str, str], units: List[Tuple[str, str, AsyncCollector]]) -> List[bool]:
+    """
+    一个账号下所有 (资源, 地域) 采集器在同一个事件循环中并发同步，只占用同步线程池的一个线程
+    :param units: [(资源类型, 地域, 采集器)]
+    """
+    if not units:
+        return []
+    for _ in units:
+        sync_scheduler.acquire(cloud_name, conf["account_id"])
+
+    def run() -> List[bool]:
+        pop_sync_stats()
+        results = run_async(collect_many([collector for _, _, collector in units]))
+        for (cloud_type, region, collector), (is_success, msg, consum) in zip(units, results):
+            sync_scheduler.log_unit(cloud_name, cloud_type, conf, region, is_success, msg, consum, collector.sync_stats)
+        return [is_success for is_success, _, _ in results]
+
+    try:
+        return sync_scheduler.executor.submit(run).result()
+    except Exception as err:
+        logging.error(f"采集器同步执行失败：「{cloud_name}」-「{conf['account_id']}」: {err}")
+        return [False] * len(units)
+
+
+def sync_collectors(cloud_name: str, account_id: Optional[str], resources: List[Dict[str, Any]]) -> bool:
+    """
+    按账号同步基于 AsyncCollector 的资源，每个账号的全部资源类型和地域共用一个事件循环
+    :param resources: 云厂商 mapping 中 obj 为 AsyncCollector 子类的配置
+    """
+    cloud_configs: List[Dict[str, str]] = get_cloud_config(cloud_name=cloud_name, account_id=account_id)
+    if not cloud_configs:
+        return False
+
+    is_success = True
+    for conf in cloud_configs:
+        access_key = mc.my_decrypt(conf["access_key"])
+        regions = [r.strip() for r in conf["region"].split(",") if r.strip()]
+        units = [
+            (
+                item["type"],
+                region,
+                item["obj"](
+                    access_id=conf["access_id"], access_key=access_key, account_id=conf["account_id"], region=region
+                ),
+            )
+            for item in resources
+            for region in regions
+        ]
+        is_success = all(run_collectors(cloud_name, conf, units)) and is_success
+    return is_success
+
+
+if __name__ == "__main__":
+    pass
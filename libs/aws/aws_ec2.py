@@ -9,9 +9,11 @@ Docs    : https://boto3.amazonaws.com/v1/documentation/api/latest/reference/serv
 """
 
 import logging
+from functools import partial
 import boto3
 from typing import *
-from models.models_utils import server_task, mark_expired, mark_expired_by_sync, server_task_batch
+from libs.async_collector import AsyncCollector
+from models.models_utils import server_task, mark_expired, mark_expired_by_sync, server_task_batch, get_all_agent_info
 
 
 def get_run_type(val):
@@ -25,14 +27,19 @@ def get_run_type(val):
     return run_map.get(val, '未知')
 
 
-class AwsEc2Client:
+class AwsEc2Client(AsyncCollector):
+    paging = "token"
+    thread_safe_client = True  # boto3 客户端线程安全
+
     def __init__(self, access_id: Optional[str], access_key: Optional[str], region: Optional[str],
                  account_id: Optional[str]):
         self._access_id = access_id
         self._access_key = access_key
         self._region = region
         self._accountID = account_id
-        self.__client = boto3.client(
+
+    def make_client(self):
+        return boto3.client(
             'ec2', region_name=self._region,
             aws_access_key_id=self._access_id,
             aws_secret_access_key=self._access_key
@@ -66,40 +73,46 @@ class AwsEc2Client:
         res['state'] = get_run_type(state)
         res['charge_type'] = '按量付费'
         res['network_type'] = '专有网络' if data.get('VpcId') else '经典网络'
+        res['vpc_id'] = data.get('VpcId', '')
+        res['vswitch_id'] = data.get('SubnetId', '')
+        res['security_group_ids'] = [sg.get('GroupId') for sg in data.get('SecurityGroups', []) if sg.get('GroupId')]
         res['os_name'] = data.get('Platform')  # 可能是自定义的Image 没找到OSName
         # res['instance_create_time'] = ''
         # res['instance_expired_time'] = ''  # AWS按量没有过期时间
 
         return res
 
+    def describe_token_page(self, next_token: Optional[str]) -> Tuple[list, Optional[str]]:
+        params = {'MaxResults': 1000}
+        if next_token:
+            params['NextToken'] = next_token
+        response = self.client.describe_instances(**params)
+        instances = [server_data for ret in response['Reservations'] for server_data in ret['Instances']]
+        return instances, response.get('NextToken')
+
+    def describe_instances(self, instance_ids: List[str]) -> list:
+        """
+        按实例ID查询EC2，用过滤条件查询，已释放的实例不会报 InvalidInstanceID.NotFound
+        """
+        response = self.client.describe_instances(Filters=[{'Name': 'instance-id', 'Values': instance_ids}])
+        return [server_data for ret in response['Reservations'] for server_data in ret['Instances']]
+
     def get_all_ec2(self) -> List[dict]:
-        response = self.__client.describe_instances()
-        reservations: List[dict] = response['Reservations']
-        if not reservations:
-            logging.error("获取EC2 Instances信息失败")
+        try:
+            all_ec2_list: List[Dict[str, str]] = self.collect_all()
+        except Exception as err:
+            logging.error(f"获取EC2 Instances信息失败: {err}")
             return []
-        # 所有EC2
-        all_ec2_list: List[Dict[str, str]] = []
-        for ret in reservations:
-            for server_data in ret['Instances']:
-                res = self.format_data(server_data)
-                all_ec2_list.append(res)
+        if not all_ec2_list:
+            logging.error("获取EC2 Instances信息失败")
         return all_ec2_list
 
-    def sync_cmdb(self, cloud_name: Optional[str] = 'aws', resource_type: Optional[str] = 'server') -> Tuple[
-        bool, str]:
-        # 所有EC2数据
-        all_ec2_list: List[dict] = self.get_all_ec2()
-        if not all_ec2_list: return False, "EC2列表为空"
-        # 更新资源
-        ret_state, ret_msg = server_task_batch(account_id=self._accountID, cloud_name=cloud_name, rows=all_ec2_list)
-        # 标记过期
-        # mark_expired(resource_type=resource_type, account_id=self._accountID)
-        instance_ids = [row['instance_id'] for row in all_ec2_list]
-        mark_expired_by_sync(cloud_name=cloud_name, account_id=self._accountID, resource_type=resource_type,
-                             instance_ids=instance_ids, region=self._region)
-
-        return ret_state, ret_msg
+    async def sync_cmdb_async(
+            self, cloud_name: Optional[str] = 'aws', resource_type: Optional[str] = 'server'
+    ) -> Tuple[bool, str]:
+        # 分页边采集边入库，采集完成后标记过期
+        task = partial(server_task_batch, all_agent_info=get_all_agent_info())
+        return await self.stream_to_cmdb_async(task, cloud_name, self._accountID, resource_type, region=self._region)
 
 
 if __name__ == '__main__':
@@ -8,6 +8,7 @@ Desc    : AWS health Events
 """
 
 import boto3
+import datetime
 import logging
 from settings import settings
 from typing import *
@@ -51,6 +52,30 @@ class AwsHealthClient:
             client = None
         return client
 
+    def get_changed_instance_ids(self, start_time: datetime.datetime, end_time: datetime.datetime,
+                                 resource_type: Optional[str] = 'AWS::EC2::Instance') -> Dict[str, Set[str]]:
+        """
+        CloudTrail按地域记录，查询时间段内有写操作的实例，用于增量同步
+        docs:https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/cloudtrail.html#CloudTrail.Client.lookup_events
+        :return: {region: {instance_id}}
+        """
+        trail_client = boto3.client('cloudtrail', region_name=self._region, aws_access_key_id=self._access_id,
+                                    aws_secret_access_key=self._access_key)
+        paginator = trail_client.get_paginator('lookup_events')
+        instance_ids: Set[str] = set()
+        for page in paginator.paginate(
+                LookupAttributes=[{'AttributeKey': 'ResourceType', 'AttributeValue': resource_type}],
+                StartTime=start_time.astimezone(datetime.timezone.utc),
+                EndTime=end_time.astimezone(datetime.timezone.utc)):
+            for event in page.get('Events', []):
+                if event.get('ReadOnly') == 'true':
+                    continue
+                for resource in event.get('Resources', []):
+                    name = resource.get('ResourceName') or ''
+                    if resource.get('ResourceType') == resource_type and name.startswith('i-'):
+                        instance_ids.add(name)
+        return {self._region: instance_ids}
+
     def get_all_events(self) -> List[dict]:
         """
         docs:https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/health.html#Health.Client.describe_events
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Date    : 2026/10/16
+Desc    : 云SDK客户端工厂和解密后的凭证缓存，客户端按线程隔离复用，避免每次采集重建客户端和修改SDK全局配置
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import *
+
+from websdk2.configs import configs
+
+from libs.mycrypt import mc
+from settings import settings
+
+if configs.can_import:
+    configs.import_dict(**settings)
+
+
+class CredentialCache:
+    """
+    云账号解密后的AK/SK，进程内短期缓存
+    CloudSettingHandler 修改、删除账号后调用 invalidate
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._items: Dict[Tuple[str, str], Tuple[float, Tuple[str, str]]] = {}
+
+    @property
+    def _ttl(self) -> int:
+        return int(configs.get("cloud_credential_ttl", 300))
+
+    def get(self, cloud_name: str, account_id: str) -> Optional[Tuple[str, str]]:
+        """
+        :return: (access_id, access_key)，账号不存在时返回 None
+        """
+        key = (cloud_name, account_id)
+        now = time.time()
+        with self._lock:
+            item = self._items.get(key)
+            if item and item[0] > now:
+                return item[1]
+
+        # 避免循环导入，models_utils 依赖较多
+        from models.models_utils import get_cloud_config
+
+        cloud_configs = get_cloud_config(cloud_name=cloud_name, account_id=account_id)
+        if not cloud_configs:
+            return None
+        credentials = (cloud_configs[0]["access_id"], mc.my_decrypt(cloud_configs[0]["access_key"]))
+        with self._lock:
+            self._items[key] = (now + self._ttl, credentials)
+        return credentials
+
+    def invalidate(self, account_id: Optional[str] = None):
+        """清除指定账号的缓存，未指定时全部清除"""
+        with self._lock:
+            if account_id is None:
+                self._items.clear()
+                return
+            for key in [k for k in self._items if k[1] == account_id]:
+                self._items.pop(key, None)
+
+
+credential_cache = CredentialCache()
+
+
+def _fingerprint(secret: str) -> str:
+    """凭证变更后生成新的键，旧客户端自然失效"""
+    return hashlib.sha256((secret or "").encode("utf-8")).hexdigest()[:16]
+
+
+class ClientFactory:
+    """
+    按 (云厂商, 账号, 地域, 服务) 缓存SDK客户端
+    每个线程一份，线程池中的线程长期存活，跨同步复用客户端和其中的HTTP连接池，线程之间互不影响
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    @property
+    def _max_size(self) -> int:
+        return int(configs.get("cloud_client_cache_size", 64))
+
+    def _clients(self) -> "OrderedDict[tuple, Any]":
+        clients = getattr(self._local, "clients", None)
+        if clients is None:
+            clients = self._local.clients = OrderedDict()
+        return clients
+
+    def get(
+        self, cloud_name: str, account_id: str, region: str, service: str, secret: str, builder: Callable[[], Any]
+    ):
+        """
+        :param secret: 访问密钥，参与缓存键，密钥轮换后重新创建客户端
+        :param builder: 缓存未命中时创建客户端
+        """
+        key = (cloud_name, account_id, region, service, _fingerprint(secret))
+        clients = self._clients()
+        client = clients.get(key)
+        if client is None:
+            client = clients[key] = builder()
+            while len(clients) > self._max_size:
+                clients.popitem(last=False)
+        else:
+            clients.move_to_end(key)
+        return client
+
+
+client_factory = ClientFactory()
+
+
+def qcloud_client(client_cls, access_id: str, access_key: str, region: str):
+    """腾讯云SDK客户端，client_cls 如 cvm_client.CvmClient"""
+    from tencentcloud.common import credential
+
+    return client_factory.get(
+        "qcloud", access_id, region, client_cls.__name__, access_key,
+        lambda: client_cls(credential.Credential(access_id, access_key), region),
+    )
+
+
+def volc_api_client(configuration, service: str):
+    """
+    火山云 ApiClient，按服务分别缓存
+    每个客户端使用自己的 Configuration，不调用 Configuration.set_default 修改全局配置
+    :param service: 服务名，如 ecs、vpc、clb
+    """
+    import volcenginesdkcore
+
+    return client_factory.get(
+        "volc", configuration.ak, configuration.region, service, configuration.sk,
+        lambda: volcenginesdkcore.ApiClient(configuration),
+    )
+
+
+if __name__ == "__main__":
+    pass
@@ -8,8 +8,10 @@ Desc    : consul 注册
 """
 
 import datetime
+import hashlib
 import json
 import logging
+from typing import *
 import consul
 import requests
 from settings import settings
@@ -42,31 +44,113 @@ def deco(cls, release=False):
     return _deco
 
 
+CONSUL_SYNC_ASSET_TYPES = ['server', 'mysql', 'redis', 'domain']
+
+
+def _service_digest(name, host, port, tags, meta) -> str:
+    """注册信息摘要，name/address/port/tags/meta 任一变化即视为需要更新"""
+    raw = json.dumps([name, host, port, sorted(tags or []), meta or {}], sort_keys=True, default=str)
+    return hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+
+def diff_consul_services(desired: Iterable[tuple], current: Dict[str, dict], service_names: Iterable[str]) -> dict:
+    """
+    计算CMDB与consul的差异
+    :param desired: consul_sync_factory 产出的注册信息 (name, service_id, host, port, tags, meta)
+    :param current: agent.services() 返回的当前注册信息
+    :param service_names: 参与同步的服务名，只在这些服务里计算需要注销的实例
+    :return: {"add": [注册信息], "update": [注册信息], "remove": [service_id], "unchanged": 数量}
+    """
+    add, update, unchanged, seen = [], [], 0, set()
+    for name, service_id, host, port, tags, meta in desired:
+        if service_id in seen:
+            continue
+        seen.add(service_id)
+        exist = current.get(service_id)
+        if not exist:
+            add.append((name, service_id, host, port, tags, meta))
+            continue
+        # 已存在的服务保留原有meta，只合并CMDB下发的字段
+        current_meta = exist.get('Meta') or {}
+        merged_meta = {**current_meta, **(meta or {})}
+        if _service_digest(name, host, port, tags, merged_meta) == _service_digest(
+                exist.get('Service'), exist.get('Address'), exist.get('Port'), exist.get('Tags'), current_meta):
+            unchanged += 1
+        else:
+            update.append((name, service_id, host, port, tags, merged_meta))
+
+    service_names = set(service_names)
+    remove = [service_id for service_id, exist in current.items()
+              if exist.get('Service') in service_names and service_id not in seen]
+    return dict(add=add, update=update, remove=remove, unchanged=unchanged)
+
+
+def get_consul_sync_diff(c: Optional["ConsulOpt"] = None) -> dict:
+    """
+    全量拉取一次consul注册信息，计算所有资产类型的差异
+    """
+    c = c or ConsulOpt()
+    current = c.get_agent_services()
+    desired = []
+    for asset_type in CONSUL_SYNC_ASSET_TYPES:
+        try:
+            rows = list(consul_sync_factory(asset_type))
+        except Exception as err:
+            # 某个类型获取失败时不参与注销，避免把该类型的实例全部删掉
+            logging.error(f'get {asset_type} consul registry info error, {err}')
+            current = {k: v for k, v in current.items() if v.get('Service') != f'{asset_type}-exporter'}
+            continue
+        desired.extend(rows)
+    return diff_consul_services(desired, current, [f'{asset_type}-exporter' for asset_type in CONSUL_SYNC_ASSET_TYPES])
+
+
+def _diff_summary(diff: dict) -> dict:
+    return dict(add=len(diff['add']), update=len(diff['update']), remove=len(diff['remove']),
+                unchanged=diff['unchanged'])
+
+
+def preview_consul_sync() -> dict:
+    """
+    预览CMDB与consul的差异，只读不加锁，不影响定时同步
+    """
+    try:
+        diff = get_consul_sync_diff()
+    except Exception as err:
+        logging.error(f'访问consul失败 ！！！ {err}')
+        return dict(code=-1, msg=f'访问consul失败 {err}')
+    return dict(code=0, msg='获取差异成功', data=dict(
+        summary=_diff_summary(diff), add=[i[1] for i in diff['add']], update=[i[1] for i in diff['update']],
+        remove=diff['remove']))
+
+
 def sync_consul():
+    """
+    差异同步到consul，只提交新增/变更/注销的实例
+    """
     @deco(RedisLock("async_asset_to_consul_lock_key"), release=True)
     def index():
         logging.info(f'同步数据到consul开始 ！！！')
         c = ConsulOpt()
-        server_info = c.get_services()
-        if server_info.get('code') != 0:
-            logging.error(f'访问consul失败 ！！！ {server_info.get("msg")}')
-            return
-        for asset_type in ['server', 'mysql', 'redis', 'domain']:
-            try:
-                cmdb_ins = []
-                for server in consul_sync_factory(asset_type):
-                    cmdb_ins.append(server[1])
-                    c.create_or_update_service(*server)
+        try:
+            diff = get_consul_sync_diff(c)
+        except Exception as err:
+            logging.error(f'访问consul失败 ！！！ {err}')
+            return dict(code=-1, msg=f'访问consul失败 {err}')
 
-                for ins in c.get_instances(f'{asset_type}-exporter').get('data'):
-                    if ins.get('ServiceID') not in cmdb_ins:
-                        c.deregister_service(ins.get('ServiceID'))
-            except Exception as err:
-                logging.error(f'sync to consul {asset_type} error,{err} {datetime.datetime.now()}')
+        summary = _diff_summary(diff)
+        max_workers = int(configs.get('consul_sync_workers', 10))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(c.register_service, *register_data)
+                       for register_data in diff['add'] + diff['update']]
+            futures += [executor.submit(c.deregister_service, service_id) for service_id in diff['remove']]
+            errors = [f.exception() for f in futures if f.exception()]
+        for err in errors[:10]:
+            logging.error(f'sync to consul error,{err} {datetime.datetime.now()}')
 
-        logging.info('同步数据到consul结束 ！！！')
+        logging.info(f'同步数据到consul结束 ！！！{summary}, 失败: {len(errors)}')
+        return dict(code=0 if not errors else -1, msg=f'同步完成, 失败{len(errors)}个', data=summary)
 
-    index()
+    return index()
 
 
 def consul_sync_factory(asset_type):
@@ -164,6 +248,10 @@ class ConsulOpt(object):
         else:
             return {'code': -1, 'msg': f'{res.status_code}:{res.text}'}
 
+    def get_agent_services(self) -> Dict[str, dict]:
+        """一次获取agent上全部已注册的服务 {service_id: service}"""
+        return self._consul.agent.services()
+
     def get_service(self, service_id) -> dict:
 
         services = self._consul.agent.services()
@@ -301,8 +389,7 @@ def get_registry_domain_info():
 
 
 def async_consul_info():
-    executor = global_executors.general_executor
-    executor.submit(sync_consul)
+    global_executors.submit_unique("consul", sync_consul)
 
 
 if __name__ == '__main__':
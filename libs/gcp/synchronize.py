@@ -20,7 +20,8 @@ from websdk2.tools import RedisLock
 from libs import deco
 from libs.gcp import mapping, DEFAULT_CLOUD_NAME
 from libs.mycrypt import mc
-from models.models_utils import sync_log_task, get_cloud_config
+from libs.sync_scheduler import sync_scheduler
+from models.models_utils import get_cloud_config
 
 
 def sync(data: Dict[str, Any]) -> None:
@@ -38,61 +39,33 @@ def sync(data: Dict[str, Any]) -> None:
 
 
 def sync_regions(conf: Dict[str, str], obj: Callable, cloud_type: str) -> None:
-    region = ""
-    logging.info(f"同步开始, 信息：「{DEFAULT_CLOUD_NAME}」-「{cloud_type}」-「{region}」.")
-    start_time = time.time()
-    account_file = mc.my_decrypt(conf["account_file"])
-    project_id = conf["project_id"]
-    account_id = conf["account_id"]
-    sync_state = "failed"
-    msg = ""
+    # 谷歌云按项目同步，不区分地域
+    sync_scheduler.run_regions(
+        DEFAULT_CLOUD_NAME, cloud_type, conf, lambda region: sync_project(conf, obj, region), regions=[""]
+    )
 
 
+def sync_project(conf: Dict[str, str], obj: Callable, region: str) -> Tuple[bool, str]:
+    account_file = mc.my_decrypt(conf["account_file"])
+    project_id = conf["project_id"]
     account_path = f"/tmp/{project_id}_account_file.json"
-    # with open(account_path, "w", encoding="utf-8") as file:
-    #     file.write(account_file)  # 写入字符串
     # 使用 with 自动清理临时文件
     try:
         with tempfile.NamedTemporaryFile(mode="w+", suffix=".json", delete=False) as tmp_file:
             tmp_file.write(account_file)
             tmp_file.flush()
             account_path = tmp_file.name
-        is_success, msg = obj(
+        return obj(
             project_id=project_id,
             account_path=account_path,
-            account_id=account_id,
+            account_id=conf["account_id"],
             region=region
         ).sync_cmdb()
-
-        sync_state = "success" if is_success else "failed"
-
-    except Exception as e:
-        msg = f"同步异常: {str(e)}"
-        logging.exception(f"同步异常: {e}")
     finally:
         # 确保文件被删除
         if os.path.exists(account_path):
             os.remove(account_path)
 
-    end_time = time.time()
-
-    sync_consum = "%.2f" % (end_time - start_time)
-
-    sync_log_task(
-        dict(
-            name=conf["name"],
-            cloud_name=DEFAULT_CLOUD_NAME,
-            sync_type=cloud_type,
-            account_id=account_id,
-            sync_region=region,
-            sync_state=sync_state,
-            sync_consum=sync_consum,
-            loginfo=str(msg),
-        )
-    )
-
-    logging.info(f"同步结束, 信息：「{DEFAULT_CLOUD_NAME}」-「{cloud_type}」-「{region}」.")
-
 
 def get_gcp_sync_config() -> bool:
     """获取GCP同步配置
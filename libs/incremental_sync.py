@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Date    : 2026/10/16
+Desc    : 事件驱动的增量同步，两次全量对账之间只重新查询审计事件中有变更的实例
+"""
+
+import datetime
+import logging
+from typing import *
+
+from websdk2.configs import configs
+
+from libs.sync_scheduler import sync_scheduler
+from models.models_utils import get_sync_cursor, save_sync_cursor
+from settings import settings
+
+if configs.can_import:
+    configs.import_dict(**settings)
+
+
+def need_full_sync(account_id: str) -> bool:
+    """
+    是否需要全量同步：未开启增量、没有游标、或距离上次全量超过对账间隔
+    """
+    if configs.get("sync_incremental", "yes") != "yes":
+        return True
+    cursor = get_sync_cursor(account_id)
+    if not cursor or not cursor["cursor_time"] or not cursor["last_full_time"]:
+        return True
+    full_interval = datetime.timedelta(minutes=int(configs.get("sync_full_interval", 360)))
+    return datetime.datetime.now() - cursor["last_full_time"] >= full_interval
+
+
+def run_full_sync(cloud_name: str, account_id: str, sync_func: Callable[[], Any]):
+    """
+    执行全量同步，全部资源的全部地域都成功后才把游标和全量时间移动到本次开始时间
+    同步期间发生的变更会在下一次增量中重新查询
+    :param sync_func: 全量同步，全部成功返回True，没有拿到账号锁或有地域失败返回False
+    """
+    start_time = datetime.datetime.now()
+    if sync_func() is not True:
+        # 未执行或部分失败，游标不动，下次仍然全量同步，修复失败地域的差异
+        logging.warning(f"全量同步未全部成功：「{cloud_name}」-「{account_id}」, 不推进增量游标")
+        return
+    save_sync_cursor(cloud_name, account_id, cursor_time=start_time, last_full_time=start_time)
+
+
+def incremental_sync(
+    cloud_name: str,
+    conf: Dict[str, str],
+    resource_type: str,
+    lookup: Callable[[datetime.datetime, datetime.datetime], Dict[str, Set[str]]],
+    sync_region: Callable[[str, List[str]], Tuple[bool, str]],
+) -> bool:
+    """
+    增量同步一个账号的一种资源
+    :param cloud_name: 云厂商
+    :param conf: 云账号配置
+    :param resource_type: 资源类型
+    :param lookup: 查询时间段内有变更的实例，返回 {region: {instance_id}}
+    :param sync_region: 重新查询并写入一个地域内的变更实例
+    :return: 是否成功，全部地域成功才推进游标
+    """
+    account_id = conf["account_id"]
+    cursor = get_sync_cursor(account_id)
+    if not cursor or not cursor["cursor_time"]:
+        return False
+
+    # 审计日志投递有延迟，每次回溯一段重叠时间，重复查询的实例由内容摘要跳过写入
+    overlap = datetime.timedelta(minutes=int(configs.get("sync_event_overlap", 10)))
+    start_time, end_time = cursor["cursor_time"] - overlap, datetime.datetime.now()
+    changed = lookup(start_time, end_time)
+
+    conf_regions = {r.strip() for r in conf["region"].split(",") if r.strip()}
+    changed = {region: ids for region, ids in changed.items() if ids and region in conf_regions}
+    logging.info(f"增量同步：「{cloud_name}」-「{account_id}」-「{resource_type}」, 变更实例: {sum(map(len, changed.values()))}")
+
+    if changed:
+        results = sync_scheduler.run_regions(
+            cloud_name,
+            f"{resource_type}(增量)",
+            conf,
+            lambda region: sync_region(region, sorted(changed[region])),
+            regions=list(changed),
+        )
+        if not all(results):
+            return False
+    save_sync_cursor(cloud_name, account_id, cursor_time=end_time)
+    return True
+
+
+if __name__ == "__main__":
+    pass
@@ -2,16 +2,31 @@
 # @Author: Dongdong Liu
 # @Date: 2025/2/8
 # @Description: Description
+import atexit
+import base64
 import json
 import logging
+import os
+import threading
 import time
 
 from confluent_kafka import Producer, KafkaException
 from websdk2.configs import configs
 from websdk2.consts import const
 
+from settings import settings
+
+if configs.can_import:
+    configs.import_dict(**settings)
+
 
 class KafkaProducer:
+    """
+    异步模式(kafka_async=yes)下 send 只把消息放入本地队列立即返回，由librdkafka按 linger/batch 批量发送，
+    后台线程负责 poll 投递回调；本地队列满或投递失败的消息落盘，broker恢复后重新发送
+    同步模式保持每条消息 flush 的行为
+    """
+
     def __init__(
         self, bootstrap_servers=None, client_id: str = None, topic=None):
         if bootstrap_servers is None:
@@ -26,6 +41,20 @@ class KafkaProducer:
             self.topic = configs[const.KAFKA_TOPIC]
         else:
             self.topic = topic
+        self.is_async = configs.get("kafka_async", "yes") == "yes"
+        self.spill_path = configs.get("kafka_spill_path", "/tmp/cmdb_kafka_spill.log")
+        self.spill_max_bytes = int(configs.get("kafka_spill_max_mb", 100)) * 1024 * 1024
+        # 投递失败次数达到上限的消息不再重发，写入死信文件
+        self.dead_letter_path = f"{self.spill_path}.dead"
+        self.max_attempts = int(configs.get("kafka_replay_max_attempts", 5))
+        self.max_backoff = int(configs.get("kafka_replay_max_backoff", 600))
+        self._metrics = dict(sent=0, delivered=0, failed=0, spilled=0, replayed=0, dropped=0, dead_lettered=0)
+        self._metrics_lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._last_delivered = 0.0
+        self._replay_rounds = 0
+        self._next_replay = 0.0
+        self._closed = threading.Event()
         if not self.bootstrap_servers or not self.topic or not self.client_id:
             logging.warning("kafka config is not configured")
             self.producer = None
@@ -39,18 +68,151 @@ class KafkaProducer:
             "request.timeout.ms": 3000,
             "client.id": self.client_id,
         }
+        if self.is_async:
+            producer_conf.update({
+                "linger.ms": int(configs.get("kafka_linger_ms", 50)),  # 攒批等待时间
+                "batch.num.messages": int(configs.get("kafka_batch_size", 500)),  # 每批最多消息数
+                "queue.buffering.max.messages": int(configs.get("kafka_buffer_max_messages", 10000)),  # 本地队列上限
+                "message.timeout.ms": int(configs.get("kafka_message_timeout_ms", 30000)),  # 超时后回调失败并落盘
+            })
         self.producer = Producer(producer_conf)
+        if self.is_async:
+            threading.Thread(target=self._poll_loop, name="kafka-poll", daemon=True).start()
+            atexit.register(self.close)
 
-    def send(self, message, timeout=3):
-        if self.producer is None:
-            logging.warning("kafka producer is not configured")
-            return
+    def _incr(self, key: str, count: int = 1):
+        with self._metrics_lock:
+            self._metrics[key] += count
+
+    def metrics(self) -> dict:
+        """发送统计和本地待发送数量"""
+        with self._metrics_lock:
+            data = dict(self._metrics)
+        data["queued"] = len(self.producer) if self.producer is not None else 0
+        data["spill_bytes"] = os.path.getsize(self.spill_path) if os.path.exists(self.spill_path) else 0
+        data["dead_letter_bytes"] = (
+            os.path.getsize(self.dead_letter_path) if os.path.exists(self.dead_letter_path) else 0
+        )
+        data["next_replay_in"] = max(0, round(self._next_replay - time.time(), 1))
+        return data
+
+    @staticmethod
+    def _encode(message) -> bytes:
         if isinstance(message, dict):  # 如果是字典，转换为 JSON 字符串
-            message = json.dumps(message).encode("utf-8")  # 变成 bytes
+            return json.dumps(message).encode("utf-8")  # 变成 bytes
         elif isinstance(message, str):
-            message = message.encode("utf-8")
+            return message.encode("utf-8")
         elif not isinstance(message, bytes):
             raise TypeError("message 必须是 dict, str 或 bytes 类型")
+        return message
+
+    def _delivery_callback(self, attempts: int):
+        """attempts 为该消息此前已失败的次数"""
+        return lambda err, msg: self._on_delivery(err, msg, attempts)
+
+    def _on_delivery(self, err, msg, attempts: int = 0):
+        """投递回调，在 poll 线程中执行"""
+        if err is None:
+            self._incr("delivered")
+            self._last_delivered = time.time()
+            if attempts:
+                # 重发的消息投递成功，恢复正常的重发间隔
+                self._replay_rounds = 0
+            return
+        self._incr("failed")
+        attempts += 1
+        if attempts >= self.max_attempts:
+            # 消息过大、无权限等无法投递的消息不再重发
+            logging.error(f"[KafkaProducer]消息投递失败{attempts}次，写入死信文件: {err}")
+            self._spill([(attempts, msg.value())], path=self.dead_letter_path, metric="dead_lettered")
+            return
+        logging.error(f"[KafkaProducer]消息投递失败: {err}")
+        self._spill([(attempts, msg.value())])
+
+    def _spill(self, messages, path: str = None, metric: str = "spilled"):
+        """
+        消息落盘，每行一条 "失败次数 base64编码的消息"，超过上限后丢弃
+        :param messages: [(失败次数, 消息)]
+        """
+        path = path or self.spill_path
+        with self._spill_lock:
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            lines = []
+            for attempts, message in messages:
+                line = f"{attempts} ".encode("utf-8") + base64.b64encode(message) + b"\n"
+                if size + len(line) > self.spill_max_bytes:
+                    self._incr("dropped")
+                    continue
+                size += len(line)
+                lines.append(line)
+            if not lines:
+                logging.error(f"[KafkaProducer]落盘文件{path}已满，消息被丢弃")
+                return
+            with open(path, "ab") as f:
+                f.writelines(lines)
+            self._incr(metric, len(lines))
+
+    @staticmethod
+    def _parse_spill_line(line: bytes):
+        attempts, _, data = line.strip().rpartition(b" ")
+        return int(attempts or 0), base64.b64decode(data)
+
+    def _replay(self):
+        """broker恢复后重新发送落盘的消息，本地队列再次写满时剩余消息写回文件"""
+        with self._spill_lock:
+            if not os.path.exists(self.spill_path):
+                return
+            replay_path = f"{self.spill_path}.replay"
+            os.replace(self.spill_path, replay_path)
+        with open(replay_path, "rb") as f:
+            messages = [self._parse_spill_line(line) for line in f if line.strip()]
+        os.remove(replay_path)
+        for index, (attempts, message) in enumerate(messages):
+            try:
+                self.producer.produce(self.topic, message, on_delivery=self._delivery_callback(attempts))
+            except BufferError:
+                self._spill(messages[index:])
+                return
+            self._incr("replayed")
+        logging.info(f"[KafkaProducer]重新发送落盘消息{len(messages)}条")
+
+    def _poll_loop(self):
+        while not self._closed.is_set():
+            try:
+                self.producer.poll(0.5)
+                now = time.time()
+                # 最近一分钟有成功投递说明broker可用，按指数退避重发落盘消息
+                if (now - self._last_delivered < 60 and now >= self._next_replay
+                        and os.path.exists(self.spill_path)):
+                    self._replay()
+                    self._next_replay = now + min(5 * 2 ** self._replay_rounds, self.max_backoff)
+                    self._replay_rounds += 1
+            except Exception as e:
+                logging.error(f"[KafkaProducer]poll error: {e}")
+                time.sleep(1)
+
+    def close(self, timeout=5):
+        """退出前尽量发送完本地队列，剩余消息落盘"""
+        if self.producer is None or self._closed.is_set():
+            return
+        self._closed.set()
+        remaining = self.producer.flush(timeout=timeout)
+        if remaining:
+            logging.warning(f"[KafkaProducer]退出时仍有{remaining}条消息未发送")
+
+    def send(self, message, timeout=3):
+        if self.producer is None:
+            logging.warning("kafka producer is not configured")
+            return
+        message = self._encode(message)
+        if self.is_async:
+            try:
+                self.producer.produce(self.topic, message, on_delivery=self._on_delivery)
+                self._incr("sent")
+            except BufferError:
+                # 本地队列已满，说明broker不可用或发送过慢
+                self._spill([(0, message)])
+            return
         try:
             self.producer.produce(self.topic, message)
             if self.producer.flush(timeout=timeout) != 0:
@@ -7,12 +7,25 @@
 # @Desc    :   Proxmox VE 虚拟机实例
 from typing import Optional, Dict, Any, Tuple, List
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
 import urllib3
 
 import requests
+from requests.adapters import HTTPAdapter
+from websdk2.cache_context import cache_conn
+from websdk2.configs import configs
 
 from models.models_utils import server_task, mark_expired, mark_expired_by_sync, server_task_batch
+from settings import settings
+
+if configs.can_import:
+    configs.import_dict(**settings)
+
+# 虚拟机最近一次从guest agent获取到的IP，agent无响应时沿用
+# 字段为 "vmid:名称"，vmid 被新虚拟机复用时不会沿用已删除虚拟机的IP
+VM_IP_CACHE_KEY = "cmdb:pve:vm_ip:{}"
+VM_IP_CACHE_TTL = 7 * 24 * 3600
 
 
 # 解决自签名 CA 警告
@@ -30,7 +43,7 @@ def handle_pve_exceptions(func):
         try:
             return func(*args, **kwargs)
         except requests.exceptions.RequestException as e:
-            logging.error(f"PVE API 请求错误: {str}")
+            logging.error(f"PVE API 请求错误: {str(e)}")
             raise PVERequestError(f"PVE API请求错误: {str(e)}")
         except Exception as e:
             logging.error(f"PVE API调用异常: {str(e)}")
@@ -77,6 +90,12 @@ class PveVM(object):
         self.server_addr = server_addr
         self.base_url = f"https://{self.server_addr}/{self.API_PATH}"
         self.__ticket: Optional[Dict[str, str]] = None
+        self.agent_workers = int(configs.get('pve_agent_workers', 20))
+        self.agent_timeout = float(configs.get('pve_agent_timeout', 3))
+        # guest agent 并发查询共用连接池
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.agent_workers)
+        self.session.mount('https://', adapter)
 
     def _make_request(self, method: str, path: str, data: Optional[Dict[str, Any]] = None,  **kwargs) -> requests.Response:
         """构建请求
@@ -99,9 +118,9 @@ class PveVM(object):
         kwargs.update({
             'headers': headers,
             'verify': self.VERIFY_SSL,
-            'timeout': self.DEFAULT_TIMEOUT
         })
-        response = requests.request(method, url, data=data, **kwargs)
+        kwargs.setdefault('timeout', self.DEFAULT_TIMEOUT)
+        response = self.session.request(method, url, data=data, **kwargs)
         return response
 
     @handle_pve_exceptions
@@ -149,12 +168,25 @@ class PveVM(object):
         return response.json()
 
     @handle_pve_exceptions
-    def get_vm_interfaces(self, node: str, vmid: str) -> Dict[str, Any]:
+    def get_cluster_vm_list(self) -> Dict[str, Any]:
+        """一次获取集群内所有节点的虚拟机
+
+        Returns:
+            dict: 虚拟机列表
+        """
+        if not self.__ticket:
+            raise PVERequestError("未获取认证票据")
+        response = self._make_request('GET', '/cluster/resources', params={'type': 'vm'})
+        return response.json()
+
+    @handle_pve_exceptions
+    def get_vm_interfaces(self, node: str, vmid: str, timeout: Optional[float] = None) -> Dict[str, Any]:
         """获取虚拟机网络接口信息
 
         Args:
             node (str): 节点名称
             vmid (str): 虚拟机ID
+            timeout (float): 请求超时时间，默认 DEFAULT_TIMEOUT
 
         Returns:
             str: 网络接口信息
@@ -162,7 +194,8 @@ class PveVM(object):
         if not self.__ticket:
             raise PVERequestError("未获取认证票据")
         response = self._make_request(
-            'GET', f'/nodes/{node}/qemu/{vmid}/agent/network-get-interfaces')
+            'GET', f'/nodes/{node}/qemu/{vmid}/agent/network-get-interfaces',
+            timeout=timeout or self.DEFAULT_TIMEOUT)
         return response.json()
 
     @handle_pve_exceptions
@@ -196,33 +229,69 @@ class PveVM(object):
         else:
             return ""
 
+    def get_vm_ipv4(self, vm: Dict[str, Any]) -> str:
+        """通过guest agent获取IP，未开机或agent无响应时返回空"""
+        if vm.get('status') != 'running':
+            return ""
+        try:
+            return self.get_ipv4_from_interfaces(
+                self.get_vm_interfaces(vm['node'], vm['vmid'], timeout=self.agent_timeout))
+        except PVERequestError:
+            return ""
+
+    def fill_vm_ips(self, vms: List[Dict[str, Any]]) -> None:
+        """
+        并发查询guest agent，没有拿到IP的虚拟机沿用上次缓存的IP
+        缓存中不在本次集群资源列表里的虚拟机会被清理
+        """
+        with ThreadPoolExecutor(max_workers=self.agent_workers, thread_name_prefix="pve-agent") as executor:
+            ips = list(executor.map(self.get_vm_ipv4, vms))
+
+        cache_key = VM_IP_CACHE_KEY.format(self.account_id)
+        try:
+            redis_conn = cache_conn()
+            cached = redis_conn.hgetall(cache_key) or {}
+            cached = {(k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+                      for k, v in cached.items()}
+        except Exception as err:
+            logging.error(f"读取PVE虚拟机IP缓存失败: {err}")
+            redis_conn, cached = None, {}
+
+        fresh = {}
+        current = set()
+        for vm, ip in zip(vms, ips):
+            field = f"{vm.get('vmid')}:{vm.get('name')}"
+            current.add(field)
+            if ip:
+                fresh[field] = ip
+            vm['ipv4'] = ip or cached.get(field, "")
+        if redis_conn is None:
+            return
+        stale = [field for field in cached if field not in current]
+        try:
+            if stale:
+                redis_conn.hdel(cache_key, *stale)
+            if fresh:
+                redis_conn.hset(cache_key, mapping=fresh)
+            redis_conn.expire(cache_key, VM_IP_CACHE_TTL)
+        except Exception as err:
+            logging.error(f"写入PVE虚拟机IP缓存失败: {err}")
+
     def get_all_vm_list(self) -> List[Dict]:
         """获取所有虚拟机实例
 
         Returns:
             dict: 虚拟机实例列表
         """
-        all_vms = []
         if not self.get_ticket():
             return []
-        nodes = self.get_node_list()
-
-        for node in nodes['data']:
-            vms = self.get_vm_list(node['node'])
-            if not vms:
-                continue
-
-            # 处理节点下的所有虚拟机
-            all_vms.extend([
-                self.process_data({
-                    **vm,
-                    'ipv4': self.get_ipv4_from_interfaces(
-                        self.get_vm_interfaces(node['node'], vm['vmid'])
-                    )
-                })
-                for vm in vms['data']
-            ])
-        return all_vms
+        resources = self.get_cluster_vm_list()
+        # 集群资源里 lxc 容器也是 vm 类型，只同步 qemu 虚拟机
+        vms = [vm for vm in (resources or {}).get('data') or [] if vm.get('type') == 'qemu']
+        if not vms:
+            return []
+        self.fill_vm_ips(vms)
+        return [self.process_data(vm) for vm in vms]
 
     def process_data(self, data: Dict[str, Any]) -> Dict:
         """处理数据
@@ -240,7 +309,7 @@ class PveVM(object):
         item['name'] = data.get('name')
         item['instance_id'] = str(data.get('vmid', 0))
         item['region'] = self.server_addr
-        item['cpu'] = data.get('cpus')
+        item['cpu'] = data.get('cpus') or data.get('maxcpu')
         item['memory'] = convert_bytes_to_gb(data.get('maxmem', 0))
         item['disk'] = convert_bytes_to_gb(data.get('maxdisk', 0))
         item['zone'] = ""
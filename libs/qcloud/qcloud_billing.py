@@ -10,7 +10,6 @@ from typing import Any
 
 from tencentcloud.billing.v20180709 import billing_client
 from tencentcloud.billing.v20180709.models import DescribeAccountBalanceRequest, DescribeAccountBalanceResponse
-from tencentcloud.common import credential
 
 
 class QCloudBilling:
@@ -19,8 +18,7 @@ class QCloudBilling:
         self.access_key = access_key
         self.region = region
         self.account_id = account_id
-        self.__cred = credential.Credential(access_id, access_key)
-        self.client = billing_client.BillingClient(self.__cred, self.region)
+        self.client = qcloud_client(billing_client.BillingClient, access_id, access_key, self.region)
 
     def query_balance_acct(self, request: DescribeAccountBalanceRequest = None) -> DescribeAccountBalanceResponse:
         if request is None:
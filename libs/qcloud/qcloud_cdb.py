@@ -13,8 +13,9 @@ from typing import Any, Dict, List, Optional, Tuple
 
 from tencentcloud.cdb.v20170320 import cdb_client
 from tencentcloud.cdb.v20170320.models import DescribeDBInstancesRequest
-from tencentcloud.common import credential
 
+from libs.async_collector import AsyncCollector
+from libs.cloud_client import qcloud_client
 from models.models_utils import mark_expired, mark_expired_by_sync, mysql_task
 
 
@@ -41,33 +42,29 @@ def get_renew_type(val):
     return auto_renew_map.get(val, "未知")
 
 
-class QCloudCDB:
+class QCloudCDB(AsyncCollector):
     def __init__(self, access_id: str, access_key: str, region: str, account_id: str):
         self.cloud_name = "qcloud"
         self._offset = 0  # 偏移量,这里拼接的时候必须是字符串
         self._limit = 100  # 官方默认是20，大于100 需要设置偏移量再次请求：offset=100,offset={机器总数}
+        self.page_size = self._limit
         self._region = region
         self._account_id = account_id
-        self.__cred = credential.Credential(access_id, access_key)
-        self.client = cdb_client.CdbClient(self.__cred, self._region)
+        self._access_id = access_id
+        self._access_key = access_key
 
-    def get_all_cdb(self):
-        cdb_list = []
-        limit = self._limit
-        offset = self._offset
+    def make_client(self):
+        return qcloud_client(cdb_client.CdbClient, self._access_id, self._access_key, self._region)
+
+    def describe_page(self, offset: int) -> Tuple[list, Optional[int]]:
         req = DescribeDBInstancesRequest()
+        req.from_json_string(json.dumps({"Offset": offset, "Limit": self._limit}))
+        resp = self.client.DescribeDBInstances(req)
+        return resp.Items, resp.TotalCount
+
+    def get_all_cdb(self):
         try:
-            while True:
-                params = {"Offset": offset, "Limit": limit}
-                req.from_json_string(json.dumps(params))
-                resp = self.client.DescribeDBInstances(req)
-                if not resp.Items:
-                    break
-                cdb_list.extend(map(self.format_data, resp.Items))
-                offset += self._limit
-                if resp.TotalCount < self._limit:
-                    break
-            return cdb_list
+            return self.collect_all()
         except Exception as err:
             logging.error(f"腾讯云CDB  get all cdb {self._account_id} {err}")
             return []
@@ -123,31 +120,18 @@ class QCloudCDB:
         }
         return res
 
-    def sync_cmdb(
+    async def sync_cmdb_async(
         self, cloud_name: Optional[str] = "qcloud", resource_type: Optional[str] = "mysql"
     ) -> Tuple[bool, str]:
         """
         资产信息更新到DB
         :return:
         """
-        all_cdb_list: List[dict] = self.get_all_cdb()
-        if not all_cdb_list:
-            return False, "CDB列表为空"
-        # 更新资源
-        ret_state, ret_msg = mysql_task(account_id=self._account_id, cloud_name=cloud_name, rows=all_cdb_list)
-        # 标记过期
-        # mark_expired(resource_type=resource_type, account_id=self._account_id)
-        instance_ids = [cdb["instance_id"] for cdb in all_cdb_list]
-        mark_expired_by_sync(
-            cloud_name=cloud_name,
-            account_id=self._account_id,
-            resource_type=resource_type,
-            instance_ids=instance_ids,
-            region=self._region,
+        # 分页边采集边入库，采集完成后标记过期
+        return await self.stream_to_cmdb_async(
+            mysql_task, cloud_name, self._account_id, resource_type, region=self._region
         )
 
-        return ret_state, ret_msg
-
 
 # class QcloudCDBClient:
 #     def __init__(self, access_id: str, access_key: str, region: str, account_id):
@@ -9,13 +9,15 @@ Desc   : 腾讯云CVM主机自动发现
 
 import json
 import logging
+from functools import partial
 from typing import Dict, List, Optional, Tuple
 
-from tencentcloud.common import credential
 from tencentcloud.cvm.v20170312 import cvm_client
 from tencentcloud.cvm.v20170312.models import DescribeInstancesRequest,ModifyInstancesAttributeRequest
 
-from models.models_utils import mark_expired, mark_expired_by_sync, server_task, server_task_batch
+from libs.async_collector import AsyncCollector
+from libs.cloud_client import qcloud_client
+from models.models_utils import mark_expired, mark_expired_by_sync, server_task, server_task_batch, get_all_agent_info
 
 
 def get_run_type(val):
@@ -49,35 +51,38 @@ def get_renew_type(val):
     return renew_map.get(val, "未知")
 
 
-class QCloudCVM:
+class QCloudCVM(AsyncCollector):
     def __init__(self, access_id: str, access_key: str, region: str, account_id: str):
         self.cloud_name = "qcloud"
         self._offset = 0  # 偏移量,这里拼接的时候必须是字符串
         self._limit = 100  # 官方默认是20，大于100 需要设置偏移量再次请求：offset=100,offset={机器总数}
+        self.page_size = self._limit
         self._region = region
         self._account_id = account_id
-        self.__cred = credential.Credential(access_id, access_key)
-        self.client = cvm_client.CvmClient(self.__cred, self._region)
+        self._access_id = access_id
+        self._access_key = access_key
         # self.q_network_obj = QCloudNetwork(region=self._region, access_id=access_id, access_key=access_key,
         #                                    account_id=self._account_id)
 
-    def get_all_cvm(self):
-        cvm_list = []
-        limit = self._limit
-        offset = self._offset
+    def make_client(self):
+        return qcloud_client(cvm_client.CvmClient, self._access_id, self._access_key, self._region)
+
+    def describe_page(self, offset: int) -> Tuple[list, Optional[int]]:
+        req = DescribeInstancesRequest()
+        req.from_json_string(json.dumps({"Offset": offset, "Limit": self._limit}))
+        resp = self.client.DescribeInstances(req)
+        return resp.InstanceSet, resp.TotalCount
+
+    def describe_instances(self, instance_ids: List[str]) -> list:
+        """按实例ID查询CVM，单次最多100个"""
         req = DescribeInstancesRequest()
+        req.from_json_string(json.dumps({"InstanceIds": instance_ids, "Limit": self._limit}))
+        resp = self.client.DescribeInstances(req)
+        return resp.InstanceSet
+
+    def get_all_cvm(self):
         try:
-            while True:
-                params = {"Offset": offset, "Limit": limit}
-                req.from_json_string(json.dumps(params))
-                resp = self.client.DescribeInstances(req)
-                if not resp.InstanceSet:
-                    break
-                cvm_list.extend(map(self.format_data, resp.InstanceSet))
-                offset += self._limit
-                if resp.TotalCount < self._limit:
-                    break
-            return cvm_list
+            return self.collect_all()
         except Exception as err:
             logging.error(f"腾讯云CVM  get all cvm {self._account_id} {err}")
             return []
@@ -103,6 +108,7 @@ class QCloudCVM:
 
             res["instance_id"] = data.InstanceId
             res["vpc_id"] = vpc_id
+            res["vswitch_id"] = getattr(data.VirtualPrivateCloud, "SubnetId", None) or ""
             res["state"] = get_run_type(data.InstanceState)
             res["instance_type"] = data.InstanceType
             res["cpu"] = data.CPU
@@ -183,31 +189,19 @@ class QCloudCVM:
 
         server_task(account_id=self._account_id, cloud_name=cloud_name, rows=[res_data])
 
-    def sync_cmdb(
+    async def sync_cmdb_async(
         self, cloud_name: Optional[str] = "qcloud", resource_type: Optional[str] = "server"
     ) -> Tuple[bool, str]:
         """
         资产信息更新到DB
         :return:
         """
-        all_cvm_list: List[dict] = self.get_all_cvm()
-        if not all_cvm_list:
-            return False, "CVM列表为空"
-        # 更新资源
-        ret_state, ret_msg = server_task_batch(account_id=self._account_id, cloud_name=cloud_name, rows=all_cvm_list)
-        # 标记过期
-        # mark_expired(resource_type=resource_type, account_id=self._account_id)
-        instance_ids = [cvm["instance_id"] for cvm in all_cvm_list]
-        mark_expired_by_sync(
-            cloud_name=cloud_name,
-            account_id=self._account_id,
-            resource_type=resource_type,
-            instance_ids=instance_ids,
-            region=self._region,
+        # 分页边采集边入库，采集完成后标记过期
+        task = partial(server_task_batch, all_agent_info=get_all_agent_info())
+        return await self.stream_to_cmdb_async(
+            task, cloud_name, self._account_id, resource_type, region=self._region
         )
 
-        return ret_state, ret_msg
-
 
 if __name__ == "__main__":
     pass
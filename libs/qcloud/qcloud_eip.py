@@ -11,9 +11,9 @@ Desc    : 腾讯云 EIP
 from typing import *
 import json
 import logging
-from tencentcloud.common import credential
 from tencentcloud.vpc.v20170312 import vpc_client
 from tencentcloud.vpc.v20170312.models import DescribeAddressesRequest
+from libs.cloud_client import qcloud_client
 from models.models_utils import eip_task, mark_expired, mark_expired_by_sync
 
 
@@ -41,8 +41,7 @@ class QCloudEIP:
         self._offset = 0  # 偏移量,这里拼接的时候必须是字符串
         self._limit = 100  # 官方默认是20，大于100 需要设置偏移量再次请求
         self._account_id = account_id
-        self.__cred = credential.Credential(access_id, access_key)
-        self.client = vpc_client.VpcClient(self.__cred, self._region)
+        self.client = qcloud_client(vpc_client.VpcClient, access_id, access_key, self._region)
         self.req = DescribeAddressesRequest()
 
     def get_all_eip1(self):
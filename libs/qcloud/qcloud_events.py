@@ -11,6 +11,7 @@ import json
 import datetime
 from typing import *
 from tencentcloud.common import credential
+from tencentcloud.common.common_client import CommonClient
 from tencentcloud.cvm.v20170312 import cvm_client
 from tencentcloud.cvm.v20170312.models import DescribeTaskInfoRequest
 from websdk2.db_context import DBContext
@@ -40,6 +41,7 @@ class QCloudEventClient:
         cred = credential.Credential(access_id, access_key)
         # 实例化一个http选项，可选的，没有特殊需求可以跳过
         self.__client = cvm_client.CvmClient(cred, "ap-guangzhou")  # 不区分region
+        self.__audit_client = CommonClient("cloudaudit", "2019-03-19", cred, "ap-guangzhou")
 
     def get_cvm_events(self) -> List[Dict[str, Any]]:
         """
@@ -65,6 +67,32 @@ class QCloudEventClient:
         if not res_list: return []
         return list(map(self._cvm_format, res_list))
 
+    def get_changed_instance_ids(self, start_time: datetime.datetime, end_time: datetime.datetime,
+                                 resource_type: Optional[str] = 'cvm') -> Dict[str, Set[str]]:
+        """
+        调用操作审计LookUpEvents查询时间段内有变更的实例，用于增量同步
+        :return: {region: {instance_id}}
+        """
+        changed: Dict[str, Set[str]] = {}
+        params = {
+            "StartTime": int(start_time.timestamp()),
+            "EndTime": int(end_time.timestamp()),
+            "LookupAttributes": [{"AttributeKey": "ResourceType", "AttributeValue": resource_type}],
+            "MaxResults": 50
+        }
+        while True:
+            resp = self.__audit_client.call_json("LookUpEvents", params).get("Response", {})
+            for event in resp.get("Events") or []:
+                resource = event.get("Resources") or {}
+                region = event.get("ResourceRegion") or event.get("EventRegion")
+                for name in (resource.get("ResourceName") or "").split(","):
+                    if name.startswith("ins-") and region:
+                        changed.setdefault(region, set()).add(name)
+            if resp.get("ListOver") or not resp.get("NextToken"):
+                break
+            params["NextToken"] = resp["NextToken"]
+        return changed
+
     def _cvm_format(self, data) -> Dict[str, Any]:
         res: Dict[str, Any] = dict()
 
@@ -11,9 +11,9 @@ Desc    : 腾讯云 虚拟局域网
 import logging
 from typing import *
 import json
-from tencentcloud.common import credential
 from tencentcloud.cvm.v20170312 import cvm_client, models
 from tencentcloud.cvm.v20170312.models import DescribeImagesRequest
+from libs.cloud_client import qcloud_client
 from models.models_utils import image_task, mark_expired, mark_expired_by_sync
 
 
@@ -45,8 +45,7 @@ class QCloudCImg:
         self._limit = 100  # 官方默认是20，大于100 需要设置偏移量再次请求
         self._region = region
         self._account_id = account_id
-        self.__cred = credential.Credential(access_id, access_key)
-        self.client = cvm_client.CvmClient(self.__cred, self._region)
+        self.client = qcloud_client(cvm_client.CvmClient, access_id, access_key, self._region)
         self.req = DescribeImagesRequest()
 
     def get_all_img(self):
@@ -14,8 +14,9 @@ from typing import Any, Dict, List, Optional, Tuple
 from tencentcloud.clb.v20180317 import clb_client
 from tencentcloud.clb.v20180317.models import DescribeLoadBalancersRequest
 
-from tencentcloud.common import credential
 
+from libs.async_collector import AsyncCollector
+from libs.cloud_client import qcloud_client
 from models.models_utils import lb_task, mark_expired, mark_expired_by_sync
 
 
@@ -37,19 +38,20 @@ def get_renew_type(val):
     return {"AUTO_RENEW": "自动续费", "MANUAL_RENEW": "手动续费"}.get(val, "未知")
 
 
-class QCloudLB:
+class QCloudLB(AsyncCollector):
     def __init__(self, access_id: str, access_key: str, region: str, account_id: str):
         self._offset = 0  # 偏移量,这里拼接的时候必须是字符串
         self._limit = 100  # 官方默认是20，大于100 需要设置偏移量再次请求：offset=100,offset={机器总数}
+        self.page_size = self._limit
         self._access_id = access_id
         self._access_key = access_key
         self._region = region
         self._account_id = account_id
 
         self.region = region
-        self.__cred = credential.Credential(self._access_id, access_key)
-        self.client = clb_client.ClbClient(self.__cred, self.region)
-        self.req = DescribeLoadBalancersRequest()
+
+    def make_client(self):
+        return qcloud_client(clb_client.ClbClient, self._access_id, self._access_key, self.region)
 
     def format_lb_data(self, row, lb_type: Optional[str] = "clb") -> Dict[str, Any]:
         # 定义返回
@@ -95,54 +97,30 @@ class QCloudLB:
         res["renew_type"] = get_renew_type(renew_flag)
         return res
 
-    def get_lb_response(self, offset) -> list:
-        try:
-            params = {"Offset": offset, "Limit": self._limit}
-            self.req.from_json_string(json.dumps(params))
+    def describe_page(self, offset: int) -> Tuple[list, Optional[int]]:
+        req = DescribeLoadBalancersRequest()
+        req.from_json_string(json.dumps({"Offset": offset, "Limit": self._limit}))
+        # 返回的resp是一个DescribeLoadBalancersResponse的实例，与请求对象对应
+        resp = self.client.DescribeLoadBalancers(req)
+        return resp.LoadBalancerSet, resp.TotalCount
 
-            # 返回的resp是一个DescribeLoadBalancersResponse的实例，与请求对象对应
-            resp = self.client.DescribeLoadBalancers(self.req)
-            return resp.LoadBalancerSet
+    def format_data(self, row) -> Dict[str, Any]:
+        return self.format_lb_data(row)
+
+    def get_all_slb(self):
+        try:
+            return self.collect_all()
         except Exception as err:
             logging.error(err)
             return []
 
-    def get_all_slb(self):
-        offset = self._offset
-        all_lb_list: List = []
-        while True:
-            rows = self.get_lb_response(offset)
-            if not rows:
-                break
-            offset += self._limit
-
-            if not rows:
-                break
-            for row in rows:
-                data = self.format_lb_data(row)
-                all_lb_list.append(data)
-            # yield all_lb_list
-        return all_lb_list
-
-    def sync_cmdb(self, cloud_name: Optional[str] = "qcloud", resource_type: Optional[str] = "lb") -> Tuple[bool, str]:
+    async def sync_cmdb_async(
+        self, cloud_name: Optional[str] = "qcloud", resource_type: Optional[str] = "lb"
+    ) -> Tuple[bool, str]:
         """
         同步CMDB
         """
-        all_alb_list: List[list, Any, None] = self.get_all_slb()
-        if not all_alb_list:
-            return False, "CLB列表为空"
-        # 同步资源
-        ret_state, ret_msg = lb_task(account_id=self._account_id, cloud_name=cloud_name, rows=all_alb_list)
-
-        # 标记过期
-        # mark_expired(resource_type=resource_type, account_id=self._account_id)
-        instance_ids = [lb["instance_id"] for lb in all_alb_list]
-        mark_expired_by_sync(
-            cloud_name=cloud_name,
-            account_id=self._account_id,
-            resource_type=resource_type,
-            instance_ids=instance_ids,
-            region=self._region,
+        # 分页边采集边入库，采集完成后标记过期
+        return await self.stream_to_cmdb_async(
+            lb_task, cloud_name, self._account_id, resource_type, region=self._region
         )
-
-        return ret_state, ret_msg
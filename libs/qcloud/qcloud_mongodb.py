@@ -8,11 +8,11 @@ from __future__ import print_function
 import logging
 from typing import List, Union
 
-from tencentcloud.common import credential
 from tencentcloud.mongodb.v20190725 import models, mongodb_client
 from tencentcloud.mongodb.v20190725.models import (DescribeDBInstancesRequest, DescribeDBInstancesResponse,
                                                    DescribeDBInstanceURLRequest)
 
+from libs.cloud_client import qcloud_client
 from models.models_utils import mark_expired, mark_expired_by_sync, mongodb_task
 
 
@@ -36,8 +36,7 @@ class QcloudMongoDB:
         self._account_id = account_id
 
         self.region = region
-        self.__cred = credential.Credential(self._access_id, access_key)
-        self.client = mongodb_client.MongodbClient(self.__cred, self.region)
+        self.client = qcloud_client(mongodb_client.MongodbClient, self._access_id, access_key, self.region)
         self.req = DescribeDBInstancesRequest()
 
     def describe_mongodb_instance(self, offset: int) -> Union[DescribeDBInstancesResponse, None]:
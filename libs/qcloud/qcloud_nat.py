@@ -10,10 +10,10 @@ import json
 import logging
 from typing import *
 
-from tencentcloud.common import credential
 from tencentcloud.vpc.v20170312 import vpc_client
 from tencentcloud.vpc.v20170312.models import DescribeNatGatewaysRequest
 
+from libs.cloud_client import qcloud_client
 from models.models_utils import nat_task, mark_expired, mark_expired_by_sync
 
 def get_run_type(val):
@@ -42,8 +42,7 @@ class QCloudNAT:
         self._limit = 5  # 官方默认是20，大于100 需要设置偏移量再次请求：offset=100,offset={机器总数}
         self._region = region
         self._account_id = account_id
-        self.__cred = credential.Credential(access_id, access_key)
-        self.client = vpc_client.VpcClient(self.__cred, self._region)
+        self.client = qcloud_client(vpc_client.VpcClient, access_id, access_key, self._region)
         
     
     def describe_nat_gateways(self, offset: int = 0) -> List:
@@ -11,10 +11,10 @@ import json
 import logging
 from typing import Any, Dict, List, Optional, Tuple
 
-from tencentcloud.common import credential
 from tencentcloud.redis.v20180412 import  redis_client
 from tencentcloud.redis.v20180412.models import DescribeInstancesRequest
 
+from libs.cloud_client import qcloud_client
 from models.models_utils import mark_expired, mark_expired_by_sync, redis_task
 
 
@@ -79,8 +79,7 @@ class QCloudRedis:
         self._limit = 100  # 官方默认是20，大于100 需要设置偏移量再次请求：offset=100,offset={机器总数}
         self._region = region
         self._account_id = account_id
-        self.__cred = credential.Credential(access_id, access_key)
-        self.client = redis_client.RedisClient(self.__cred, self._region)
+        self.client = qcloud_client(redis_client.RedisClient, access_id, access_key, self._region)
 
     def get_all_redis(self):
         redis_list = []
@@ -11,10 +11,10 @@ Desc    : 腾讯云安全组
 import json
 import logging
 from typing import *
-from tencentcloud.common import credential
 from tencentcloud.vpc.v20170312 import vpc_client
 from tencentcloud.vpc.v20170312.models import (DescribeSecurityGroupsRequest, DescribeSecurityGroupPoliciesRequest,
                                                DescribeSecurityGroupReferencesRequest)
+from libs.cloud_client import qcloud_client
 from models.models_utils import security_group_task, mark_expired, mark_expired_by_sync
 
 
@@ -24,8 +24,7 @@ class QCloudSecurityGroup:
         self._offset = 0  # 偏移量,这里拼接的时候必须是字符串
         self._limit = 100  # 官方默认是20，大于100 需要设置偏移量再次请求
         self._account_id = account_id
-        self.__cred = credential.Credential(access_id, access_key)
-        self.client = vpc_client.VpcClient(self.__cred, self._region)
+        self.client = qcloud_client(vpc_client.VpcClient, access_id, access_key, self._region)
 
     def get_all_security_group(self):
         security_group_list = []
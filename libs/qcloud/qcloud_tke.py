@@ -8,11 +8,11 @@ from __future__ import print_function
 
 import logging
 
-from tencentcloud.common import credential
 from tencentcloud.tke.v20180525 import tke_client
 from tencentcloud.tke.v20180525.models import (DescribeEKSClustersRequest, DescribeClustersRequest,
                                                DescribeClusterStatusRequest)
 
+from libs.cloud_client import qcloud_client
 from models.models_utils import cluster_task, mark_expired, mark_expired_by_sync
 
 
@@ -30,8 +30,7 @@ class QcloudTKE:
         self._account_id = account_id
 
         self.region = region
-        self.__cred = credential.Credential(self._access_id, access_key)
-        self.client = tke_client.TkeClient(self.__cred, self.region)
+        self.client = qcloud_client(tke_client.TkeClient, self._access_id, access_key, self.region)
         self.req = DescribeEKSClustersRequest()
 
     def describe_tke_instance(self, offset: int):
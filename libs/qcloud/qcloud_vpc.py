@@ -12,10 +12,10 @@ import json
 import logging
 from typing import Any, Dict, List, Optional, Tuple
 
-from tencentcloud.common import credential
 from tencentcloud.vpc.v20170312 import vpc_client
 from tencentcloud.vpc.v20170312.models import DescribeVpcsRequest, DescribeNetworkInterfacesRequest
 
+from libs.cloud_client import qcloud_client
 from models.models_utils import mark_expired, mark_expired_by_sync, vpc_task
 
 
@@ -25,8 +25,7 @@ class QCloudCVPC:
         self._limit = 100  # 官方默认是20，大于100 需要设置偏移量再次请求
         self._region = region
         self._account_id = account_id
-        self.__cred = credential.Credential(access_id, access_key)
-        self.client = vpc_client.VpcClient(self.__cred, self._region)
+        self.client = qcloud_client(vpc_client.VpcClient, access_id, access_key, self._region)
         self.req = DescribeVpcsRequest()
 
     def get_all_vpc(self):
@@ -94,8 +93,7 @@ class QCloudNetwork:
 
         self._region = region
         self._account_id = account_id
-        self.__cred = credential.Credential(access_id, access_key)
-        self.client = vpc_client.VpcClient(self.__cred, self._region)
+        self.client = qcloud_client(vpc_client.VpcClient, access_id, access_key, self._region)
         self.req = DescribeNetworkInterfacesRequest()
 
     def get_all_network_interface(self):
@@ -11,9 +11,9 @@ Desc    : 腾讯云 虚拟子网
 import json
 import logging
 from typing import *
-from tencentcloud.common import credential
 from tencentcloud.vpc.v20170312 import vpc_client
 from tencentcloud.vpc.v20170312.models import DescribeSubnetsRequest
+from libs.cloud_client import qcloud_client
 from models.models_utils import vswitch_task, mark_expired, mark_expired_by_sync
 
 
@@ -23,8 +23,7 @@ class QcloudVSwitch:
         self._offset = 0  # 偏移量,这里拼接的时候必须是字符串
         self._limit = 100  # 官方默认是20，大于100 需要设置偏移量再次请求
         self._account_id = account_id
-        self.__cred = credential.Credential(access_id, access_key)
-        self.client = vpc_client.VpcClient(self.__cred, self._region)
+        self.client = qcloud_client(vpc_client.VpcClient, access_id, access_key, self._region)
         self.req = DescribeSubnetsRequest()
 
     def get_all_subnet(self) -> list:
@@ -12,18 +12,24 @@ import time
 from typing import *
 import concurrent
 from concurrent.futures import ThreadPoolExecutor
-from models.models_utils import get_cloud_config, sync_log_task
+from functools import partial
+from models.models_utils import get_cloud_config, get_all_agent_info, server_task_batch
 from websdk2.tools import RedisLock
 from libs import deco
+from libs.async_collector import AsyncCollector, sync_collectors
+from libs.sync_scheduler import sync_scheduler
+from libs.incremental_sync import incremental_sync
+from libs.qcloud.qcloud_cvm import QCloudCVM
+from libs.qcloud.qcloud_events import QCloudEventClient
 from libs.qcloud import mapping, DEFAULT_CLOUD_NAME
 from libs.mycrypt import MyCrypt
 
 mc = MyCrypt()
 
 
-def sync(data: Dict[str, Any]):
+def sync(data: Dict[str, Any]) -> bool:
     """
-    腾讯统一资产入库，云厂商用for，产品用并发，地区用for
+    腾讯统一资产入库，云厂商用for，产品用并发，地区用并发
     """
     # 参数
     obj, cloud_type, account_id = data.get("obj"), data.get("type"), data.get("account_id")
@@ -31,41 +37,21 @@ def sync(data: Dict[str, Any]):
     # 获取AK SK配置信息
     cloud_configs: List[Dict[str, str]] = get_cloud_config(cloud_name=DEFAULT_CLOUD_NAME, account_id=account_id)
     if not cloud_configs:
-        return
+        return False
 
-    # 考虑到多个region的情况
+    # 考虑到多个region的情况，地域并发执行
+    is_success = True
     for conf in cloud_configs:
-        region_list = conf["region"].split(",")
-        for region in region_list:
-            logging.info(f"同步开始, 信息：「{DEFAULT_CLOUD_NAME}」-「{cloud_type}」-「{region}」.")
-            # 开始时间
-            the_start_time = time.time()
+        access_key = mc.my_decrypt(conf["access_key"])
+
+        def sync_region(region: str, conf=conf, access_key=access_key) -> Tuple[bool, str]:
             # Ps:这里有个小坑： 编辑器识别不出来obj是那个Class,所以就算是参数传错了也不会有提示，可以自己用AliyunEventClient替换测试下
-            is_succ, msg = obj(
-                access_id=conf["access_id"],
-                access_key=mc.my_decrypt(conf["access_key"]),
-                account_id=conf["account_id"],
-                region=region,
+            return obj(
+                access_id=conf["access_id"], access_key=access_key, account_id=conf["account_id"], region=region
             ).sync_cmdb()
-            # 结束时间
-            the_end_time = time.time() - the_start_time
-            sync_consum = "%.2f" % the_end_time
-            sync_state = "success" if is_succ else "failed"
-            # 记录同步信息入库
-            sync_log_task(
-                dict(
-                    name=conf["name"],
-                    cloud_name=DEFAULT_CLOUD_NAME,
-                    sync_type=cloud_type,
-                    account_id=conf["account_id"],
-                    sync_region=region,
-                    sync_state=sync_state,
-                    sync_consum=sync_consum,
-                    loginfo=str(msg),
-                )
-            )
-            logging.info(f"同步结束, 信息：「{DEFAULT_CLOUD_NAME}」-「{cloud_type}」-「{region}」.")
-            continue
+
+        is_success = all(sync_scheduler.run_regions(DEFAULT_CLOUD_NAME, cloud_type, conf, sync_region)) and is_success
+    return is_success
 
 
 def main(account_id: Optional[str] = None, resources: List[str] = None, executors=None):
@@ -85,29 +71,77 @@ def main(account_id: Optional[str] = None, resources: List[str] = None, executor
     # 定义账户级别的任务锁，确保同一账户的任务不会并发执行且支持多账户执行
     @deco(RedisLock(f"async_qcloud_to_cmdb_{account_id}_redis_lock_key"
                     if account_id else "async_qcloud_to_cmdb_redis_lock_key"), release=True)
-    def index():
+    def index() -> bool:
         filtered_sync_mapping = {k: v for k, v in sync_mapping.items() if k in resources} if resources else sync_mapping
         if not filtered_sync_mapping:
             logging.warning("未找到需要同步的资源类型")
-            return
+            return True
+        # 基于 AsyncCollector 的资源每个账号合并到一个事件循环同步，其余资源按类型并发
+        sync_configs = list(filtered_sync_mapping.values())
+        jobs = [partial(sync, config) for config in sync_configs if not issubclass(config["obj"], AsyncCollector)]
+        collector_configs = [config for config in sync_configs if issubclass(config["obj"], AsyncCollector)]
+        if collector_configs:
+            jobs.append(partial(sync_collectors, DEFAULT_CLOUD_NAME, account_id, collector_configs))
         if executors:
             # 使用传入的线程池
             futures = []
-            for config in filtered_sync_mapping.values():
-                future = executors.submit(sync, config)
+            for job in jobs:
+                future = executors.submit(job)
                 futures.append(future)
 
             # 等待所有任务完成
+            results = []
             for future in futures:
                 try:
-                    future.result()
+                    results.append(future.result())
                 except Exception as e:
+                    results.append(False)
                     logging.error(f"资源同步任务失败: {e}")
         else:
-            with ThreadPoolExecutor(max_workers=len(filtered_sync_mapping)) as executor:
-                executor.map(sync, filtered_sync_mapping.values())
+            with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+                results = list(executor.map(lambda job: job(), jobs))
+        # 全部资源的全部地域都成功才算完成
+        return all(results)
+
+    return index()
+
+
+# 增量同步只覆盖云主机，其余资源类型在增量周期内仍按全量同步
+INCREMENTAL_RESOURCES: List[str] = ["云主机"]
+
+
+def incremental_main(account_id: str) -> bool:
+    """
+    增量同步入口，两次全量同步之间只重新查询操作审计中有变更的CVM
+    :param account_id: 账号ID，对应 CMDB 的唯一标识
+    :return: 是否成功，失败时由调用方回退到全量同步
+    """
+    cloud_configs: List[Dict[str, str]] = get_cloud_config(cloud_name=DEFAULT_CLOUD_NAME, account_id=account_id)
+    if not cloud_configs:
+        return False
+
+    @deco(RedisLock(f"async_qcloud_to_cmdb_{account_id}_redis_lock_key"), release=True)
+    def index() -> bool:
+        is_success = True
+        for conf in cloud_configs:
+            access_key = mc.my_decrypt(conf["access_key"])
+
+            def lookup(start_time, end_time, conf=conf, access_key=access_key) -> Dict[str, Set[str]]:
+                # 操作审计不区分地域，一次查询所有地域的变更
+                return QCloudEventClient(
+                    access_id=conf["access_id"], access_key=access_key, account_id=conf["account_id"], region=None
+                ).get_changed_instance_ids(start_time, end_time)
+
+            def sync_region(region: str, instance_ids: List[str], conf=conf, access_key=access_key) -> Tuple[bool, str]:
+                task = partial(server_task_batch, all_agent_info=get_all_agent_info())
+                return QCloudCVM(
+                    access_id=conf["access_id"], access_key=access_key, account_id=conf["account_id"], region=region
+                ).sync_instances(task, DEFAULT_CLOUD_NAME, conf["account_id"], instance_ids)
+
+            is_success = incremental_sync(DEFAULT_CLOUD_NAME, conf, "server", lookup, sync_region) and is_success
+        return is_success
 
-    index()
+    return index()
 
 
 if __name__ == "__main__":
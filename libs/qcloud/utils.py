@@ -5,15 +5,13 @@
 # @Describe:
 
 import json
-from tencentcloud.common import credential
 from tencentcloud.common.exception.tencent_cloud_sdk_exception import TencentCloudSDKException
 from tencentcloud.cvm.v20170312 import cvm_client, models as cvm_models
 from tencentcloud.vpc.v20170312 import vpc_client, models as vpc_models
 
 from typing import *
-from models.models_utils import get_cloud_config
+from libs.cloud_client import credential_cache, qcloud_client
 from libs.qcloud import  DEFAULT_CLOUD_NAME
-from libs.mycrypt import mc
 import logging
 import traceback
 
@@ -26,14 +24,11 @@ class QCloudAPI(object):
         self._region = region
         if account_id:
             self._access_id, self._access_key = self._get_access(account_id)
-        self.__cred = credential.Credential(self._access_id, self._access_key)
-        self.cvm = cvm_client.CvmClient(self.__cred, self._region)
-        self.vpc = vpc_client.VpcClient(self.__cred, self._region)
+        self.cvm = qcloud_client(cvm_client.CvmClient, self._access_id, self._access_key, self._region)
+        self.vpc = qcloud_client(vpc_client.VpcClient, self._access_id, self._access_key, self._region)
 
     def _get_access(self, account_id):
-        cloud_configs: List[Dict[str, str]] = get_cloud_config(cloud_name=DEFAULT_CLOUD_NAME, account_id=account_id)
-        if not cloud_configs: return
-        return cloud_configs[0]['access_id'], mc.my_decrypt(cloud_configs[0]['access_key'])
+        return credential_cache.get(DEFAULT_CLOUD_NAME, account_id)
 
     def get_price_ins(self, params):
         """获取cvm实例费用"""
@@ -73,6 +68,18 @@ class QCloudAPI(object):
             error = err
         return error, data
 
+    def get_cvm_ins_type_configs(self):
+        """获取当前地域所有可用区的实例类型配置"""
+        error, data = None, None
+        try:
+            req = cvm_models.DescribeInstanceTypeConfigsRequest()
+            resp = self.cvm.DescribeInstanceTypeConfigs(req)
+            data = json.loads(resp.to_json_string())
+        except TencentCloudSDKException as err:
+            logging.error(traceback.format_exc())
+            error = err
+        return error, data
+
     def get_bandwidth_packages(self, **params):
         """获取实例类型的配置"""
         error, data = None, None
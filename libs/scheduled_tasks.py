@@ -8,9 +8,9 @@ import logging
 import re
 import time
 from collections import Counter, defaultdict
-from typing import Dict, List, Optional, Set
+from typing import Dict, List, Optional, Set, Tuple
 
-from sqlalchemy import exists
+from sqlalchemy import exists, or_
 from websdk2.api_set import api_set
 from websdk2.client import AcsClient
 from websdk2.configs import configs
@@ -18,7 +18,9 @@ from websdk2.db_context import DBContext
 from websdk2.model_utils import queryset_to_list
 from websdk2.tools import RedisLock
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 
+from cmp.utils.cloud_ins_type import sync_tx_ins_type_catalog
 from libs import deco
 from libs.api_gateway.fs.rebot import FeishuBot
 from libs.inspector.base import InspectorResult, InspectorStatus
@@ -28,6 +30,8 @@ from libs.inspector.volc.auto_renew import VolCAutoRenewInspector
 from libs.inspector.volc.billing import VolCBillingInspector
 from libs.inspector.aliyun.billing import AliyunBillingInspector
 from libs.mycrypt import MyCrypt
+from libs.search_index import rebuild_search_index
+from libs.tree_cache import tree_cache
 from libs.qcloud.qcloud_billing import QCloudBilling
 from libs.aliyun.aliyun_billing import AliyunBilling
 # scheduler import moved inside functions to avoid circular import
@@ -36,9 +40,9 @@ from models import TreeAssetModels, asset_mapping
 from models.agent import AgentModels
 from models.asset import AgentBindStatus, AssetServerModels, AssetMySQLModels, AssetLBModels, AssetRedisModels
 from models.cloud import CloudSettingModels,CloudBillingSettingModels
-from models.models_utils import get_cloud_config
+from models.cloud_region import CloudRegionModels
+from models.models_utils import get_cloud_config, rebuild_server_relations
 from services.asset_server_service import get_unique_servers
-from services.cloud_region_service import get_servers_by_cloud_region_id
 from settings import settings
 
 if configs.can_import:
@@ -82,53 +86,167 @@ def bind_agent_tasks():
         logging.error(f"agent绑定主机出错 {str(err)}")
 
 
+def rebuild_server_relations_tasks():
+    """
+    重建主机与安全组/VPC/虚拟子网的关联表
+    """
+
+    @deco(RedisLock("rebuild_server_relations_redis_lock_key"), release=True)
+    def index():
+        logging.info("开始重建主机关联表")
+        rebuild_server_relations()
+        logging.info("重建主机关联表结束")
+
+    try:
+        index()
+    except Exception as err:
+        logging.error(f"重建主机关联表出错 {str(err)}")
+
+
+def rebuild_search_index_tasks():
+    """
+    重建全局搜索索引
+    """
+
+    @deco(RedisLock("rebuild_search_index_redis_lock_key"), release=True)
+    def index():
+        logging.info("开始重建全局搜索索引")
+        rebuild_search_index()
+        logging.info("重建全局搜索索引结束")
+
+    try:
+        index()
+    except Exception as err:
+        logging.error(f"重建全局搜索索引出错 {str(err)}")
+
+
+def sync_cmp_ins_type_catalog_tasks():
+    """
+    同步申购使用的腾讯云实例类型目录
+    """
+
+    @deco(RedisLock("sync_cmp_ins_type_catalog_redis_lock_key"), release=True)
+    def index():
+        logging.info("开始同步实例类型目录")
+        sync_tx_ins_type_catalog()
+        logging.info("同步实例类型目录结束")
+
+    try:
+        index()
+    except Exception as err:
+        logging.error(f"同步实例类型目录出错 {str(err)}")
+
+
+def build_agent_server_index(session) -> Dict[Tuple[str, str], Tuple[int, str]]:
+    """
+    一次加载全部云区域的VPC规则和运行中的主机，构建 (云区域ID, 内网IP) -> (主机ID, 主机agent_id) 索引
+    没有设置主agent的主机才参与匹配，已绑定主agent的云主机不再绑定
+    :param session: 数据库会话
+    :return:
+    """
+    # 云区域 -> VPC集合，规则里没有启用的VPC时匹配全部主机
+    region_vpcs: Dict[str, Optional[Set[str]]] = {}
+    for cloud_region_id, asset_group_rules in session.query(
+        CloudRegionModels.cloud_region_id, CloudRegionModels.asset_group_rules
+    ):
+        if not asset_group_rules:
+            continue
+        region_vpcs[cloud_region_id] = {
+            query["query_value"][-1] for sublist in asset_group_rules for query in sublist
+            if query["query_name"] == "vpc" and query["status"] == 1
+        } or None
+    if not region_vpcs:
+        return {}
+
+    vpc_regions: Dict[str, List[str]] = defaultdict(list)
+    all_vpc_regions = []
+    for cloud_region_id, vpcs in region_vpcs.items():
+        if vpcs is None:
+            all_vpc_regions.append(cloud_region_id)
+            continue
+        for vpc_id in vpcs:
+            vpc_regions[vpc_id].append(cloud_region_id)
+
+    servers = (
+        session.query(AssetServerModels.id, AssetServerModels.inner_ip, AssetServerModels.vpc_id,
+                      AssetServerModels.agent_id)
+        .filter(AssetServerModels.state == "运行中", AssetServerModels.has_main_agent.isnot(True))
+        .order_by(AssetServerModels.id)
+        .all()
+    )
+    index: Dict[Tuple[str, str], Tuple[int, str]] = {}
+    for server_id, inner_ip, vpc_id, agent_id in servers:
+        if not inner_ip:
+            continue
+        for cloud_region_id in vpc_regions.get(vpc_id, []) + all_vpc_regions:
+            # 同一云区域同一IP保留第一台
+            index.setdefault((cloud_region_id, inner_ip), (server_id, agent_id))
+    return index
+
+
 def bind_agents() -> Set[str]:
     """
-    绑定agent到服务器
+    批量绑定agent到服务器
     :return: 未绑定的agent ID集合
     """
     unbound_agents = set()
     with DBContext("w", None, True) as session:
-        agents = session.query(AgentModels).all()
-        unique_servers = get_unique_servers()
+        agents = (
+            session.query(AgentModels.id, AgentModels.ip, AgentModels.proxy_id, AgentModels.agent_id,
+                          AgentModels.hostname)
+            .filter(or_(AgentModels.asset_server_id.is_(None), AgentModels.asset_server_id == 0))
+            .all()
+        )
+        if not agents:
+            return unbound_agents
+        server_index = build_agent_server_index(session)
+        unique_servers = {ip: (server.id, server.agent_id) for ip, server in get_unique_servers().items()}
+
+        agent_mappings, server_mappings = [], {}
         for agent in agents:
-            # 若agent已绑定，则跳过
-            if agent.asset_server_id:
+            matched = find_matched_server(agent, server_index, unique_servers)
+            if not matched:
+                unbound_agents.add(f"【{agent.hostname}|{agent.ip}|{agent.agent_id}】")
                 continue
-            try:
-                matched_server = find_matched_server(agent, unique_servers)
-                if not matched_server:
-                    unbound_agents.add(f"【{agent.hostname}|{agent.ip}|{agent.agent_id}】")
-                    continue
+            server_id, server_agent_id = matched
+            # 更新agent的asset_server_id
+            agent_mappings.append(
+                dict(id=agent.id, asset_server_id=server_id, agent_bind_status=AgentBindStatus.AUTO_BIND)
+            )
+            # 更新server的agent_id 只更新增量数据, 忽略存量数据
+            if server_agent_id == "0" and server_id not in server_mappings:
+                server_mappings[server_id] = dict(
+                    id=server_id, agent_id=agent.agent_id, agent_bind_status=AgentBindStatus.AUTO_BIND
+                )
 
-                # 更新agent的asset_server_id
-                agent.asset_server_id = matched_server.id
-                agent.agent_bind_status = AgentBindStatus.AUTO_BIND
-                # 更新server的agent_id 只更新增量数据, 忽略存量数据
-                if matched_server.agent_id == "0":
-                    server = session.query(AssetServerModels).filter(AssetServerModels.id == matched_server.id).first()
-                    server.agent_id = agent.agent_id
-                    server.agent_bind_status = AgentBindStatus.AUTO_BIND
-            except Exception as err:
-                logging.error(f"更新agent出错 {str(err)}")
-        session.commit()
+        try:
+            session.bulk_update_mappings(AgentModels, agent_mappings)
+            session.bulk_update_mappings(AssetServerModels, list(server_mappings.values()))
+            session.commit()
+        except Exception as err:
+            logging.error(f"更新agent出错 {str(err)}")
+            session.rollback()
+            raise
+        logging.info(f"agent绑定主机: 绑定{len(agent_mappings)}个, 更新主机{len(server_mappings)}台")
     return unbound_agents
 
 
-def find_matched_server(agent: AgentModels, unique_servers: Dict[str, AssetServerModels]) -> AssetServerModels:
+def find_matched_server(
+    agent, server_index: Dict[Tuple[str, str], Tuple[int, str]], unique_servers: Dict[str, Tuple[int, str]]
+) -> Optional[Tuple[int, str]]:
     """
     查找匹配的服务器
     :param agent: Agent对象
+    :param server_index: build_agent_server_index 构建的云区域主机索引
     :param unique_servers: 唯一服务器字典
-    :return: 匹配的服务器对象或None
+    :return: (主机ID, 主机agent_id) 或None
     """
-    # 查找云区域关联的云主机, 且云主机没有设置主agent，已绑定主agent的云主机不再绑定
-    servers = get_servers_by_cloud_region_id(agent.proxy_id)
-    for server in servers:
-        if server.inner_ip == agent.ip and server.state == "运行中" and not server.has_main_agent:
-            return server
+    # 查找云区域关联的云主机
+    matched = server_index.get((agent.proxy_id, agent.ip))
+    if matched:
+        return matched
 
-    # 若 servers 没匹配到，则在 unique_servers 里找
+    # 若云区域没匹配到，则在 unique_servers 里找
     return unique_servers.get(agent.ip)
 
 
@@ -1045,6 +1163,16 @@ def init_scheduled_tasks():
     scheduler.add_job(bind_server_tasks, "cron", hour=10, minute=0, id="bind_server_tasks", max_instances=1)
     scheduler.add_job(volc_auto_renew_task, "cron", hour=9, minute=30, id="volc_auto_renew_task", max_instances=1)
     scheduler.add_job(qcloud_auto_renew_task, "cron", hour=9, minute=30, id="qcloud_auto_renew_task", max_instances=1)
+    # 启动时和每天凌晨4点重建主机关联表，补齐手动录入的主机
+    scheduler.add_job(rebuild_server_relations_tasks, "cron", hour=4, minute=0, id="rebuild_server_relations_tasks",
+                      max_instances=1, next_run_time=datetime.datetime.now())
+    # 启动时和每天凌晨4点半重建全局搜索索引，补齐手动录入和修改的资产
+    scheduler.add_job(rebuild_search_index_tasks, "cron", hour=4, minute=30, id="rebuild_search_index_tasks",
+                      max_instances=1, next_run_time=datetime.datetime.now())
+    # 启动时和每隔一段时间同步申购实例类型目录，下单查询配置时不再实时调用云接口
+    scheduler.add_job(sync_cmp_ins_type_catalog_tasks,
+                      IntervalTrigger(seconds=int(configs.get("cmp_catalog_sync_interval", 21600))),
+                      id="sync_cmp_ins_type_catalog_tasks", max_instances=1, next_run_time=datetime.datetime.now())
     # 每天凌晨3点删除服务树上过期的资源
     scheduler.add_job(delete_all_expired_resources_from_tree, "cron", hour=3, minute=0, id="delete_expired_resources_from_tree", max_instances=1)
     # scheduler.add_job(volc_billing_task, "cron", hour=10, minute=1, id="volc_billing_task", max_instances=1)
@@ -1059,6 +1187,7 @@ def delete_all_expired_resources_from_tree():
     删除 TreeAsset 中关联的 server/mysql/redis/lb 已不存在的资源
     """
 
+    deleted_biz_ids = set()
     try:
         with DBContext('w', None, True) as session:
 
@@ -1076,7 +1205,7 @@ def delete_all_expired_resources_from_tree():
             for asset_type, model in resource_configs:
                 try:
                     rows = (
-                        session.query(TreeAssetModels.id)
+                        session.query(TreeAssetModels.id, TreeAssetModels.biz_id)
                         .filter(
                             TreeAssetModels.asset_type == asset_type,
                             ~exists().where(model.id == TreeAssetModels.asset_id)
@@ -1092,6 +1221,7 @@ def delete_all_expired_resources_from_tree():
                             "count": len(list(set(expired_ids))),
                         }
                         all_expired_ids.extend(expired_ids)
+                        deleted_biz_ids.update(r[1] for r in rows)
 
                 except Exception as e:
                     logging.error(f"查询{asset_type}过期资产失败: {e}")
@@ -1112,16 +1242,24 @@ def delete_all_expired_resources_from_tree():
                 )
 
                 logging.info(f"总共删除过期 TreeAsset 记录: {delete_count}")
+                if not delete_count:
+                    deleted_biz_ids.clear()
 
                 for asset_type, data in expired_ids_map.items():
                     logging.info(f"-删除过期 {asset_type}：{data['count']} 条")
 
             except Exception as e:
+                deleted_biz_ids.clear()
                 logging.error(f"删除过期 Tree 资产失败: {e}")
 
 
     except Exception as e:
         logging.error(f"清理 Tree 资产失败: {e}")
+        return
+
+    # 删除已提交，使相关业务的服务树缓存失效
+    if deleted_biz_ids:
+        tree_cache.bump(*deleted_biz_ids)
 
 
 if __name__ == "__main__":
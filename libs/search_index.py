@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Date    : 2026/10/16
+Desc    : 全局搜索索引，资产写入时按三字符切分维护倒排表，搜索时先查索引再按实例ID回表
+"""
+
+import datetime
+import logging
+from typing import *
+
+from sqlalchemy import exists, func
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from websdk2.configs import configs
+from websdk2.db_context import DBContextV2 as DBContext
+
+from models.asset import (
+    AssetLBModels,
+    AssetMySQLModels,
+    AssetNatModels,
+    AssetRedisModels,
+    AssetSearchTokenModels,
+    AssetServerModels,
+)
+from models.domain import DomainRecords
+from settings import settings
+
+if configs.can_import:
+    configs.import_dict(**settings)
+
+NGRAM_SIZE = 3
+# 查询串切出的片段过多时只取其中一部分过滤，命中结果最终按原值校验
+MAX_QUERY_TOKENS = 12
+
+# 资产类型 -> (模型, 唯一键字段, 参与搜索的字段)
+SEARCH_KINDS: Dict[str, Tuple[Any, str, Tuple[str, ...]]] = {
+    "server": (AssetServerModels, "instance_id", ("name", "instance_id", "inner_ip", "outer_ip")),
+    "mysql": (AssetMySQLModels, "instance_id", ("name", "instance_id", "db_address")),
+    "redis": (AssetRedisModels, "instance_id", ("name", "instance_id", "instance_address")),
+    "lb": (AssetLBModels, "instance_id", ("name", "instance_id", "dns_name", "lb_vip")),
+    "nat": (AssetNatModels, "instance_id", ("name", "instance_id", "outer_ip")),
+    "dns": (DomainRecords, "record_id", ("domain_rr", "domain_value", "remark")),
+}
+
+
+def _chunked(items: Sequence, size: int) -> Iterator[Sequence]:
+    for i in range(0, len(items), size):
+        yield items[i: i + size]
+
+
+def _flatten(value) -> Iterator[str]:
+    """地址类字段是JSON，取出所有叶子值"""
+    if value is None:
+        return
+    if isinstance(value, dict):
+        for v in value.values():
+            yield from _flatten(v)
+    elif isinstance(value, (list, tuple, set)):
+        for v in value:
+            yield from _flatten(v)
+    else:
+        yield str(value)
+
+
+def field_texts(kind: str, row: Union[Dict[str, Any], Any]) -> List[str]:
+    """取出一行数据参与搜索的文本，统一小写"""
+    _, _, fields = SEARCH_KINDS[kind]
+    get = row.get if isinstance(row, dict) else lambda f: getattr(row, f, None)
+    return [text.lower() for field in fields for text in _flatten(get(field)) if text]
+
+
+def make_tokens(texts: Iterable[str]) -> Set[str]:
+    return {text[i: i + NGRAM_SIZE] for text in texts for i in range(len(text) - NGRAM_SIZE + 1)}
+
+
+def index_rows(session, kind: str, rows: List[Dict[str, Any]]) -> None:
+    """
+    重建一批资产的索引片段，与资产写入在同一事务
+    :param session: 资产写入使用的会话
+    :param kind: SEARCH_KINDS 中的资产类型
+    :param rows: 资产数据，需要唯一键和搜索字段
+    """
+    _, key_field, _ = SEARCH_KINDS[kind]
+    docs = {str(row[key_field]): make_tokens(field_texts(kind, row)) for row in rows if row.get(key_field)}
+    if not docs:
+        return
+    chunk_size = int(configs.get("sync_prefetch_chunk_size", 1000))
+    for chunk in _chunked(list(docs), chunk_size):
+        session.query(AssetSearchTokenModels).filter(
+            AssetSearchTokenModels.asset_kind == kind, AssetSearchTokenModels.ref_key.in_(chunk)
+        ).delete(synchronize_session=False)
+
+    now = datetime.datetime.now()
+    token_rows = [dict(asset_kind=kind, ref_key=ref_key, token=token, create_time=now, update_time=now)
+                  for ref_key, tokens in docs.items() for token in tokens]
+    for chunk in _chunked(token_rows, chunk_size * 5):
+        session.execute(mysql_insert(AssetSearchTokenModels).values(list(chunk)).prefix_with("IGNORE"))
+
+
+def search_indexer(kind: str) -> Callable[[Any, List[Dict[str, Any]]], None]:
+    """供 bulk_upsert 的 after_write 使用"""
+
+    def after_write(session, rows: List[Dict[str, Any]]):
+        index_rows(session, kind, rows)
+
+    return after_write
+
+
+def search_keys(session, kind: str, value: str, limit: int, after: str = "") -> List[str]:
+    """
+    查询包含全部片段的资产唯一键，片段可能来自不同字段，需要调用方按原值校验
+    :param after: 按唯一键分页，只返回大于该值的唯一键
+    :return: 候选唯一键，按唯一键排序，最多 limit 个
+    """
+    tokens = sorted(make_tokens([value.lower()]))
+    if len(tokens) > MAX_QUERY_TOKENS:
+        step = len(tokens) / MAX_QUERY_TOKENS
+        tokens = [tokens[int(i * step)] for i in range(MAX_QUERY_TOKENS)]
+    if not tokens:
+        return []
+    rows = (
+        session.query(AssetSearchTokenModels.ref_key)
+        .filter(
+            AssetSearchTokenModels.asset_kind == kind,
+            AssetSearchTokenModels.token.in_(tokens),
+            AssetSearchTokenModels.ref_key > after,
+        )
+        .group_by(AssetSearchTokenModels.ref_key)
+        .having(func.count(AssetSearchTokenModels.id) == len(tokens))
+        .order_by(AssetSearchTokenModels.ref_key)
+        .limit(limit)
+        .all()
+    )
+    return [row.ref_key for row in rows]
+
+
+def search_assets(session, kind: str, value: str, limit: int = 10) -> list:
+    """
+    先查索引再回表，按原值做子串校验去掉片段拼凑出的误命中
+    候选按页读取，直到校验通过的结果够 limit 个或候选读完
+    :return: 资产对象列表，最多 limit 个
+    """
+    model, key_field, _ = SEARCH_KINDS[kind]
+    page_size = int(configs.get("search_index_candidates", 100))
+    value = value.lower()
+    result, after = [], ""
+    while len(result) < limit:
+        candidates = search_keys(session, kind, value, page_size, after)
+        if not candidates:
+            break
+        records = session.query(model).filter(getattr(model, key_field).in_(candidates)).all()
+        result.extend(r for r in records if any(value in text for text in field_texts(kind, r)))
+        if len(candidates) < page_size:
+            break
+        after = candidates[-1]
+    return result[:limit]
+
+
+def rebuild_search_index() -> None:
+    """
+    全量重建搜索索引，补齐手动录入和修改的资产，清理已删除资产的索引
+    """
+    chunk_size = int(configs.get("sync_prefetch_chunk_size", 1000))
+    for kind, (model, key_field, fields) in SEARCH_KINDS.items():
+        columns = [model.id, getattr(model, key_field)] + [getattr(model, f) for f in fields if f != key_field]
+        last_id = 0
+        while True:
+            with DBContext("w", None, True, **settings) as session:
+                records = (
+                    session.query(*columns).filter(model.id > last_id).order_by(model.id).limit(chunk_size).all()
+                )
+                if not records:
+                    break
+                index_rows(session, kind, [record._asdict() for record in records])
+                session.commit()
+                last_id = records[-1].id
+
+        with DBContext("w", None, True, **settings) as session:
+            session.query(AssetSearchTokenModels).filter(
+                AssetSearchTokenModels.asset_kind == kind,
+                ~exists().where(getattr(model, key_field) == AssetSearchTokenModels.ref_key),
+            ).delete(synchronize_session=False)
+            session.commit()
+        logging.info(f"重建搜索索引 {kind} 完成")
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Date    : 2026/10/16
+Desc    : 云资产同步调度，按 (账号, 资源, 地域) 并发执行，按云厂商/账号令牌桶限流
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import *
+
+from websdk2.configs import configs
+
+from models.models_utils import UpsertResult, pop_sync_stats, sync_log_task
+from settings import settings
+
+if configs.can_import:
+    configs.import_dict(**settings)
+
+
+def parse_rate_limit(value: Union[str, dict, None]) -> Dict[str, float]:
+    """
+    解析限流配置 e.g: "aliyun:10,qcloud:20" -> {"aliyun": 10.0, "qcloud": 20.0}
+    """
+    if not value:
+        return {}
+    if isinstance(value, dict):
+        return {k: float(v) for k, v in value.items()}
+    rate_map = {}
+    for item in str(value).split(","):
+        if ":" not in item:
+            continue
+        name, rate = item.split(":", 1)
+        try:
+            rate_map[name.strip()] = float(rate)
+        except ValueError:
+            logging.error(f"限流配置错误: {item}")
+    return rate_map
+
+
+class TokenBucket:
+    """令牌桶，rate 为每秒生成的令牌数，rate<=0 表示不限流"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: float = 1) -> float:
+        """预扣令牌，返回需要等待的秒数，令牌不足时记为欠账由后续调用顺延"""
+        if self.rate <= 0:
+            return 0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= tokens
+            return max(0.0, -self._tokens / self.rate)
+
+    def acquire(self, tokens: float = 1):
+        wait_time = self.reserve(tokens)
+        if wait_time:
+            time.sleep(wait_time)
+
+
+class SyncScheduler:
+    """同步单元调度器，所有云厂商共享一个有上限的线程池"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._buckets: Dict[tuple, TokenBucket] = {}
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                max_workers = int(configs.get("sync_max_concurrency", 20))
+                self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="cloud-sync")
+            return self._executor
+
+    def _bucket(self, key: tuple, rate: float) -> TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(rate)
+            return bucket
+
+    def reserve(self, cloud_name: str, account_id: str) -> float:
+        """
+        预扣云厂商和账号两级令牌，返回需要等待的秒数，供异步采集器在事件循环中等待
+        """
+        provider_rate = parse_rate_limit(configs.get("sync_provider_rate_limit")).get(cloud_name, 0)
+        account_rate = float(configs.get("sync_account_rate_limit", 0) or 0)
+        return max(
+            self._bucket(("provider", cloud_name), provider_rate).reserve(),
+            self._bucket(("account", cloud_name, account_id), account_rate).reserve(),
+        )
+
+    def acquire(self, cloud_name: str, account_id: str):
+        """
+        申请云厂商和账号两级令牌，令牌不足时阻塞当前线程
+        """
+        wait_time = self.reserve(cloud_name, account_id)
+        if wait_time:
+            time.sleep(wait_time)
+
+    def run_unit(
+        self, cloud_name: str, cloud_type: str, conf: Dict[str, str], region: str, func: Callable[[str], tuple]
+    ) -> bool:
+        """
+        执行单个 (账号, 资源, 地域) 同步单元，并记录耗时和写入统计
+        """
+        logging.info(f"同步开始, 信息：「{cloud_name}」-「{cloud_type}」-「{region}」.")
+        # 清理本线程上一次遗留的写入统计
+        pop_sync_stats()
+        start_time = time.time()
+        try:
+            is_success, msg = func(region)
+        except Exception as err:
+            is_success, msg = False, f"同步异常: {err}"
+            logging.exception(f"同步异常：「{cloud_name}」-「{cloud_type}」-「{region}」: {err}")
+        self.log_unit(cloud_name, cloud_type, conf, region, is_success, msg, time.time() - start_time)
+        return is_success
+
+    @staticmethod
+    def log_unit(
+        cloud_name: str,
+        cloud_type: str,
+        conf: Dict[str, str],
+        region: str,
+        is_success: bool,
+        msg: str,
+        consum: float,
+        stats: Optional[UpsertResult] = None,
+    ):
+        """记录单个同步单元的同步日志"""
+        sync_consum = "%.2f" % consum
+        try:
+            sync_log_task(
+                dict(
+                    name=conf["name"],
+                    cloud_name=cloud_name,
+                    sync_type=cloud_type,
+                    account_id=conf["account_id"],
+                    sync_region=region,
+                    sync_state="success" if is_success else "failed",
+                    sync_consum=sync_consum,
+                    loginfo=str(msg),
+                ),
+                stats=stats,
+            )
+        except Exception as err:
+            logging.error(f"记录同步日志出错：「{cloud_name}」-「{cloud_type}」-「{region}」 -「{err}」.")
+        logging.info(f"同步结束, 信息：「{cloud_name}」-「{cloud_type}」-「{region}」, 耗时: {sync_consum}s.")
+
+    def run_regions(
+        self,
+        cloud_name: str,
+        cloud_type: str,
+        conf: Dict[str, str],
+        func: Callable[[str], tuple],
+        regions: Optional[List[str]] = None,
+    ) -> List[bool]:
+        """
+        并发执行一个账号下一个资源类型的所有地域，等待全部完成，返回每个地域是否成功
+        :param cloud_name: 云厂商
+        :param cloud_type: 资源类型
+        :param conf: 云账号配置
+        :param func: 同步单个地域，参数为 region，返回 (是否成功, 消息)
+        :param regions: 地域列表，默认取账号配置
+        """
+        if regions is None:
+            regions = [r.strip() for r in conf["region"].split(",") if r.strip()]
+        futures = []
+        for region in regions:
+            # 在调用方线程等待令牌后再提交，限流等待不占用线程池
+            # AsyncCollector 采集器在此基础上每次API调用前还会再申请令牌
+            self.acquire(cloud_name, conf["account_id"])
+            futures.append(self.executor.submit(self.run_unit, cloud_name, cloud_type, conf, region, func))
+        wait(futures)
+        results = []
+        for future in futures:
+            if future.exception():
+                logging.error(f"同步单元执行失败：「{cloud_name}」-「{cloud_type}」: {future.exception()}")
+                results.append(False)
+            else:
+                results.append(future.result())
+        return results
+
+
+sync_scheduler = SyncScheduler()
+
+
+if __name__ == "__main__":
+    pass
@@ -46,7 +46,7 @@ from services.cloud_region_service import (
     update_server_agent_id_by_cloud_region_rules,
 )
 from services.perm_group_service import preview_perm_group_for_api
-from services.tree_asset_service import get_tree_assets
+from services.tree_asset_service import get_all_tree_assets
 from services.tree_service import get_tree_by_api
 from settings import settings
 
@@ -127,6 +127,82 @@ def biz_sync():
     index()
 
 
+AGENT_ONLINE_KEY = "cmdb:agent:online"  # 上次同步时在线的agent_id集合
+AGENT_FULL_SYNC_KEY = "cmdb:agent:full_sync"  # 存在期间只做增量同步
+AGENT_EVENT_STREAM = "cmdb:agent:status:events"  # agent上下线事件
+
+
+def _save_online_agents(redis_conn, online_agents: Set[str]):
+    """先写临时key再改名，避免并发读到写了一半的集合"""
+    tmp_key = f"{AGENT_ONLINE_KEY}:tmp"
+    pipe = redis_conn.pipeline()
+    pipe.delete(tmp_key)
+    agent_ids = list(online_agents)
+    for i in range(0, len(agent_ids), 1000):
+        pipe.sadd(tmp_key, *agent_ids[i: i + 1000])
+    if agent_ids:
+        pipe.rename(tmp_key, AGENT_ONLINE_KEY)
+        pipe.expire(AGENT_ONLINE_KEY, 86400)
+    else:
+        pipe.delete(AGENT_ONLINE_KEY)
+    pipe.execute()
+
+
+def _load_online_agents(redis_conn) -> Optional[Set[str]]:
+    if not redis_conn.exists(AGENT_ONLINE_KEY):
+        return None
+    return {v.decode("utf-8") if isinstance(v, bytes) else v for v in redis_conn.smembers(AGENT_ONLINE_KEY)}
+
+
+def _agent_status_changes(session, online_agents: Set[str], agent_ids: Optional[Set[str]] = None) -> List[dict]:
+    """
+    找出状态需要变更的主机
+    :param agent_ids: 增量时只检查上下线的agent，为空时全量对账
+    """
+    the_model = AssetServerModels
+    query = session.query(the_model.id, the_model.agent_id, the_model.agent_status)
+    rows = []
+    if agent_ids is None:
+        # 全量对账：原本在线的主机 + 在线agent对应的非在线主机，两次都走agent_status/agent_id索引
+        rows.extend(query.filter(the_model.agent_status == "1").all())
+        online_list = list(online_agents)
+        for i in range(0, len(online_list), 1000):
+            rows.extend(
+                query.filter(
+                    the_model.agent_id.in_(online_list[i: i + 1000]),
+                    func.coalesce(the_model.agent_status, "") != "1",
+                ).all()
+            )
+    else:
+        agent_list = list(agent_ids)
+        for i in range(0, len(agent_list), 1000):
+            rows.extend(query.filter(the_model.agent_id.in_(agent_list[i: i + 1000])).all())
+
+    changes = []
+    for asset_id, agent_id, agent_status in rows:
+        if agent_status == "1" and agent_id not in online_agents:
+            changes.append(dict(id=asset_id, agent_id=agent_id, agent_status="2"))
+        elif agent_status != "1" and agent_id in online_agents:
+            changes.append(dict(id=asset_id, agent_id=agent_id, agent_status="1"))
+    return changes
+
+
+def _emit_agent_events(redis_conn, changes: List[dict]):
+    """上下线事件写入Redis Stream，只保留最近的事件"""
+    if not changes:
+        return
+    now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    pipe = redis_conn.pipeline()
+    for change in changes:
+        pipe.xadd(
+            AGENT_EVENT_STREAM,
+            dict(server_id=change["id"], agent_id=change["agent_id"], agent_status=change["agent_status"], time=now),
+            maxlen=int(configs.get("agent_event_maxlen", 100000)),
+            approximate=True,
+        )
+    pipe.execute()
+
+
 def sync_agent_status():
     @deco(RedisLock("async_agent_status_redis_lock_key"),  release=True)
     def index():
@@ -142,31 +218,32 @@ def sync_agent_status():
         if res.status_code != 200:
             return
         data = res.json()
-        agent_list = data.keys()
-        the_model = AssetServerModels
-        with DBContext("w", None, True) as session:
-            __info = session.query(
-                the_model.id, the_model.agent_id, the_model.agent_status
-            ).all()
-            all_info = [
-                dict(id=asset_id, agent_status="2")
-                if agent_status == "1" and agent_id not in agent_list
-                else dict(id=asset_id, agent_status="1")
-                if (agent_status == "2" or not agent_status)
-                and agent_id in agent_list
-                else None
-                for asset_id, agent_id, agent_status in __info
-            ]
-
-            all_info = list(filter(None, all_info))
+        online_agents = set(data.keys())
+        redis_conn = cache_conn()
+        previous_agents = _load_online_agents(redis_conn)
+        # 没有上次的在线集合或到了对账周期时全量对账，修正新绑定agent等增量覆盖不到的情况
+        full_sync = previous_agents is None or not redis_conn.exists(AGENT_FULL_SYNC_KEY)
+        changed_agents = None if full_sync else online_agents ^ previous_agents
 
+        with DBContext("w", None, True) as session:
+            all_info = _agent_status_changes(session, online_agents, changed_agents) if full_sync or changed_agents else []
             for info in all_info:
                 logging.info(
                     f"{info['id']} 改为{'在线' if info['agent_status'] == '1' else '离线'} "
                 )
+            session.bulk_update_mappings(
+                AssetServerModels, [dict(id=i["id"], agent_status=i["agent_status"]) for i in all_info]
+            )
 
-            session.bulk_update_mappings(the_model, all_info)
-        logging.info(f"同步agent状态到配置平台 结束 {datetime.datetime.now()}")
+        _save_online_agents(redis_conn, online_agents)
+        if full_sync:
+            redis_conn.set(AGENT_FULL_SYNC_KEY, 1, ex=int(configs.get("agent_full_sync_interval", 3600)))
+        try:
+            _emit_agent_events(redis_conn, all_info)
+        except Exception as err:
+            logging.error(f"写入agent上下线事件出错 {err}")
+        logging.info(f"同步agent状态到配置平台 结束, {'全量' if full_sync else '增量'}, "
+                     f"变更{len(all_info)}台 {datetime.datetime.now()}")
 
     try:
         index()
@@ -191,14 +268,12 @@ def clean_sync_logs():
 
 
 def async_agent():
-    executor = global_executors.general_executor
-    executor.submit(sync_agent_status)
+    global_executors.submit_unique("agent", sync_agent_status)
 
 
 def async_biz_info():
-    executor = global_executors.general_executor
-    executor.submit(biz_sync)
-    executor.submit(clean_sync_logs)
+    global_executors.submit_unique("biz", biz_sync)
+    global_executors.submit_unique("biz", clean_sync_logs)
 
 
 def sync_users(org_id=None):
@@ -537,9 +612,30 @@ def sync_service_tree_assets(biz_id=None, org_id=None):
         except ValueError:
             return False
 
-    def _sync_main(asset: dict, org_name: str = "/Default/") -> None:
+    def load_cloud_regions() -> Dict[str, Tuple[Optional[str], Optional[str]]]:
         """
-        创建资产
+        一次加载全部云区域的网域和特权账号模板
+        :return: {cloud_region_id: (jms_domain_id, jms_account_template)}
+        """
+        with DBContext("r", None, None) as session:
+            rows = session.query(
+                CloudRegionModels.cloud_region_id,
+                CloudRegionModels.jms_domain_id,
+                CloudRegionModels.jms_account_template,
+            ).all()
+        return {str(row[0]): (row[1], row[2]) for row in rows}
+
+    def _id_of(value) -> Optional[str]:
+        # JumpServer 关联字段可能返回对象或者ID
+        if isinstance(value, dict):
+            return value.get("id")
+        return value or None
+
+    def _build_desired(
+        asset: dict, cloud_regions: dict, org_name: str = "/Default/"
+    ) -> Optional[dict]:
+        """
+        计算资产在JumpServer中应有的状态，不满足同步条件返回None
         :param asset:
         :return:
         """
@@ -547,74 +643,125 @@ def sync_service_tree_assets(biz_id=None, org_id=None):
         inner_ip = asset["inner_ip"]
         full_name = asset.get("full_name")
         biz_cn_name = asset.get("biz_cn_name")
-        biz_id = asset.get("biz_id")
         agent_id = asset.get("agent_id")
         if not agent_id or (":" in agent_id and agent_id.split(":")[1] == "0"):
             logging.debug(
                 f"资产没有划分到云区域, 业务: {biz_cn_name}, INNER_IP: {inner_ip}"
             )
-            return
+            return None
         if not full_name:
-            return
-
-        # accounts = []
-        # 获取网域和特权账号模板ID
-        # with (DBContext('w', None, True) as session):
-        #     perm_mapping_obj = session.query(PermissionToJMS) \
-        #         .filter(PermissionToJMS.biz_id == biz_id).first()
-        #     if not perm_mapping_obj:
-        #         logging.info(f"没有配置权限分组和堡垒机账号映射, 业务: {biz_cn_name}")
-        #         return
+            return None
 
         cloud_region_id = agent_id.split(":")[1]
-        with DBContext("w", None, True) as session:
-            cloud_region_obj = (
-                session.query(CloudRegionModels)
-                .filter(CloudRegionModels.cloud_region_id == cloud_region_id)
-                .first()
-            )
-            if not cloud_region_obj:
-                logging.debug(f"云区域不存在, 云区域ID: {cloud_region_id}")
-                return
-
+        if cloud_region_id not in cloud_regions:
+            logging.debug(f"云区域不存在, 云区域ID: {cloud_region_id}")
+            return None
+        jms_domain_id, jms_account_template_id = cloud_regions[cloud_region_id]
+
+        # 10.0.0.0/8 在这个内网网段的主机，需要指定网域
+        if is_ip_in_subnet(inner_ip):
+            if not jms_domain_id:
+                logging.debug(f"没有配置网域ID, 业务: {biz_cn_name}")
+                return None
+        else:
             jms_domain_id = None
-            # 10.0.0.0/8 在这个内网网段的主机，需要指定网域
-            if is_ip_in_subnet(inner_ip):
-                jms_domain_id = cloud_region_obj.jms_domain_id
-                if not jms_domain_id:
-                    logging.debug(f"没有配置网域ID, 业务: {biz_cn_name}")
-                    return
-
-            jms_account_template_id = cloud_region_obj.jms_account_template
-            if not jms_account_template_id:
-                logging.debug(f"没有配置特权账号模板ID, 业务: {biz_cn_name}")
-                return
 
-            accounts = [{"template": jms_account_template_id}]
+        if not jms_account_template_id:
+            logging.debug(f"没有配置特权账号模板ID, 业务: {biz_cn_name}")
+            return None
 
-        asset_name = full_name.split(org_name)[1] + f"/{name}-{inner_ip}"
-        jms_asset_host_obj = jms_asset_host_api.get(
-            name=asset_name, address=inner_ip, org_id=org_id
+        return dict(
+            name=full_name.split(org_name)[1] + f"/{name}-{inner_ip}",
+            address=inner_ip,
+            full_name=full_name,
+            domain=jms_domain_id,
+            accounts=[{"template": jms_account_template_id}],
         )
-        if jms_asset_host_obj:
-            # 主机资产已存在
-            # todo 更新资产
-            logging.debug(f"资产已存在: {asset_name}")
-            return
 
-        # 查找节点，创建主机资产
-        jump_server_node_obj = jms_asset_api.get(name=full_name, org_id=org_id)
-        if jump_server_node_obj:
-            node_id = jump_server_node_obj[0]["id"]
-            jms_asset_host_obj = jms_asset_host_api.create(
-                name=asset_name,
-                address=inner_ip,
-                nodes=[node_id],
-                domain=jms_domain_id,
-                accounts=accounts,
+    def diff_assets(
+        desired_list: List[dict], hosts: List[dict], nodes: List[dict], biz_prefixes: List[str]
+    ) -> Dict[str, list]:
+        """
+        在内存中对比服务树资产和JumpServer主机，计算需要创建、更新、删除的资产
+        :param desired_list: 服务树资产应有的状态
+        :param hosts: JumpServer组织下全部主机
+        :param nodes: JumpServer组织下全部节点
+        :param biz_prefixes: 本次同步的业务路径，只删除这些路径下的主机
+        :return:
+        """
+        node_index = {node.get("full_value"): node["id"] for node in nodes}
+        host_index = {(host.get("name"), host.get("address")): host for host in hosts}
+        node_name_index = {node["id"]: node.get("full_value") for node in nodes}
+
+        to_create, to_update, to_delete = [], [], []
+        desired_keys = set()
+        for desired in desired_list:
+            key = (desired["name"], desired["address"])
+            if key in desired_keys:
+                continue
+            desired_keys.add(key)
+            node_id = node_index.get(desired["full_name"])
+            if not node_id:
+                logging.debug(f"节点不存在: {desired['full_name']}")
+                continue
+            host = host_index.get(key)
+            if not host:
+                to_create.append(dict(desired, nodes=[node_id]))
+                continue
+            host_nodes = [_id_of(n) for n in host.get("nodes") or []]
+            if node_id not in host_nodes or _id_of(host.get("domain")) != desired["domain"]:
+                to_update.append(dict(asset_id=host["id"], nodes=[node_id], domain=desired["domain"]))
+
+        if biz_prefixes:
+            for key, host in host_index.items():
+                if key in desired_keys:
+                    continue
+                host_paths = [node_name_index.get(_id_of(n)) or "" for n in host.get("nodes") or []]
+                if host_paths and all(
+                    any(path.startswith(prefix) for prefix in biz_prefixes) for path in host_paths
+                ):
+                    to_delete.append(host["id"])
+        return dict(create=to_create, update=to_update, delete=to_delete)
+
+    def apply_diff(diff: Dict[str, list]) -> None:
+        """
+        通过共享连接池并发提交差异
+        """
+
+        def _create(item: dict):
+            return jms_asset_host_api.create(
+                name=item["name"],
+                address=item["address"],
+                nodes=item["nodes"],
+                domain=item["domain"],
+                accounts=item["accounts"],
                 org_id=org_id,
             )
-            logging.info(f"资产创建结果:{bool(jms_asset_host_obj)}")
+
+        def _update(item: dict):
+            return jms_asset_host_api.update(org_id=org_id, **item)
+
+        def _delete(asset_id: str):
+            return jms_asset_host_api.delete(asset_id=asset_id, org_id=org_id)
+
+        jobs = (
+            [(_create, item) for item in diff["create"]]
+            + [(_update, item) for item in diff["update"]]
+            + [(_delete, item) for item in diff["delete"]]
+        )
+        if not jobs:
+            return
+        failed = 0
+        with ThreadPoolExecutor(max_workers=int(configs.get("jms_sync_workers", 10))) as executor:
+            futures = [executor.submit(func, item) for func, item in jobs]
+            for future in futures:
+                try:
+                    if not future.result():
+                        failed += 1
+                except Exception as err:
+                    failed += 1
+                    logging.error(f"同步主机资产到JumpServer失败: {err}")
+        logging.info(f"主机资产提交完成, 共{len(jobs)}个请求, 失败{failed}个")
 
     def index():
         logging.info("开始同步服务树主机资产到JumpServer")
@@ -623,15 +770,29 @@ def sync_service_tree_assets(biz_id=None, org_id=None):
         if not parent_name:
             return
 
-        if not biz_id:
-            assets, count = get_tree_assets(params={"page_size": 9999})
-        else:
-            assets, count = get_tree_assets(
-                params={"page_size": 9999, "biz_id": biz_id}
-            )
+        assets, count = get_all_tree_assets({"biz_id": biz_id} if biz_id else {})
         assets = add_full_name_to_assets(assets=assets, org_name=parent_name)
-        for asset in assets:
-            _sync_main(asset, org_name=parent_name)
+        cloud_regions = load_cloud_regions()
+        desired_list = [
+            d for d in (_build_desired(a, cloud_regions, org_name=parent_name) for a in assets) if d
+        ]
+
+        # 组织下的主机和节点各分页拉取一次，在内存中对账
+        hosts = jms_asset_host_api.list_all(org_id=org_id)
+        nodes = jms_asset_api.list_all(org_id=org_id)
+
+        biz_prefixes = []
+        if configs.get("jms_sync_prune", "no") == "yes":
+            if len(assets) < count:
+                # 服务树主机没有取全时不删除，避免把漏取的主机当成多余资产
+                logging.error(f"服务树主机只获取到{len(assets)}/{count}个，本次不删除JumpServer多余主机")
+            else:
+                biz_prefixes = sorted({f"{parent_name}{a['biz_cn_name']}/" for a in assets})
+        diff = diff_assets(desired_list, hosts, nodes, biz_prefixes)
+        logging.info(
+            f"主机资产对账: 新增{len(diff['create'])}, 更新{len(diff['update'])}, 删除{len(diff['delete'])}"
+        )
+        apply_diff(diff)
         logging.info("同步服务树主机资产到JumpServer结束")
 
     try:
@@ -993,18 +1154,15 @@ def sync_perm_groups():
 
 
 def async_users():
-    executor = ThreadPoolExecutor(max_workers=1)
-    executor.submit(sync_users)
+    global_executors.submit_unique("jms", sync_users)
 
 
 def async_perm_groups():
-    executor = ThreadPoolExecutor(max_workers=1)
-    executor.submit(sync_perm_groups)
+    global_executors.submit_unique("jms", sync_perm_groups)
 
 
 def async_service_trees():
-    executor = ThreadPoolExecutor(max_workers=1)
-    executor.submit(sync_service_trees)
+    global_executors.submit_unique("jms", sync_service_trees)
 
 
 def sync_vswitch_cloud_region_id():
@@ -1090,13 +1248,11 @@ def sync_server_cloud_region_id():
 
 
 def async_vswitch_cloud_region_id():
-    executor = global_executors.general_executor
-    executor.submit(sync_vswitch_cloud_region_id)
+    global_executors.submit_unique("vswitch", sync_vswitch_cloud_region_id)
 
 
 def async_server_cloud_region_id():
-    executor = ThreadPoolExecutor(max_workers=1)
-    executor.submit(sync_server_cloud_region_id)
+    global_executors.submit_unique("vswitch", sync_server_cloud_region_id)
 
 
 def sync_cmdb_to_jms_with_enterprise(perm_group_id=None, with_lock=True):
@@ -1158,8 +1314,10 @@ def sync_cmdb_to_jms_with_enterprise(perm_group_id=None, with_lock=True):
 
 
 def async_cmdb_to_jms_with_enterprise(perm_group_id=None):
-    executor = global_executors.general_executor
-    executor.submit(sync_cmdb_to_jms_with_enterprise, perm_group_id, True)
+    global_executors.submit_unique(
+        "jms", sync_cmdb_to_jms_with_enterprise, perm_group_id, True,
+        key=f"sync_cmdb_to_jms_with_enterprise:{perm_group_id or 'all'}"
+    )
 
 
 def sync_jms_orgs():
@@ -1188,8 +1346,7 @@ def sync_jms_orgs():
 
 
 def async_jms_orgs_to_cmdb():
-    executor = global_executors.general_executor
-    executor.submit(sync_jms_orgs)
+    global_executors.submit_unique("jms", sync_jms_orgs)
 
 
 
@@ -4,12 +4,149 @@
 # @Description: 全局线程池
 
 
+import bisect
+import logging
 import threading
+import time
+from concurrent.futures import Future
 from concurrent.futures.thread import ThreadPoolExecutor
+from typing import *
+
+from websdk2.configs import configs
+
+from settings import settings
+
+if configs.can_import:
+    configs.import_dict(**settings)
+
+# 耗时直方图的桶上限(秒)，最后一个桶为 +Inf
+LATENCY_BUCKETS = (0.1, 0.5, 1, 5, 30, 60, 300, 900)
+DEFAULT_POOL_SIZE = 2
+
+
+class _Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def to_dict(self) -> dict:
+        buckets = {str(le): count for le, count in zip(LATENCY_BUCKETS, self.counts)}
+        buckets["+Inf"] = self.counts[-1]
+        return dict(buckets=buckets, sum=round(self.total, 3), max=round(self.max, 3))
+
+
+class ObservableThreadPool(ThreadPoolExecutor):
+    """
+    记录排队数、运行数和任务耗时的线程池
+    submit_unique 按任务键合并：同一个键还在排队或运行时不再重复提交，排队数超过上限时拒绝
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int = 100):
+        super().__init__(max_workers=max_workers, thread_name_prefix=f"pool-{name}")
+        self.name = name
+        self.max_queue = max_queue
+        self._stats_lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        self._counters = dict(submitted=0, completed=0, failed=0, coalesced=0, rejected=0)
+        self._wait_hist = _Histogram()
+        self._run_hist = _Histogram()
+        self._running_keys: Set[str] = set()
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        enqueue_time = time.monotonic()
+
+        def run():
+            start = time.monotonic()
+            with self._stats_lock:
+                self._queued -= 1
+                self._active += 1
+                self._wait_hist.observe(start - enqueue_time)
+            failed = False
+            try:
+                return fn(*args, **kwargs)
+            except BaseException:
+                failed = True
+                raise
+            finally:
+                with self._stats_lock:
+                    self._active -= 1
+                    self._counters["completed"] += 1
+                    if failed:
+                        self._counters["failed"] += 1
+                    self._run_hist.observe(time.monotonic() - start)
+
+        with self._stats_lock:
+            self._queued += 1
+            self._counters["submitted"] += 1
+        try:
+            return super().submit(run)
+        except RuntimeError:
+            with self._stats_lock:
+                self._queued -= 1
+            raise
+
+    def submit_unique(self, key: str, fn, *args, **kwargs) -> Optional[Future]:
+        """
+        定时任务使用：上一次还没执行完时跳过本次，避免慢任务在队列里越积越多
+        :return: 被合并或拒绝时返回 None
+        """
+        with self._stats_lock:
+            if key in self._running_keys:
+                self._counters["coalesced"] += 1
+                logging.info(f"[{self.name}]任务 {key} 尚未结束，跳过本次提交")
+                return None
+            if self._queued >= self.max_queue:
+                self._counters["rejected"] += 1
+                logging.warning(f"[{self.name}]排队任务数已达上限{self.max_queue}，拒绝任务 {key}")
+                return None
+            self._running_keys.add(key)
+
+        def release(_):
+            with self._stats_lock:
+                self._running_keys.discard(key)
+
+        try:
+            future = self.submit(fn, *args, **kwargs)
+        except RuntimeError:
+            release(None)
+            raise
+        future.add_done_callback(release)
+        return future
+
+    def metrics(self) -> dict:
+        with self._stats_lock:
+            return dict(
+                name=self.name,
+                max_workers=self._max_workers,
+                max_queue=self.max_queue,
+                queued=self._queued,
+                active=self._active,
+                pending_keys=sorted(self._running_keys),
+                wait_seconds=self._wait_hist.to_dict(),
+                run_seconds=self._run_hist.to_dict(),
+                **self._counters,
+            )
+
+
+def _parse_pool_sizes(value: str) -> Dict[str, int]:
+    """解析 "cloud:10,general:5" 格式的线程池大小配置"""
+    sizes = {}
+    for item in (value or "").split(","):
+        name, _, size = item.partition(":")
+        if name.strip() and size.strip().isdigit():
+            sizes[name.strip()] = int(size)
+    return sizes
 
 
 class GlobalThreadPoolManager:
-    """全局线程池管理类，提供共享的线程池资源"""
+    """全局线程池管理类，按业务名称提供独立的线程池，避免慢任务互相阻塞"""
 
     _instance = None
     _lock = threading.Lock()
@@ -18,24 +155,46 @@ class GlobalThreadPoolManager:
         with cls._lock:
             if cls._instance is None:
                 cls._instance = super(GlobalThreadPoolManager, cls).__new__(cls)
-                cls._instance._cloud_executor = ThreadPoolExecutor(max_workers=10)
-                cls._instance._general_executor = ThreadPoolExecutor(max_workers=5)
+                cls._instance._pools = {}
+                cls._instance._sizes = _parse_pool_sizes(configs.get("thread_pool_sizes", ""))
+                cls._instance._max_queue = int(configs.get("thread_pool_max_queue", 100))
             return cls._instance
 
+    def get_pool(self, name: str, max_workers: int = None) -> ObservableThreadPool:
+        """获取命名线程池，不存在时创建，配置中的大小优先"""
+        with self._lock:
+            pool = self._pools.get(name)
+            if pool is None:
+                size = self._sizes.get(name) or max_workers or DEFAULT_POOL_SIZE
+                pool = ObservableThreadPool(name, size, self._max_queue)
+                self._pools[name] = pool
+            return pool
+
+    def submit_unique(self, pool_name: str, fn, *args, key: str = None, **kwargs) -> Optional[Future]:
+        """提交到命名线程池，默认以函数名作为合并键"""
+        return self.get_pool(pool_name).submit_unique(key or fn.__name__, fn, *args, **kwargs)
+
     @property
     def cloud_executor(self):
         """云资源同步专用线程池"""
-        return self._cloud_executor
+        return self.get_pool("cloud", 10)
 
     @property
     def general_executor(self):
         """通用线程池"""
-        return self._general_executor
+        return self.get_pool("general", 5)
+
+    def metrics(self) -> List[dict]:
+        with self._lock:
+            pools = list(self._pools.values())
+        return [pool.metrics() for pool in pools]
 
     def shutdown(self, wait: bool = False):
         """关闭所有线程池"""
-        self._cloud_executor.shutdown(wait=wait)
-        self._general_executor.shutdown(wait=wait)
+        with self._lock:
+            pools = list(self._pools.values())
+        for pool in pools:
+            pool.shutdown(wait=wait)
 
 
 # 创建全局线程池实例
@@ -43,4 +202,4 @@ global_executors = GlobalThreadPoolManager()
 
 
 if __name__ == '__main__':
-    pass
\ No newline at end of file
+    pass
@@ -7,45 +7,52 @@ Date   :  2023/1/27 11:02
 Desc   :  Tree build
 """
 
+from collections import defaultdict
 from typing import *
 
 
 class Tree:
     def __init__(self, data):
         self._data = data
+        self._index = self._build_index(data)
+
+    @staticmethod
+    def _build_index(data) -> Dict[tuple, List[dict]]:
+        """
+        一次遍历按 (node_type, parent_node, grand_node) 分组，组内按 node_sort 升序
+        """
+        index: Dict[tuple, List[dict]] = defaultdict(list)
+        for node in data:
+            node_type = node["node_type"]
+            if node_type == 1:
+                index[(1, None, None)].append(node)
+            elif node_type == 2:
+                index[(2, node["parent_node"], None)].append(node)
+            elif node_type == 3:
+                index[(3, node["parent_node"], node["grand_node"])].append(node)
+        for childs in index.values():
+            childs.sort(key=lambda s: s['node_sort'])  # 升序
+        return index
+
+    @staticmethod
+    def _child_key(node) -> Optional[tuple]:
+        if node["node_type"] == 0:
+            return 1, None, None
+        elif node["node_type"] == 1:
+            return 2, node["title"], None
+        elif node["node_type"] == 2:
+            # 模块节点需要同时匹配集群和环境
+            return 3, node["title"], node["parent_node"]
+        return None
 
     def get_root_node(self) -> dict:
-        root_node = list(filter(lambda node: node["node_type"] == 0, self._data))[0]
+        root_node = next(node for node in self._data if node["node_type"] == 0)
         return root_node
 
     def get_child(self, node, parent_node=None):
         items = []  # type: List[Any]
-        if node["node_type"] == 0:
-            childs = list(
-                filter(
-                    lambda n: n["node_type"] == 1, self._data
-                )
-            )
-            childs = sorted(childs, key=lambda s: s['node_sort'], reverse=False)  # 升序
-
-        elif node["node_type"] == 1:
-            childs = list(
-                filter(
-                    lambda n: n["node_type"] == 2 and n["parent_node"] == node["title"],
-                    self._data
-                )
-            )
-            childs = sorted(childs, key=lambda s: s['node_sort'], reverse=False)  # 升序
-
-        elif node["node_type"] == 2:
-            childs = list(filter(
-                lambda n: n["node_type"] == 3 and n["parent_node"] == node["title"] and n["grand_node"] == node[
-                    "parent_node"], self._data))
-            # for i in childs: i['grand_node'] = node['parent_node']  ### 强行加了爷爷的名字
-            childs = sorted(childs, key=lambda s: s['node_sort'], reverse=False)  # 升序
-
-        else:
-            childs = []
+        key = self._child_key(node)
+        childs = self._index.get(key, []) if key else []
         for child in childs:
             child["children"] = self.get_child(child, node)
             # 2023年3月7日 为了让最后一级支持异步加载
@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Date    : 2026/10/16
+Desc    : 服务树快照缓存，Redis存放每个业务的版本号和快照，进程内LRU兜底，树变更时递增版本号
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import *
+
+from websdk2.cache_context import cache_conn
+from websdk2.configs import configs
+
+from settings import settings
+
+if configs.can_import:
+    configs.import_dict(**settings)
+
+VERSION_KEY = "cmdb:tree:version:{}"
+SNAPSHOT_KEY = "cmdb:tree:snapshot:{}"
+# 不确定具体业务的变更(如按主键批量上下线)递增全局版本号，所有业务快照失效
+GLOBAL_VERSION = "__all__"
+
+
+def _decode(value) -> Optional[str]:
+    if value is None:
+        return None
+    return value.decode("utf-8") if isinstance(value, bytes) else str(value)
+
+
+class TreeSnapshotCache:
+    """
+    版本号 = 全局版本.业务版本，两部分都只增不减
+    快照和版本一起保存，读取时版本对不上即视为失效
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()
+
+    @property
+    def _max_size(self) -> int:
+        return int(configs.get("tree_cache_lru_size", 256))
+
+    @property
+    def _ttl(self) -> int:
+        return int(configs.get("tree_cache_ttl", 600))
+
+    def _local_get(self, biz_id: str, version: str) -> Optional[str]:
+        with self._lock:
+            item = self._local.get(biz_id)
+            if not item or item[0] != version:
+                return None
+            self._local.move_to_end(biz_id)
+            return item[1]
+
+    def _local_set(self, biz_id: str, version: str, snapshot: str):
+        with self._lock:
+            self._local[biz_id] = (version, snapshot)
+            self._local.move_to_end(biz_id)
+            while len(self._local) > self._max_size:
+                self._local.popitem(last=False)
+
+    def get_versions(self, biz_ids: List[str]) -> Dict[str, str]:
+        """批量获取业务的当前版本号"""
+        keys = [VERSION_KEY.format(GLOBAL_VERSION)] + [VERSION_KEY.format(biz_id) for biz_id in biz_ids]
+        values = [_decode(v) or "0" for v in cache_conn().mget(keys)]
+        global_version = values[0]
+        return {biz_id: f"{global_version}.{v}" for biz_id, v in zip(biz_ids, values[1:])}
+
+    def etag(self, biz_data: Dict[str, str]) -> str:
+        """
+        根据版本号和业务名称生成ETag，不需要构建树
+        """
+        versions = self.get_versions(list(biz_data))
+        # 带上快照过期周期，漏掉递增版本的变更最多在一个周期后可见
+        raw = json.dumps([int(time.time() // self._ttl)] +
+                         [[biz_id, biz_name, versions[biz_id]] for biz_id, biz_name in biz_data.items()])
+        return f'W/"{hashlib.md5(raw.encode("utf-8")).hexdigest()}"'
+
+    def get_trees(
+        self, biz_data: Dict[str, str], builder: Callable[[Dict[str, str]], List[dict]]
+    ) -> List[dict]:
+        """
+        按业务读取树快照，未命中的业务统一交给 builder 构建后回写缓存
+        每次返回新解析的对象，调用方修改不会影响缓存
+        :param biz_data: {biz_id: biz_name}
+        :param builder: 同 tree_service.get_tree，参数为未命中的 {biz_id: biz_name}
+        """
+        try:
+            versions = self.get_versions(list(biz_data))
+        except Exception as err:
+            logging.error(f"读取服务树版本失败，直接构建: {err}")
+            return builder(biz_data)
+
+        snapshots: Dict[str, str] = {}
+        for biz_id in biz_data:
+            snapshot = self._local_get(biz_id, versions[biz_id])
+            if snapshot is not None:
+                snapshots[biz_id] = snapshot
+
+        redis_missed = [biz_id for biz_id in biz_data if biz_id not in snapshots]
+        if redis_missed:
+            try:
+                values = cache_conn().mget([SNAPSHOT_KEY.format(i) for i in redis_missed])
+            except Exception as err:
+                logging.error(f"读取服务树快照失败: {err}")
+                values = [None] * len(redis_missed)
+            for biz_id, value in zip(redis_missed, values):
+                value = _decode(value)
+                if not value:
+                    continue
+                version, _, snapshot = value.partition("|")
+                if version == versions[biz_id]:
+                    snapshots[biz_id] = snapshot
+                    self._local_set(biz_id, version, snapshot)
+
+        missed = {biz_id: biz_name for biz_id, biz_name in biz_data.items() if biz_id not in snapshots}
+        if missed:
+            mapping: Dict[str, str] = {}
+            for tree in builder(missed):
+                biz_id = tree["biz_id"]
+                snapshot = json.dumps(tree, default=str)
+                snapshots[biz_id] = snapshot
+                self._local_set(biz_id, versions[biz_id], snapshot)
+                mapping[SNAPSHOT_KEY.format(biz_id)] = f"{versions[biz_id]}|{snapshot}"
+            try:
+                pipe = cache_conn().pipeline()
+                for key, value in mapping.items():
+                    pipe.set(key, value, ex=self._ttl)
+                pipe.execute()
+            except Exception as err:
+                logging.error(f"写入服务树快照失败: {err}")
+
+        trees = []
+        for biz_id, biz_name in biz_data.items():
+            tree = json.loads(snapshots[biz_id])
+            # 业务改名不会递增版本号，名称不一致时以最新名称为准
+            tree["title"] = biz_name
+            trees.append(tree)
+        return trees
+
+    def bump(self, *biz_ids: Optional[str]):
+        """
+        递增业务版本号使快照失效，未指定业务时递增全局版本号
+        """
+        keys = {VERSION_KEY.format(biz_id) for biz_id in biz_ids if biz_id} or {VERSION_KEY.format(GLOBAL_VERSION)}
+        try:
+            pipe = cache_conn().pipeline()
+            for key in keys:
+                pipe.incr(key)
+            pipe.execute()
+        except Exception as err:
+            logging.error(f"递增服务树版本失败: {err}")
+        with self._lock:
+            for biz_id in biz_ids:
+                self._local.pop(biz_id, None)
+            if not any(biz_ids):
+                self._local.clear()
+
+
+tree_cache = TreeSnapshotCache()
+
+
+def invalidate_tree_cache(func):
+    """
+    服务树变更接口装饰器，返回 code=0 时按参数中的 biz_id 递增版本号
+    """
+
+    @wraps(func)
+    def wrapper(data: dict, *args, **kwargs):
+        res = func(data, *args, **kwargs)
+        if isinstance(res, dict) and res.get("code") == 0:
+            tree_cache.bump(data.get("biz_id") if isinstance(data, dict) else None)
+        return res
+
+    return wrapper
+
+
+if __name__ == "__main__":
+    pass
@@ -8,10 +8,28 @@ Desc  : VMware
 """
 
 import logging
+import threading
+import time
 from models.models_utils import server_task, mark_expired, mark_expired_by_sync, server_task_batch
 from typing import *
-from pyVmomi import vim
+from pyVmomi import vim, vmodl
 from pyVim import connect
+from websdk2.configs import configs
+from settings import settings
+
+if configs.can_import:
+    configs.import_dict(**settings)
+
+# 只取同步需要的属性，避免逐台读取 summary 产生的多次往返
+VM_PROPERTY_PATHS = [
+    'summary.config.instanceUuid',
+    'summary.config.name',
+    'summary.config.numCpu',
+    'summary.config.memorySizeMB',
+    'summary.config.guestFullName',
+    'summary.runtime.powerState',
+    'summary.guest.ipAddress',
+]
 
 
 def check_os_type(os_name):
@@ -34,6 +52,98 @@ def check_instance_state(value):
         return value
 
 
+class VMInventory(object):
+    """
+    vCenter会话上的属性收集器
+    全量模式按页调用 RetrievePropertiesEx/ContinueRetrievePropertiesEx
+    增量模式创建过滤器后调用 WaitForUpdatesEx，首次返回全部虚拟机，之后只返回变更，会话和版本号跨同步保留
+    """
+
+    def __init__(self, si, page_size: int):
+        self.si = si
+        self.page_size = page_size
+        content = si.RetrieveContent()
+        self.view = content.viewManager.CreateContainerView(content.rootFolder, [vim.VirtualMachine], True)
+        # 独立的属性收集器，过滤器和版本号不受其他调用影响
+        self.collector = content.propertyCollector.CreatePropertyCollector()
+        self.filter = None
+        self.version = None
+        self.created_at = time.time()
+        self.vms: Dict[str, Dict[str, Any]] = {}
+
+    def _filter_spec(self):
+        traversal = vmodl.query.PropertyCollector.TraversalSpec(
+            name='traverseEntities', path='view', skip=False, type=vim.view.ContainerView)
+        obj_spec = vmodl.query.PropertyCollector.ObjectSpec(obj=self.view, skip=True, selectSet=[traversal])
+        prop_spec = vmodl.query.PropertyCollector.PropertySpec(type=vim.VirtualMachine, pathSet=VM_PROPERTY_PATHS)
+        return vmodl.query.PropertyCollector.FilterSpec(objectSet=[obj_spec], propSet=[prop_spec])
+
+    def retrieve_all(self) -> Dict[str, Dict[str, Any]]:
+        """分页获取全部虚拟机的属性"""
+        options = vmodl.query.PropertyCollector.RetrieveOptions(maxObjects=self.page_size)
+        result = self.collector.RetrievePropertiesEx([self._filter_spec()], options)
+        vms: Dict[str, Dict[str, Any]] = {}
+        while result:
+            for obj in result.objects:
+                vms[obj.obj._moId] = {prop.name: prop.val for prop in obj.propSet}
+            if not result.token:
+                break
+            result = self.collector.ContinueRetrievePropertiesEx(result.token)
+        self.vms = vms
+        return vms
+
+    def wait_updates(self) -> Set[str]:
+        """
+        获取上次版本之后的变更并合并到 self.vms
+        :return: 新增或变更的虚拟机
+        """
+        if self.filter is None:
+            self.filter = self.collector.CreateFilter(self._filter_spec(), partialUpdates=True)
+            self.version = ''
+            self.vms = {}
+        # maxWaitSeconds=0 没有变更时立即返回，maxObjectUpdates 控制每次返回的数量
+        options = vmodl.query.PropertyCollector.WaitOptions(maxWaitSeconds=0, maxObjectUpdates=self.page_size)
+        changed: Set[str] = set()
+        while True:
+            update_set = self.collector.WaitForUpdatesEx(self.version, options)
+            if update_set is None:
+                break
+            self.version = update_set.version
+            for filter_update in update_set.filterSet or []:
+                for obj_update in filter_update.objectSet or []:
+                    mo_id = obj_update.obj._moId
+                    if obj_update.kind == 'leave':
+                        self.vms.pop(mo_id, None)
+                        changed.discard(mo_id)
+                        continue
+                    props = self.vms.setdefault(mo_id, {})
+                    for change in obj_update.changeSet or []:
+                        if change.op in ('assign', 'add'):
+                            props[change.name] = change.val
+                        else:
+                            props.pop(change.name, None)
+                    changed.add(mo_id)
+            if not update_set.truncated:
+                break
+        return changed
+
+    def close(self):
+        try:
+            if self.filter is not None:
+                self.filter.DestroyPropertyFilter()
+            self.collector.DestroyPropertyCollector()
+            self.view.Destroy()
+        except Exception as err:
+            logging.debug(f'释放vCenter属性收集器出错 {err}')
+        finally:
+            connect.Disconnect(self.si)
+
+
+# 增量模式下每个vCenter账号保留一个会话
+_inventories: Dict[Tuple[str, str], VMInventory] = {}
+_inventories_lock = threading.Lock()
+
+
 class VMWareHostAPI(object):
     def __init__(self, access_id: str, access_key: str, account_id: str, server_addr: str):
         self.__user = access_id
@@ -45,51 +155,84 @@ class VMWareHostAPI(object):
 
         if len(server_addr.split(':')) == 3:
             self.__scheme = server_addr.split(':')[2]
+        self.page_size = int(configs.get('vmware_page_size', 500))
+        self.incremental = configs.get('vmware_incremental', 'yes') == 'yes'
+        self.full_interval = int(configs.get('vmware_full_sync_interval', 21600))
+        self._key = (self._account_id, server_addr)
 
-        try:
-            self.client = self._init_conn_client()
-        except Exception as err:
-            logging.error(err)
-
-    def _init_conn_client(self):
+    def _connect(self):
         if self.__scheme and self.__scheme == 'ssl':
-            vc_ins = connect.SmartConnect(host=self.__server, user=self.__user, pwd=self.__password, port=self.__port)
-        else:
-            vc_ins = connect.SmartConnectNoSSL(host=self.__server, user=self.__user, pwd=self.__password,
-                                               port=self.__port)
-        content = vc_ins.RetrieveContent()
-        container = content.rootFolder
-        viewType = [vim.VirtualMachine]
-        recursive = True
-        return content.viewManager.CreateContainerView(container, viewType, recursive)
+            return connect.SmartConnect(host=self.__server, user=self.__user, pwd=self.__password, port=self.__port)
+        return connect.SmartConnectNoSSL(host=self.__server, user=self.__user, pwd=self.__password,
+                                         port=self.__port)
 
-    def get_all_vm(self):
+    def _get_inventory(self) -> VMInventory:
+        """复用增量会话，超过全量对账周期后重建"""
+        with _inventories_lock:
+            inventory = _inventories.get(self._key)
+            if inventory and time.time() - inventory.created_at >= self.full_interval:
+                inventory.close()
+                inventory = None
+            if inventory is None:
+                inventory = VMInventory(self._connect(), self.page_size)
+                _inventories[self._key] = inventory
+            return inventory
+
+    def _drop_inventory(self):
+        with _inventories_lock:
+            inventory = _inventories.pop(self._key, None)
+        if inventory:
+            inventory.close()
+
+    def collect(self) -> Tuple[List[dict], List[dict]]:
         """
-        https://github.com/vmware/pyvmomi-community-samples/blob/master/samples/getallvms.py
-        Print information for a particular virtual machine or recurse into a
-        folder with depth protection
+        :return: (全部虚拟机, 本次需要写入的虚拟机)，全量模式两者相同
         """
+        if not self.incremental:
+            inventory = VMInventory(self._connect(), self.page_size)
+            try:
+                rows = [self.format_data(props) for props in inventory.retrieve_all().values()]
+            finally:
+                inventory.close()
+            return rows, rows
 
-        return [self.format_data(info) for info in self.client.view]
+        for attempt in range(2):
+            inventory = self._get_inventory()
+            try:
+                changed = inventory.wait_updates()
+                break
+            except Exception as err:
+                # 会话过期或版本失效时重建会话重新全量获取
+                logging.warning(f'vCenter增量获取失败，重新建立会话 {err}')
+                self._drop_inventory()
+                if attempt:
+                    raise
+        rows = {mo_id: self.format_data(props) for mo_id, props in inventory.vms.items()}
+        return list(rows.values()), [rows[mo_id] for mo_id in changed if mo_id in rows]
 
-    def format_data(self, data) -> Dict[str, Any]:
-        summary = data.summary
+    def get_all_vm(self):
+        """
+        通过属性收集器批量获取虚拟机
+        """
 
+        return self.collect()[0]
+
+    def format_data(self, props: Dict[str, Any]) -> Dict[str, Any]:
         # # 定义返回
         res: Dict[str, Any] = dict()
-        res['instance_id'] = summary.config.instanceUuid
+        res['instance_id'] = props.get('summary.config.instanceUuid')
         try:
-            res['name'] = summary.config.name
+            res['name'] = props.get('summary.config.name')
             res['account_id'] = self._account_id
-            res['state'] = check_instance_state(summary.runtime.powerState)
+            res['state'] = check_instance_state(props.get('summary.runtime.powerState') or '')
             # res['instance_type'] = data.get('InstanceType')
-            res['inner_ip'] = summary.guest.ipAddress
-            res['cpu'] = summary.config.numCpu
-            res['memory'] = round(summary.config.memorySizeMB / 1024, 0)
+            res['inner_ip'] = props.get('summary.guest.ipAddress')
+            res['cpu'] = props.get('summary.config.numCpu')
+            res['memory'] = round((props.get('summary.config.memorySizeMB') or 0) / 1024, 0)
             res['region'] = self.__server
             res['zone'] = ''
-            res['os_type'] = check_os_type(summary.config.guestFullName)
-            res['os_name'] = summary.config.guestFullName
+            res['os_type'] = check_os_type(props.get('summary.config.guestFullName') or '')
+            res['os_name'] = props.get('summary.config.guestFullName')
         except Exception as e:
             logging.error(f'同步开始, 信息：「format_data」-「{e}」.')
         return res
@@ -100,15 +243,29 @@ class VMWareHostAPI(object):
         同步CMDB
         :return:
         """
-        # 机器比较少 根本用不上迭代器
         logging.info(f'同步开始, 信息：「{cloud_name}」-「{resource_type}」.')
-        all_server_list: List[dict] = self.get_all_vm()
+        try:
+            all_server_list, changed_list = self.collect()
+        except Exception as err:
+            logging.error(f'获取vCenter虚拟机出错 {err}')
+            return False, f"获取vCenter虚拟机出错 {err}"
         if not all_server_list: return False, "主机列表为空"
-        # # 更新资源
-        ret_state, ret_msg = server_task_batch(account_id=self._account_id, cloud_name=cloud_name, rows=all_server_list)
+        # # 更新资源，增量模式只写入变更的虚拟机
+        ret_state, ret_msg = True, f"{cloud_name}-{self._account_id}-server 没有变更"
+        if changed_list:
+            try:
+                ret_state, ret_msg = server_task_batch(account_id=self._account_id, cloud_name=cloud_name,
+                                                       rows=changed_list)
+            except Exception as err:
+                ret_state, ret_msg = False, f"写入vCenter虚拟机出错 {err}"
+            if not ret_state and self.incremental:
+                # 版本号已前移，写入失败的变更不会再次返回，丢弃会话下次重新全量获取
+                logging.error(f'{self._account_id} 增量写入失败，重建vCenter会话 {ret_msg}')
+                self._drop_inventory()
+                return ret_state, ret_msg
         # 标记过期
         # mark_expired(resource_type=resource_type, account_id=self._account_id)
-        instance_ids = [server['instance_id'] for server in all_server_list]
+        instance_ids = [server['instance_id'] for server in all_server_list if server.get('instance_id')]
         mark_expired_by_sync(cloud_name=cloud_name, account_id=self._account_id, resource_type=resource_type,
                              instance_ids=instance_ids)
         return ret_state, ret_msg
@@ -2,7 +2,7 @@
 # -*- coding: utf-8 -*-
 
 from typing import *
-from libs.volc.volc_ecs import VolCECS
+from libs.volc.async_volc_ecs import VolCECSAsync
 from libs.volc.volc_redis import VolCRedis
 from libs.volc.volc_rds import VolCRDS
 from libs.volc.volc_clb import VolCCLB
@@ -20,7 +20,7 @@ DEFAULT_CLOUD_NAME = 'volc'
 mapping: Dict[str, dict] = {
     '服务器': {
         "type": "ecs",
-        "obj": VolCECS
+        "obj": VolCECSAsync
     },
     'Redis': {
         "type": "redis",
@@ -11,19 +11,22 @@ import concurrent
 import logging
 import time
 from concurrent.futures import ThreadPoolExecutor
-from typing import Any, Callable, Dict, List, Optional
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from websdk2.tools import RedisLock
 
 from libs import deco
 from libs.mycrypt import mc
+from libs.async_collector import AsyncCollector, sync_collectors
+from libs.sync_scheduler import sync_scheduler
 from libs.volc import DEFAULT_CLOUD_NAME, mapping
-from models.models_utils import get_cloud_config, sync_log_task
+from models.models_utils import get_cloud_config
 
 
 def sync(data: Dict[str, Any]) -> None:
     """
-    火山云统一资产入库，云厂商用for，产品用并发，地区用for
+    火山云统一资产入库，云厂商用for，产品用并发，地区用并发
     """
     obj, cloud_type, account_id = data.get("obj"), data.get("type"), data.get("account_id")
 
@@ -36,40 +39,17 @@ def sync(data: Dict[str, Any]) -> None:
 
 
 def sync_regions(conf: Dict[str, str], obj: Callable, cloud_type: str) -> None:
-    region_list = conf["region"].split(",")
-    for region in region_list:
-        sync_region(conf, region, obj, cloud_type)
-
-
-def sync_region(conf: Dict[str, str], region: str, obj: Callable, cloud_type: str) -> None:
-    logging.info(f"同步开始, 信息：「{DEFAULT_CLOUD_NAME}」-「{cloud_type}」-「{region}」.")
-
-    start_time = time.time()
-    is_success, msg = obj(
-        access_id=conf["access_id"],
-        access_key=mc.my_decrypt(conf["access_key"]),
-        account_id=conf["account_id"],
-        region=region,
-    ).sync_cmdb()
-    end_time = time.time()
-
-    sync_consum = "%.2f" % (end_time - start_time)
-    sync_state = "success" if is_success else "failed"
-
-    sync_log_task(
-        dict(
-            name=conf["name"],
-            cloud_name=DEFAULT_CLOUD_NAME,
-            sync_type=cloud_type,
+    access_key = mc.my_decrypt(conf["access_key"])
+
+    def sync_region(region: str) -> Tuple[bool, str]:
+        return obj(
+            access_id=conf["access_id"],
+            access_key=access_key,
             account_id=conf["account_id"],
-            sync_region=region,
-            sync_state=sync_state,
-            sync_consum=sync_consum,
-            loginfo=str(msg),
-        )
-    )
+            region=region,
+        ).sync_cmdb()
 
-    logging.info(f"同步结束, 信息：「{DEFAULT_CLOUD_NAME}」-「{cloud_type}」-「{region}」.")
+    sync_scheduler.run_regions(DEFAULT_CLOUD_NAME, cloud_type, conf, sync_region)
 
 
 def main(account_id: Optional[str] = None, resources: List[str] = None, executors=None):
@@ -98,12 +78,18 @@ def main(account_id: Optional[str] = None, resources: List[str] = None, executor
         if not filtered_sync_mapping:
             logging.warning("未找到需要同步的资源类型")
             return
+        # 基于 AsyncCollector 的资源每个账号合并到一个事件循环同步，其余资源按类型并发
+        sync_configs = list(filtered_sync_mapping.values())
+        jobs = [partial(sync, config) for config in sync_configs if not issubclass(config["obj"], AsyncCollector)]
+        collector_configs = [config for config in sync_configs if issubclass(config["obj"], AsyncCollector)]
+        if collector_configs:
+            jobs.append(partial(sync_collectors, DEFAULT_CLOUD_NAME, account_id, collector_configs))
         # 使用传入的线程池或创建临时线程池
         if executors:
             # 使用传入的线程池
             futures = []
-            for config in filtered_sync_mapping.values():
-                future = executors.submit(sync, config)
+            for job in jobs:
+                future = executors.submit(job)
                 futures.append(future)
 
             # 等待所有任务完成
@@ -113,8 +99,8 @@ def main(account_id: Optional[str] = None, resources: List[str] = None, executor
                 except Exception as e:
                     logging.error(f"资源同步任务失败: {e}")
         else:
-            with ThreadPoolExecutor(max_workers=len(filtered_sync_mapping)) as executor:
-                executor.map(sync, filtered_sync_mapping.values())
+            with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+                executor.map(lambda job: job(), jobs)
 
     index()
 
@@ -32,7 +32,7 @@ class VolCBilling:
         configuration.sk = access_key
         configuration.region = region
         # volcenginesdkcore.Configuration.set_default(configuration)
-        api_client = volcenginesdkcore.ApiClient(configuration)
+        api_client = volc_api_client(configuration, "billing")
 
         return BILLINGApi(api_client)
 
@@ -17,6 +17,7 @@ from volcenginesdkclb import (
 )
 from volcenginesdkcore.rest import ApiException
 
+from libs.cloud_client import volc_api_client
 from models.models_utils import lb_task, mark_expired, mark_expired_by_sync
 
 CLBStatusMapping = {
@@ -62,7 +63,7 @@ class VolCCLB:
         configuration.client_side_validation = False
         # set default configuration
         # volcenginesdkcore.Configuration.set_default(configuration)
-        api_client = volcenginesdkcore.ApiClient(configuration)
+        api_client = volc_api_client(configuration, "clb")
         return CLBApi(api_client)
 
     def get_describe_load_balancers(self):
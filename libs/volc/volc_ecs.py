@@ -16,6 +16,7 @@ from volcenginesdkcore.rest import ApiException
 from volcenginesdkecs import DescribeInstancesRequest, ECSApi
 from volcenginesdkvpc import DescribeNetworkInterfaceAttributesRequest
 
+from libs.cloud_client import volc_api_client
 from libs.volc.volc_vpc import VolCVPC
 from libs.volc.volc_network_interface import VolCNetworkInterface
 from models.models_utils import mark_expired, mark_expired_by_sync, server_task, server_task_batch
@@ -59,7 +60,7 @@ class VolCECS:
         configuration.sk = access_key
         configuration.region = region
         # volcenginesdkcore.Configuration.set_default(configuration)
-        api_client = volcenginesdkcore.ApiClient(configuration)
+        api_client = volc_api_client(configuration, "ecs")
         return ECSApi(api_client)
 
     def get_describe_info(self, next_token):
@@ -137,6 +138,7 @@ class VolCECS:
 
             res["instance_id"] = data.instance_id
             res["vpc_id"] = vpc_id
+            res["vswitch_id"] = network_interface.subnet_id
             res["state"] = get_run_type(data.status)
             res["instance_type"] = data.instance_type_id
             res["cpu"] = data.cpus
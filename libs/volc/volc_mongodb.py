@@ -12,6 +12,7 @@ import volcenginesdkcore
 from volcenginesdkcore.rest import ApiException
 from volcenginesdkmongodb import DescribeDBEndpointRequest, DescribeDBInstancesRequest, MONGODBApi
 
+from libs.cloud_client import volc_api_client
 from models.models_utils import mark_expired, mark_expired_by_sync, mongodb_task
 
 MongoDBChargeTypeMapping = {"PrePaid": "包年包月", "PostPaid": "按量计费"}
@@ -52,7 +53,7 @@ class VolcMongoDB:
         configuration.ak = access_id
         configuration.sk = access_key
         configuration.region = region
-        return MONGODBApi(volcenginesdkcore.ApiClient(configuration))
+        return MONGODBApi(volc_api_client(configuration, "mongodb"))
 
     def get_mongodb(self):
         """
@@ -22,6 +22,7 @@ from volcenginesdknatgateway import (
     DescribeNatGatewaysResponse,
 )
 
+from libs.cloud_client import volc_api_client
 from libs.volc.volc_vpc import VolCVPC
 from models.models_utils import mark_expired, mark_expired_by_sync, nat_task
 
@@ -72,7 +73,7 @@ class VolNAT:
         configuration.sk = access_key
         configuration.region = region
         # volcenginesdkcore.Configuration.set_default(configuration)
-        api_client = volcenginesdkcore.ApiClient(configuration)
+        api_client = volc_api_client(configuration, "natgateway")
         return volcenginesdknatgateway.NATGATEWAYApi(api_client)
 
     def describe_nat_gateways(self) -> Optional[DescribeNatGatewaysResponse]:
@@ -28,7 +28,7 @@ class VolCNetworkInterface:
         configuration.sk = access_key
         configuration.region = region
         # volcenginesdkcore.Configuration.set_default(configuration)
-        api_client = volcenginesdkcore.ApiClient(configuration)
+        api_client = volc_api_client(configuration, "vpc")
         return VPCApi(api_client)
 
     def get_network_interface(self, next_token):
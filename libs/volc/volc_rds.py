@@ -10,6 +10,7 @@ import volcenginesdkcore
 from volcenginesdkcore.rest import ApiException
 from volcenginesdkrdsmysqlv2 import RDSMYSQLV2Api, DescribeDBInstancesRequest
 
+from libs.cloud_client import volc_api_client
 from models.models_utils import mark_expired, mysql_task, mark_expired_by_sync
 
 InstanceStatusMapping = {
@@ -63,7 +64,7 @@ class VolCRDS:
         # configuration.client_side_validation = False
         # set default configuration
         # volcenginesdkcore.Configuration.set_default(configuration)
-        api_client = volcenginesdkcore.ApiClient(configuration)
+        api_client = volc_api_client(configuration, "rds_mysql")
         return RDSMYSQLV2Api(api_client)
 
     def get_describe_db_instance(self):
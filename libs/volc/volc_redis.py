@@ -11,6 +11,7 @@ import volcenginesdkcore
 from volcenginesdkcore.rest import ApiException
 from volcenginesdkredis import DescribeDBInstanceDetailRequest, DescribeDBInstancesRequest, REDISApi
 
+from libs.cloud_client import volc_api_client
 from models.models_utils import mark_expired, mark_expired_by_sync, redis_task
 
 # 文档 https://www.volcengine.com/docs/6293/71563
@@ -80,7 +81,7 @@ class VolCRedis:
         # configuration.client_side_validation = False
         # set default configuration
         # volcenginesdkcore.Configuration.set_default(configuration)
-        api_client = volcenginesdkcore.ApiClient(configuration)
+        api_client = volc_api_client(configuration, "redis")
         return REDISApi(api_client)
 
     def get_describe_db_instance(self):
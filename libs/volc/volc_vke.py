@@ -12,6 +12,7 @@ import volcenginesdkcore
 from volcenginesdkcore.rest import ApiException
 from volcenginesdkvke import ListClustersRequest, VKEApi
 
+from libs.cloud_client import volc_api_client
 from models.models_utils import cluster_task, mark_expired, mark_expired_by_sync
 
 
@@ -50,7 +51,7 @@ class VolcVKE:
         configuration.ak = access_id
         configuration.sk = access_key
         configuration.region = region
-        return VKEApi(volcenginesdkcore.ApiClient(configuration))
+        return VKEApi(volc_api_client(configuration, "vke"))
 
     def get_cluster(self):
         """
@@ -11,6 +11,7 @@ import volcenginesdkcore
 from volcenginesdkcore.rest import ApiException
 from volcenginesdkvpc import VPCApi, DescribeVpcsRequest, DescribeVpcAttributesRequest
 
+from libs.cloud_client import volc_api_client
 from models.models_utils import vpc_task, mark_expired, mark_expired_by_sync
 
 VPCStatusMapping = {
@@ -45,7 +46,7 @@ class VolCVPC:
         # configuration.client_side_validation = False
         # set default configuration
         # volcenginesdkcore.Configuration.set_default(configuration)
-        api_client = volcenginesdkcore.ApiClient(configuration)
+        api_client = volc_api_client(configuration, "vpc")
         return VPCApi(api_client)
 
     def get_describe_vpc(self):
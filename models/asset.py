@@ -6,7 +6,7 @@ Author  : shenshuo
 Date    : 2023/2/15 14:59
 Desc    : 基础资产Models
 """
-from sqlalchemy import Column, String, Integer, Boolean, JSON, TEXT, UniqueConstraint, Date, Enum
+from sqlalchemy import Column, String, Integer, Boolean, JSON, TEXT, UniqueConstraint, Date, Enum, Index
 from sqlalchemy.ext.declarative import declarative_base
 
 from libs.utils import human_date
@@ -49,6 +49,7 @@ class AssetBaseModel(TimeBaseModel, Base):
     zone = Column('zone', String(120), comment='可用区id')  # 位置信息
     is_expired = Column('is_expired', Boolean(), default=False, comment='True表示已过期')
     ext_info = Column('ext_info', JSON(), comment='扩展字段存JSON')
+    content_hash = Column('content_hash', String(32), comment='同步内容摘要，未变更时跳过写入')
 
 
 class AssetServerModels(AssetBaseModel):
@@ -222,8 +223,49 @@ class AssetBackupModels(TimeBaseModel):
     inner_ip = Column('inner_ip', String(64), default='', comment="IP")
     instance_id = Column('instance_id', String(128), default='', comment="实例ID")
     data = Column('data', JSON(), comment='数据')
+    data_hash = Column('data_hash', String(32), index=True, comment='快照内容摘要，内容存放在快照内容表')
     asset_type = Column('asset_type', String(32), default='', comment="资产类型")
     created_day = Column(Date, default=human_date(), comment="日期")
+    # 联合键约束(每种资产每天一份快照)，同时用于按实例ID顺序读取
+    __table_args__ = (
+        UniqueConstraint('asset_type', 'created_day', 'instance_id', name='idx_backup_day_instance'),
+    )
+
+
+class AssetServerRelationModels(TimeBaseModel):
+    """主机与安全组/VPC/虚拟子网的关联，主机同步写入时维护，用于反查主机"""
+    __tablename__ = 't_asset_server_relation'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    server_instance_id = Column('server_instance_id', String(120), nullable=False, comment='主机实例ID')
+    rel_type = Column('rel_type', String(32), nullable=False, comment='关联类型 security_group/vpc/vswitch')
+    rel_id = Column('rel_id', String(120), nullable=False, index=True, comment='关联资源实例ID')
+    # 联合键约束
+    __table_args__ = (
+        UniqueConstraint('server_instance_id', 'rel_type', 'rel_id', name='idx_server_relation'),
+    )
+
+
+class AssetSearchTokenModels(TimeBaseModel):
+    """全局搜索倒排索引，名称/IP/实例ID/地址/解析值按三字符切分，资产写入时维护"""
+    __tablename__ = 't_asset_search_token'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    asset_kind = Column('asset_kind', String(20), nullable=False, comment='资产类型 server/mysql/redis/lb/nat/dns')
+    ref_key = Column('ref_key', String(128), nullable=False, comment='资产实例ID或解析记录ID')
+    token = Column('token', String(12), nullable=False, comment='三字符片段')
+    # 联合键约束
+    __table_args__ = (
+        UniqueConstraint('asset_kind', 'token', 'ref_key', name='idx_search_token'),
+        Index('idx_search_ref', 'asset_kind', 'ref_key'),
+    )
+
+
+class AssetBackupPayloadModels(TimeBaseModel):
+    """资产快照内容，按内容摘要去重，内容不变的资产每天只记录摘要"""
+    __tablename__ = 't_asset_backup_payload'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    data_hash = Column('data_hash', String(32), unique=True, nullable=False, comment='内容摘要')
+    asset_type = Column('asset_type', String(32), default='', index=True, comment="资产类型")
+    data = Column('data', JSON(), comment='数据')
 
 
 class AssetNatModels(AssetBaseModel):
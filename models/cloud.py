@@ -44,6 +44,19 @@ class SyncLogModels(Base):
     sync_consum = Column('sync_consum', String(120), comment='同步耗时')
     sync_time = Column('sync_time', DateTime(), default=datetime.now, index=True, comment='同步时间')
     loginfo = Column('loginfo', Text(), comment='log')
+    inserted_count = Column('inserted_count', Integer, default=0, comment='新增数量')
+    updated_count = Column('updated_count', Integer, default=0, comment='更新数量')
+    unchanged_count = Column('unchanged_count', Integer, default=0, comment='未变更数量')
+
+
+class SyncCursorModels(Base):
+    __tablename__ = 't_sync_cursor'  # 增量同步事件游标
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    account_id = Column('account_id', String(120), unique=True, nullable=False, comment='AccountUUID')
+    cloud_name = Column('cloud_name', String(120), nullable=False, comment='云厂商Name')
+    cursor_time = Column('cursor_time', DateTime(), comment='已处理到的事件时间')
+    last_full_time = Column('last_full_time', DateTime(), comment='上次全量同步开始时间')
+    update_time = Column('update_time', DateTime(), default=datetime.now, onupdate=datetime.now, comment='更新时间')
 
 
 class CloudBillingSettingModels(Base):
@@ -8,12 +8,15 @@ Desc    : 操作Models公共方法
 """
 
 import datetime
+import hashlib
 import json
 import logging
+import threading
+from dataclasses import dataclass
 from typing import *
 
-import pymysql
-from sqlalchemy.orm.attributes import flag_modified
+from sqlalchemy import Column, MetaData, String, Table, case, exists, func, text, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
 from sqlalchemy.sql import or_
 from websdk2.api_set import api_set
 from websdk2.client import AcsClient
@@ -21,6 +24,7 @@ from websdk2.configs import configs
 from websdk2.db_context import DBContextV2 as DBContext
 from websdk2.model_utils import insert_or_update, model_to_dict
 
+from libs.search_index import index_rows, search_indexer
 from models import asset_mapping
 from models.asset import (
     AssetClusterModels,
@@ -32,11 +36,12 @@ from models.asset import (
     AssetNatModels,
     AssetRedisModels,
     AssetServerModels,
+    AssetServerRelationModels,
     AssetVPCModels,
     AssetVSwitchModels,
     SecurityGroupModels,
 )
-from models.cloud import CloudSettingModels, SyncLogModels
+from models.cloud import CloudSettingModels, SyncCursorModels, SyncLogModels
 from models.event import CloudEventsModels
 from settings import settings
 
@@ -63,6 +68,32 @@ def mark_expired(resource_type: Optional[str], account_id: Optional[str]):
         ).update({resource_model.is_expired: True})
 
 
+# 同步结果临时表，按连接隔离
+_seen_ids_table = Table(
+    "tmp_sync_seen_instance",
+    MetaData(),
+    Column("instance_id", String(120), primary_key=True),
+    prefixes=["TEMPORARY"],
+)
+
+
+def _stage_instance_ids(session, instance_ids: Iterable[str]) -> Table:
+    """
+    将实例ID分批写入当前连接的临时表，代替超长的 NOT IN 列表
+    """
+    chunk_size = int(settings.get("sync_prefetch_chunk_size", 1000))
+    connection = session.connection()
+    _drop_staged_instance_ids(session, _seen_ids_table)
+    _seen_ids_table.create(connection)
+    for chunk in _chunked(list(set(instance_ids)), chunk_size):
+        connection.execute(_seen_ids_table.insert(), [{"instance_id": i} for i in chunk])
+    return _seen_ids_table
+
+
+def _drop_staged_instance_ids(session, table: Table):
+    session.connection().execute(text(f"DROP TEMPORARY TABLE IF EXISTS {table.name}"))
+
+
 def mark_expired_by_sync(cloud_name: str, account_id: str, resource_type: str, instance_ids: list, region=None):
     """根据同步结果标记过期状态
     Args:
@@ -80,28 +111,38 @@ def mark_expired_by_sync(cloud_name: str, account_id: str, resource_type: str, i
         with DBContext("w", None, True, **settings) as session:
             resource_model = asset_mapping.get(resource_type)
 
-            # 基础过滤条件
+            # 将本次同步到的实例ID写入临时表，通过反连接一次性标记未同步的资源
+            seen_table = _stage_instance_ids(session, instance_ids)
             base_filter = [
                 resource_model.cloud_name == cloud_name,
                 resource_model.account_id == account_id,
                 resource_model.is_expired.is_(False),
                 resource_model.state != "未同步",
-                ~resource_model.instance_id.in_(instance_ids),
+                ~exists().where(seen_table.c.instance_id == resource_model.instance_id),
             ]
             # 如果指定了region，添加region过滤条件
             if region:
                 base_filter.append(resource_model.region == region)
 
-            # 将不在当前同步列表中的资源标记为未同步
-            unsync_resources = session.query(resource_model).filter(*base_filter).all()
-
-            for resource in unsync_resources:
-                resource.state = "未同步"
-                # 更新ext_info中的state字段
-                if hasattr(resource, "ext_info") and resource.ext_info:
-                    if isinstance(resource.ext_info, dict):
-                        resource.ext_info["state"] = "未同步"
-                        flag_modified(resource, "ext_info")
+            values = {
+                resource_model.state: "未同步",
+                resource_model.update_time: datetime.datetime.now(),
+            }
+            # 同步更新ext_info中的state字段
+            if hasattr(resource_model, "ext_info"):
+                values[resource_model.ext_info] = case(
+                    (
+                        func.json_type(resource_model.ext_info) == "OBJECT",
+                        func.json_set(resource_model.ext_info, "$.state", "未同步"),
+                    ),
+                    else_=resource_model.ext_info,
+                )
+            # 清空摘要，再次同步到时整行重写
+            if hasattr(resource_model, "content_hash"):
+                values[resource_model.content_hash] = None
+            unsync_count = session.execute(update(resource_model).where(*base_filter).values(values)).rowcount
+            _drop_staged_instance_ids(session, seen_table)
+            logging.info(f"标记未同步资源， 资源类型：{resource_type}, 数量: {unsync_count}")
 
             # 将7天未同步的资源标记为过期
             seven_days_ago = datetime.datetime.now() - datetime.timedelta(days=7)
@@ -189,10 +230,12 @@ def get_all_cloud_interval() -> List[dict]:
         return [{"cloud_name": i[0], "account_id": i[1], "interval": i[2]} for i in _info]
 
 
-def sync_log_task(data: Dict[str, str]):
+def sync_log_task(data: Dict[str, str], stats: Optional["UpsertResult"] = None):
     """
     资产同步日志入库
+    当前线程内批量写入的新增/更新/未变更统计会一并记录
     :param data:
+    :param stats: 写入统计，同一线程并发多个同步单元时由调用方按单元传入，默认取当前线程的统计
     :return:
     """
     # 示例
@@ -210,11 +253,50 @@ def sync_log_task(data: Dict[str, str]):
         logging.error(f"记录Log参数错误,元数据是={data}")
         return
 
+    if stats is None:
+        stats = pop_sync_stats()
     with DBContext("w", None, None, **settings) as db_session:
-        db_session.add(SyncLogModels(**data))
+        db_session.add(
+            SyncLogModels(
+                **data,
+                inserted_count=stats.inserted,
+                updated_count=stats.updated,
+                unchanged_count=stats.unchanged,
+            )
+        )
         db_session.commit()
 
 
+def get_sync_cursor(account_id: str) -> Optional[Dict[str, Any]]:
+    """
+    获取账号的增量同步游标
+    :return: {"cursor_time": datetime, "last_full_time": datetime}，未记录时返回None
+    """
+    with DBContext("r", None, None, **settings) as session:
+        cursor = session.query(SyncCursorModels).filter(SyncCursorModels.account_id == account_id).first()
+        if not cursor:
+            return None
+        return dict(cursor_time=cursor.cursor_time, last_full_time=cursor.last_full_time)
+
+
+def save_sync_cursor(
+    cloud_name: str,
+    account_id: str,
+    cursor_time: datetime.datetime,
+    last_full_time: Optional[datetime.datetime] = None,
+):
+    """
+    保存账号的增量同步游标，全量同步时同时记录全量时间
+    """
+    values = dict(cursor_time=cursor_time, update_time=datetime.datetime.now())
+    if last_full_time:
+        values["last_full_time"] = last_full_time
+    stmt = mysql_insert(SyncCursorModels).values(cloud_name=cloud_name, account_id=account_id, **values)
+    with DBContext("w", None, True, **settings) as session:
+        session.execute(stmt.on_duplicate_key_update(**values))
+        session.commit()
+
+
 def get_all_agent_info() -> dict:
     agent_info = {}
     try:
@@ -230,186 +312,317 @@ def get_all_agent_info() -> dict:
     return agent_info
 
 
-def server_task(cloud_name: str, account_id: str, rows: list) -> Tuple[bool, str]:
+@dataclass
+class UpsertResult:
+    """批量写入统计"""
+
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+
+    def merge(self, other: "UpsertResult"):
+        self.inserted += other.inserted
+        self.updated += other.updated
+        self.unchanged += other.unchanged
+
+    def __str__(self):
+        return f"新增:{self.inserted}, 更新:{self.updated}, 未变更:{self.unchanged}"
+
+
+# 按线程累计批量写入统计，由 sync_log_task 取出落库
+_sync_stats = threading.local()
+
+
+def record_sync_stats(result: UpsertResult):
+    """累加到当前线程的批量写入统计"""
+    stats = getattr(_sync_stats, "value", None)
+    if stats is None:
+        stats = _sync_stats.value = UpsertResult()
+    stats.merge(result)
+
+
+def pop_sync_stats() -> UpsertResult:
+    """取出并清空当前线程的批量写入统计"""
+    stats = getattr(_sync_stats, "value", None) or UpsertResult()
+    _sync_stats.value = None
+    return stats
+
+
+def _chunked(items: Sequence, size: int) -> Iterator[Sequence]:
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def _row_digest(row: Dict[str, Any], exclude: Sequence[str] = ()) -> str:
+    """计算待写入行的稳定摘要，用于判断云上数据是否变更"""
+    content = {k: v for k, v in row.items() if k not in exclude}
+    return hashlib.md5(
+        json.dumps(content, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+def bulk_upsert(
+    model,
+    rows: List[Dict[str, Any]],
+    insert_only: Sequence[str] = (),
+    prefetch_columns: Sequence[str] = (),
+    on_existing: Optional[Callable[[Dict[str, Any], Any], None]] = None,
+    after_write: Optional[Callable[[Any, List[Dict[str, Any]]], None]] = None,
+    batch_size: Optional[int] = None,
+) -> UpsertResult:
+    """
+    按 instance_id 批量写入资产
+    1. 分批 IN 预查询已有记录的 content_hash
+    2. 对比行摘要区分新增/更新/未变更
+    3. 新增和变更的行使用 INSERT ... ON DUPLICATE KEY UPDATE 分批写入，未变更的行只刷新 update_time
+    :param model: 资产模型，instance_id 为唯一键
+    :param rows: 按列名组织好的行数据
+    :param insert_only: 只在新增时写入的列，已有记录不覆盖
+    :param prefetch_columns: on_existing 需要用到的已有记录列
+    :param on_existing: 已有记录回调(row, record)，可根据库中记录补充待写入的行
+    :param after_write: 写入后回调(session, rows)，只包含新增和变更的行，与写入在同一事务
+    :param batch_size: 每批写入行数
+    :return:
     """
+    result = UpsertResult()
+    # 按 instance_id 去重，保留最后一条
+    pending = {row["instance_id"]: row for row in rows if row and row.get("instance_id")}
+    if not pending:
+        return result
 
+    batch_size = int(batch_size or settings.get("sync_upsert_batch_size", 500))
+    chunk_size = int(settings.get("sync_prefetch_chunk_size", 1000))
+    now = datetime.datetime.now()
+    query_columns = [model.id, model.instance_id, model.content_hash, model.is_expired]
+    query_columns.extend(getattr(model, c) for c in prefetch_columns)
+
+    with DBContext("w", None, True, **settings) as session:
+        existing = {}
+        for chunk in _chunked(list(pending), chunk_size):
+            for record in session.query(*query_columns).filter(model.instance_id.in_(chunk)).all():
+                existing[record.instance_id] = record
+
+        # 按列集合分组，保证同一条 INSERT 的列一致
+        groups: Dict[tuple, List[Dict[str, Any]]] = {}
+        unchanged_ids = []
+        for instance_id, row in pending.items():
+            record = existing.get(instance_id)
+            if record is not None and on_existing:
+                on_existing(row, record)
+            row["content_hash"] = _row_digest(row, exclude=insert_only)
+            if record is None:
+                result.inserted += 1
+            elif record.content_hash == row["content_hash"] and not record.is_expired:
+                result.unchanged += 1
+                unchanged_ids.append(record.id)
+                continue
+            else:
+                result.updated += 1
+            groups.setdefault(tuple(sorted(row)), []).append(row)
+
+        for keys, group in groups.items():
+            update_columns = [c for c in keys if c not in insert_only and c != "instance_id"] + ["update_time"]
+            for batch in _chunked(group, batch_size):
+                stmt = mysql_insert(model).values([dict(row, create_time=now, update_time=now) for row in batch])
+                stmt = stmt.on_duplicate_key_update({c: stmt.inserted[c] for c in update_columns})
+                session.execute(stmt)
+
+        # 未变更的行只刷新最后同步时间
+        for chunk in _chunked(unchanged_ids, chunk_size):
+            session.query(model).filter(model.id.in_(chunk)).update(
+                {model.update_time: now}, synchronize_session=False
+            )
+        if after_write and groups:
+            after_write(session, [row for group in groups.values() for row in group])
+        session.commit()
+
+    record_sync_stats(result)
+    return result
+
+
+def run_upsert_task(
+    task_name: str,
+    cloud_name: str,
+    account_id: str,
+    model,
+    rows: list,
+    build_row: Callable[[Dict[str, Any]], Dict[str, Any]],
+    **kwargs,
+) -> Tuple[bool, str]:
+    """
+    资产写入任务的公共入口
+    :param task_name: 任务名称，用于返回信息
     :param cloud_name:
     :param account_id:
-    :param rows:
+    :param model: 资产模型
+    :param rows: 云上格式化后的数据
+    :param build_row: 将一行云上数据转换为模型列
     :return:
     """
-    # 定义返回
-    ret_state, ret_msg = True, f"{cloud_name}-{account_id}-server task写入数据库完成"
-    # logging.error(f"{cloud_name}, {account_id}")
     try:
-        all_agent_info = get_all_agent_info()
-        with DBContext("w", None, True, **settings) as db_session:
-            for __info in rows:
-                instance_id = __info["instance_id"]
-                region = __info.get("region")
-                inner_ip = __info.get("inner_ip")
-                filter_map = dict(instance_id=instance_id)
-                exist_id = (
-                    db_session.query(AssetServerModels.id, AssetServerModels.agent_id).filter_by(**filter_map).first()
-                )
-                agent_id = "0"
-
-                if exist_id:
-                    # 更新时更新agent_info
-                    agent_info = all_agent_info.get(exist_id[1], {})
-                    try:
-                        update_data = {
-                            AssetServerModels.cloud_name: cloud_name,
-                            AssetServerModels.account_id: account_id,
-                            AssetServerModels.name: __info.get("name"),
-                            AssetServerModels.region: region,
-                            AssetServerModels.zone: __info.get("zone"),
-                            AssetServerModels.state: __info.get("state"),
-                            # AssetServerModels.agent_id: agent_id,
-                            # AssetServerModels.agent_info: agent_info,
-                            AssetServerModels.outer_ip: __info.get("outer_ip"),
-                            AssetServerModels.inner_ip: inner_ip,
-                            AssetServerModels.vpc_id: __info.get("vpc_id"),
-                            AssetServerModels.is_expired: False,  # 改为正常状态
-                            AssetServerModels.ext_info: __info,  # 存json
-                        }
-                        if agent_info:
-                            update_data[AssetServerModels.agent_info] = agent_info
-                        db_session.query(AssetServerModels).filter_by(**filter_map).update(update_data)
-                    except Exception as err:
-                        logging.error(err)
-                else:
-                    try:
-                        db_session.add(
-                            AssetServerModels(
-                                cloud_name=cloud_name,
-                                account_id=account_id,
-                                instance_id=instance_id,
-                                state=__info.get("state"),
-                                name=__info.get("name"),
-                                region=region,
-                                zone=__info.get("zone"),
-                                vpc_id=__info.get("vpc_id"),
-                                inner_ip=inner_ip,
-                                outer_ip=__info.get("outer_ip"),
-                                agent_id=agent_id,
-                                ext_info=__info,
-                                is_expired=False,  # 新机器标记正常
-                            )
-                        )
-                    except pymysql.err.IntegrityError as err:
-                        db_session.query(AssetServerModels).filter(
-                            AssetServerModels.account_id == account_id,
-                            AssetServerModels.region == region,
-                            AssetServerModels.inner_ip == inner_ip,
-                        ).delete(synchronize_session=False)
-                        logging.error(err)
-
-            db_session.commit()
+        result = bulk_upsert(model, [build_row(row) for row in rows if row], **kwargs)
     except Exception as err:
-        ret_state, ret_msg = False, f"{cloud_name}-{account_id}-server task写入数据库失败:{err}"
+        ret_msg = f"{cloud_name}-{account_id}-{task_name}写入数据库失败:{err}"
         logging.error(ret_msg)
-    return ret_state, ret_msg
+        return False, ret_msg
+    return True, f"{cloud_name}-{account_id}-{task_name}写入数据库完成, {result}"
+
+
+# 主机关联类型和主机数据中对应的字段
+SERVER_RELATION_FIELDS = (("vpc", "vpc_id"), ("vswitch", "vswitch_id"), ("security_group", "security_group_ids"))
+
+
+def _server_relations(row: Dict[str, Any]) -> Set[Tuple[str, str]]:
+    """从主机数据中提取 (关联类型, 关联ID)"""
+    ext_info = row.get("ext_info") or {}
+    relations = set()
+    for rel_type, field in SERVER_RELATION_FIELDS:
+        value = row.get(field) or ext_info.get(field)
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        relations.update((rel_type, str(v)) for v in values if v)
+    return relations
+
+
+def sync_server_relations(session, rows: List[Dict[str, Any]]) -> None:
+    """
+    按主机最新数据维护关联表，只删除失效的关联、新增缺少的关联
+    :param session: 与主机写入共用的会话
+    :param rows: 主机数据，需要 instance_id，以及 vpc_id 或 ext_info
+    """
+    desired = {row["instance_id"]: _server_relations(row) for row in rows if row.get("instance_id")}
+    if not desired:
+        return
+    chunk_size = int(settings.get("sync_prefetch_chunk_size", 1000))
+    existing: Dict[Tuple[str, str, str], int] = {}
+    for chunk in _chunked(list(desired), chunk_size):
+        records = session.query(
+            AssetServerRelationModels.id,
+            AssetServerRelationModels.server_instance_id,
+            AssetServerRelationModels.rel_type,
+            AssetServerRelationModels.rel_id,
+        ).filter(AssetServerRelationModels.server_instance_id.in_(chunk))
+        for rel_pk, instance_id, rel_type, rel_id in records:
+            existing[(instance_id, rel_type, rel_id)] = rel_pk
+
+    wanted = {(instance_id, rel_type, rel_id)
+              for instance_id, relations in desired.items() for rel_type, rel_id in relations}
+    stale_ids = [rel_pk for key, rel_pk in existing.items() if key not in wanted]
+    for chunk in _chunked(stale_ids, chunk_size):
+        session.query(AssetServerRelationModels).filter(AssetServerRelationModels.id.in_(chunk)).delete(
+            synchronize_session=False
+        )
+
+    now = datetime.datetime.now()
+    new_rows = [
+        dict(server_instance_id=instance_id, rel_type=rel_type, rel_id=rel_id, create_time=now, update_time=now)
+        for instance_id, rel_type, rel_id in wanted if (instance_id, rel_type, rel_id) not in existing
+    ]
+    for chunk in _chunked(new_rows, chunk_size):
+        stmt = mysql_insert(AssetServerRelationModels).values(list(chunk))
+        session.execute(stmt.on_duplicate_key_update(update_time=stmt.inserted.update_time))
+
+
+def rebuild_server_relations() -> None:
+    """
+    全量重建主机关联表，补齐手动录入和历史主机，清理已删除主机的关联
+    """
+    chunk_size = int(settings.get("sync_prefetch_chunk_size", 1000))
+    last_id = 0
+    while True:
+        with DBContext("w", None, True, **settings) as session:
+            servers = (
+                session.query(
+                    AssetServerModels.id,
+                    AssetServerModels.instance_id,
+                    AssetServerModels.vpc_id,
+                    AssetServerModels.ext_info,
+                )
+                .filter(AssetServerModels.id > last_id)
+                .order_by(AssetServerModels.id)
+                .limit(chunk_size)
+                .all()
+            )
+            if not servers:
+                break
+            sync_server_relations(
+                session, [dict(instance_id=s.instance_id, vpc_id=s.vpc_id, ext_info=s.ext_info) for s in servers]
+            )
+            session.commit()
+            last_id = servers[-1].id
+
+    with DBContext("w", None, True, **settings) as session:
+        session.query(AssetServerRelationModels).filter(
+            ~exists().where(AssetServerModels.instance_id == AssetServerRelationModels.server_instance_id)
+        ).delete(synchronize_session=False)
+        session.commit()
+
+
+def after_server_write(session, rows: List[Dict[str, Any]]) -> None:
+    """主机写入后维护关联表和搜索索引"""
+    sync_server_relations(session, rows)
+    index_rows(session, "server", rows)
+
+
+def server_task(cloud_name: str, account_id: str, rows: list) -> Tuple[bool, str]:
+    """
+    单条/少量主机写入，与批量写入一致
+    :param cloud_name:
+    :param account_id:
+    :param rows:
+    :return:
+    """
+    return server_task_batch(cloud_name=cloud_name, account_id=account_id, rows=rows)
 
 
-def server_task_batch(cloud_name: str, account_id: str, rows: list) -> Tuple[bool, str]:
+def server_task_batch(
+    cloud_name: str, account_id: str, rows: list, all_agent_info: Optional[dict] = None
+) -> Tuple[bool, str]:
     """批量更新服务器信息
     Args:
         cloud_name: 云服务商名称
         account_id: 账号ID
         rows: 服务器信息列表
+        all_agent_info: Agent信息，分页写入时由调用方预先获取，避免每页重复请求
     Returns:
         Tuple[bool, str]: (是否成功, 消息)
     """
-    ret_state, ret_msg = True, f"{cloud_name}-{account_id}-server task写入数据库完成"
-
-    try:
+    if all_agent_info is None:
         all_agent_info = get_all_agent_info()
-        with DBContext("w", None, True, **settings) as db_session:
-            # 获取所有实例ID
-            instance_ids = [row["instance_id"] for row in rows]
-
-            # 批量查询现有记录
-            existing_records = {
-                record.instance_id: record
-                for record in db_session.query(AssetServerModels)
-                .filter(AssetServerModels.instance_id.in_(instance_ids))
-                .all()
-            }
-
-            # 准备批量更新和插入的数据
-            to_update = []
-            to_insert = []
-
-            for info in rows:
-                instance_id = info["instance_id"]
-                region = info.get("region")
-                inner_ip = info.get("inner_ip")
-
-                if instance_id in existing_records:
-                    # 准备更新数据
-                    record = existing_records[instance_id]
-                    agent_info = all_agent_info.get(record.agent_id, {})
-
-                    update_data = {
-                        "id": record.id,  # 需要包含主键
-                        "cloud_name": cloud_name,
-                        "account_id": account_id,
-                        "name": info.get("name"),
-                        "region": region,
-                        "zone": info.get("zone"),
-                        "state": info.get("state"),
-                        "outer_ip": info.get("outer_ip"),
-                        "inner_ip": inner_ip,
-                        "vpc_id": info.get("vpc_id"),
-                        "is_expired": False,
-                        "ext_info": info,
-                    }
-                    if agent_info:
-                        update_data["agent_info"] = agent_info
-
-                    to_update.append(update_data)
-                else:
-                    # 准备插入数据
-                    to_insert.append(
-                        {
-                            "cloud_name": cloud_name,
-                            "account_id": account_id,
-                            "instance_id": instance_id,
-                            "state": info.get("state"),
-                            "name": info.get("name"),
-                            "region": region,
-                            "zone": info.get("zone"),
-                            "vpc_id": info.get("vpc_id"),
-                            "inner_ip": inner_ip,
-                            "outer_ip": info.get("outer_ip"),
-                            "agent_id": "0",
-                            "ext_info": info,
-                            "is_expired": False,
-                        }
-                    )
-
-            # 批量更新
-            if to_update:
-                try:
-                    db_session.bulk_update_mappings(AssetServerModels, to_update)
-                except Exception as err:
-                    logging.error(f"批量更新失败: {err}")
-
-            # 批量插入
-            if to_insert:
-                try:
-                    db_session.bulk_insert_mappings(AssetServerModels, to_insert)
-                except pymysql.err.IntegrityError as err:
-                    logging.error(f"批量插入失败: {err}")
-
-            db_session.commit()
-
-    except Exception as err:
-        ret_state, ret_msg = False, f"{cloud_name}-{account_id}-server task写入数据库失败:{err}"
-        logging.error(ret_msg)
 
-    return ret_state, ret_msg
+    def build_row(info: dict) -> dict:
+        return {
+            "cloud_name": cloud_name,
+            "account_id": account_id,
+            "instance_id": info["instance_id"],
+            "name": info.get("name"),
+            "region": info.get("region"),
+            "zone": info.get("zone"),
+            "state": info.get("state"),
+            "outer_ip": info.get("outer_ip"),
+            "inner_ip": info.get("inner_ip"),
+            "vpc_id": info.get("vpc_id"),
+            "is_expired": False,
+            "ext_info": info,
+            "agent_id": "0",
+            "agent_info": {},
+        }
+
+    def on_existing(row: dict, record: AssetServerModels):
+        # 更新时刷新agent_info，没有上报信息则保持原值
+        row["agent_info"] = all_agent_info.get(record.agent_id) or record.agent_info
+
+    return run_upsert_task(
+        "server task",
+        cloud_name,
+        account_id,
+        AssetServerModels,
+        rows,
+        build_row,
+        insert_only=("agent_id",),
+        prefetch_columns=("agent_id", "agent_info"),
+        on_existing=on_existing,
+        after_write=after_server_write,
+    )
 
 
 def mysql_task(cloud_name: str, account_id: str, rows: list) -> Tuple[bool, str]:
@@ -420,59 +633,28 @@ def mysql_task(cloud_name: str, account_id: str, rows: list) -> Tuple[bool, str]
     :param rows:
     :return:
     """
-    # 定义返回
-    ret_state, ret_msg = True, f"{cloud_name}-{account_id}-mysql task写入数据库完成"
-    try:
-        with DBContext("w", None, True, **settings) as db_session:
-            for __info in rows:
-                instance_id = __info["instance_id"]
-                exist_id = (
-                    db_session.query(AssetMySQLModels.id).filter(AssetMySQLModels.instance_id == instance_id).first()
-                )
-                if exist_id:
-                    try:
-                        db_session.query(AssetMySQLModels).filter(AssetMySQLModels.instance_id == instance_id).update(
-                            {
-                                AssetMySQLModels.cloud_name: cloud_name,
-                                AssetMySQLModels.account_id: account_id,
-                                AssetMySQLModels.region: __info.get("region"),
-                                AssetMySQLModels.zone: __info.get("zone"),
-                                AssetMySQLModels.is_expired: False,
-                                AssetMySQLModels.ext_info: __info,
-                                AssetMySQLModels.name: __info.get("name"),
-                                AssetMySQLModels.state: __info.get("state"),
-                                AssetMySQLModels.db_class: __info.get("db_class"),
-                                AssetMySQLModels.db_engine: __info.get("db_engine"),
-                                AssetMySQLModels.db_version: __info.get("db_version"),
-                                AssetMySQLModels.db_address: __info.get("db_address"),
-                            }
-                        )
-                    except Exception as err:
-                        logging.error(f"mysql sync task err {err}")
-                else:
-                    db_session.add(
-                        AssetMySQLModels(
-                            cloud_name=cloud_name,
-                            account_id=account_id,
-                            instance_id=instance_id,
-                            region=__info.get("region"),
-                            zone=__info.get("zone"),
-                            is_expired=False,
-                            ext_info=__info,
-                            # up base, down self models data
-                            name=__info.get("name"),
-                            state=__info.get("state"),
-                            db_class=__info.get("db_class"),
-                            db_engine=__info.get("db_engine"),
-                            db_version=__info.get("db_version"),
-                            db_address=__info.get("db_address"),
-                        )
-                    )
-            db_session.commit()
-    except Exception as err:
-        ret_state, ret_msg = False, f"{cloud_name}-{account_id}-mysql task写入数据库失败:{err}"
-        logging.error(ret_msg)
-    return ret_state, ret_msg
+
+    def build_row(row: dict) -> dict:
+        return dict(
+            cloud_name=cloud_name,
+            account_id=account_id,
+            instance_id=row["instance_id"],
+            region=row.get("region"),
+            zone=row.get("zone"),
+            is_expired=False,
+            ext_info=row,
+            # up base, down self models data
+            name=row.get("name"),
+            state=row.get("state"),
+            db_class=row.get("db_class"),
+            db_engine=row.get("db_engine"),
+            db_version=row.get("db_version"),
+            db_address=row.get("db_address"),
+        )
+
+    return run_upsert_task(
+        "mysql task", cloud_name, account_id, AssetMySQLModels, rows, build_row, after_write=search_indexer("mysql")
+    )
 
 
 def redis_task(cloud_name: str, account_id: str, rows: list) -> Tuple[bool, str]:
@@ -482,57 +664,29 @@ def redis_task(cloud_name: str, account_id: str, rows: list) -> Tuple[bool, str]
     :param rows:
     :return:
     """
-    # 定义返回
-    ret_state, ret_msg = True, f"{cloud_name}-{account_id}-redis task写入数据库完成"
-    try:
-        with DBContext("w", None, True, **settings) as db_session:
-            for __info in rows:
-                instance_id = __info["instance_id"]
-                exist_id = (
-                    db_session.query(AssetRedisModels.id).filter(AssetRedisModels.instance_id == instance_id).first()
-                )
-                if exist_id:
-                    db_session.query(AssetRedisModels).filter(AssetRedisModels.instance_id == instance_id).update(
-                        {
-                            AssetRedisModels.cloud_name: cloud_name,
-                            AssetRedisModels.account_id: account_id,
-                            AssetRedisModels.region: __info.get("region"),
-                            AssetRedisModels.zone: __info.get("zone"),
-                            AssetRedisModels.is_expired: False,
-                            AssetRedisModels.ext_info: __info,
-                            AssetRedisModels.name: __info.get("name"),
-                            AssetRedisModels.state: __info.get("state"),
-                            AssetRedisModels.instance_class: __info.get("instance_class"),
-                            AssetRedisModels.instance_arch: __info.get("instance_arch"),
-                            AssetRedisModels.instance_type: __info.get("instance_type"),
-                            AssetRedisModels.instance_version: __info.get("instance_version"),
-                            AssetRedisModels.instance_address: __info.get("instance_address"),
-                        }
-                    )
-                else:
-                    db_session.add(
-                        AssetRedisModels(
-                            cloud_name=cloud_name,
-                            account_id=account_id,
-                            instance_id=instance_id,
-                            region=__info.get("region"),
-                            zone=__info.get("zone"),
-                            is_expired=False,
-                            ext_info=__info,
-                            # up base, down self models data
-                            name=__info.get("name"),
-                            state=__info.get("state"),
-                            instance_class=__info.get("instance_class"),
-                            instance_arch=__info.get("instance_arch"),
-                            instance_type=__info.get("instance_type"),
-                            instance_version=__info.get("instance_version"),
-                            instance_address=__info.get("instance_address"),
-                        )
-                    )
-            db_session.commit()
-    except Exception as err:
-        ret_state, ret_msg = False, f"{cloud_name}-{account_id}-redis task写入数据库失败:{err}"
-    return ret_state, ret_msg
+
+    def build_row(row: dict) -> dict:
+        return dict(
+            cloud_name=cloud_name,
+            account_id=account_id,
+            instance_id=row["instance_id"],
+            region=row.get("region"),
+            zone=row.get("zone"),
+            is_expired=False,
+            ext_info=row,
+            # up base, down self models data
+            name=row.get("name"),
+            state=row.get("state"),
+            instance_class=row.get("instance_class"),
+            instance_arch=row.get("instance_arch"),
+            instance_type=row.get("instance_type"),
+            instance_version=row.get("instance_version"),
+            instance_address=row.get("instance_address"),
+        )
+
+    return run_upsert_task(
+        "redis task", cloud_name, account_id, AssetRedisModels, rows, build_row, after_write=search_indexer("redis")
+    )
 
 
 def lb_task(cloud_name: str, account_id: str, rows: list) -> Tuple[bool, str]:
@@ -543,55 +697,27 @@ def lb_task(cloud_name: str, account_id: str, rows: list) -> Tuple[bool, str]:
     :param rows:
     :return:
     """
-    # 定义返回
-    ret_state, ret_msg = True, f"{cloud_name}-{account_id}-lb task写入数据库完成"
-    try:
-        with DBContext("w", None, True, **settings) as db_session:
-            for row in rows:
-                instance_id = row.get("instance_id")
-                exist_id = (
-                    db_session.query(AssetLBModels.id)
-                    .filter(AssetLBModels.account_id == account_id, AssetLBModels.instance_id == instance_id)
-                    .first()
-                )
-                if not exist_id:
-                    db_session.add(
-                        AssetLBModels(
-                            name=row.get("name"),
-                            cloud_name=cloud_name,
-                            type=row.get("type"),
-                            account_id=account_id,
-                            instance_id=row.get("instance_id"),
-                            region=row.get("region"),
-                            zone=row.get("zone"),
-                            endpoint_type=row.get("endpoint_type"),
-                            lb_vip=row.get("lb_vip"),
-                            dns_name=row.get("dns_name"),
-                            is_expired=False,
-                            state=row.get("status"),
-                            ext_info=row.get("ext_info"),
-                        )
-                    )
-                else:
-                    db_session.query(AssetLBModels).filter(
-                        AssetLBModels.account_id == account_id, AssetLBModels.instance_id == instance_id
-                    ).update(
-                        {
-                            AssetLBModels.type: row.get("type"),
-                            AssetLBModels.region: row.get("region"),
-                            AssetLBModels.zone: row.get("zone"),
-                            AssetLBModels.lb_vip: row.get("lb_vip"),
-                            AssetLBModels.state: row.get("status"),
-                            AssetLBModels.is_expired: False,
-                            AssetLBModels.instance_id: row.get("instance_id"),
-                            AssetLBModels.endpoint_type: row.get("endpoint_type"),
-                            AssetLBModels.dns_name: row.get("dns_name"),
-                            AssetLBModels.ext_info: row.get("ext_info"),
-                        }
-                    )
-    except Exception as error:
-        ret_state, ret_msg = False, f"{cloud_name}-{account_id}-lb task写入数据库失败,错误行:{row},详细信息:{error}"
-    return ret_state, ret_msg
+
+    def build_row(row: dict) -> dict:
+        return dict(
+            name=row.get("name"),
+            cloud_name=cloud_name,
+            type=row.get("type"),
+            account_id=account_id,
+            instance_id=row.get("instance_id"),
+            region=row.get("region"),
+            zone=row.get("zone"),
+            endpoint_type=row.get("endpoint_type"),
+            lb_vip=row.get("lb_vip"),
+            dns_name=row.get("dns_name"),
+            is_expired=False,
+            state=row.get("status"),
+            ext_info=row.get("ext_info"),
+        )
+
+    return run_upsert_task(
+        "lb task", cloud_name, account_id, AssetLBModels, rows, build_row, after_write=search_indexer("lb")
+    )
 
 
 def vpc_task(cloud_name: str, account_id: str, rows: list) -> Tuple[bool, str]:
@@ -602,36 +728,23 @@ def vpc_task(cloud_name: str, account_id: str, rows: list) -> Tuple[bool, str]:
     :param rows:
     :return:
     """
-    # 定义返回
-    ret_state, ret_msg = True, f"{cloud_name}-{account_id}-vpc task写入数据库完成"
-    try:
-        with DBContext("w", None, True, **settings) as session:
-            for row in rows:
-                if not row:
-                    continue
-                instance_id = row.get("instance_id")
-                try:
-                    session.add(
-                        insert_or_update(
-                            AssetVPCModels,
-                            f"instance_id='{instance_id}'",
-                            cloud_name=cloud_name,
-                            account_id=account_id,
-                            instance_id=instance_id,
-                            vpc_name=row.get("vpc_name"),
-                            region=row.get("region"),
-                            cidr_block_v4=row.get("cidr_block_v4"),
-                            cidr_block_v6=row.get("cidr_block_v6"),
-                            vpc_router=row.get("vpc_router"),
-                            vpc_switch=row.get("vpc_switch"),
-                            is_default=row.get("is_default", False),
-                        )
-                    )
-                except Exception as err:
-                    logging.error(err)
-    except Exception as error:
-        ret_state, ret_msg = False, f"{cloud_name}-{account_id}-vpc task写入数据库失败,错误行:{row},详细信息:{error}"
-    return ret_state, ret_msg
+
+    def build_row(row: dict) -> dict:
+        return dict(
+            cloud_name=cloud_name,
+            account_id=account_id,
+            instance_id=row.get("instance_id"),
+            is_expired=False,
+            vpc_name=row.get("vpc_name"),
+            region=row.get("region"),
+            cidr_block_v4=row.get("cidr_block_v4"),
+            cidr_block_v6=row.get("cidr_block_v6"),
+            vpc_router=row.get("vpc_router"),
+            vpc_switch=row.get("vpc_switch"),
+            is_default=row.get("is_default", False),
+        )
+
+    return run_upsert_task("vpc task", cloud_name, account_id, AssetVPCModels, rows, build_row)
 
 
 def vswitch_task(cloud_name: str, account_id: str, rows: list) -> Tuple[bool, str]:
@@ -642,43 +755,26 @@ def vswitch_task(cloud_name: str, account_id: str, rows: list) -> Tuple[bool, st
     :param rows:
     :return:
     """
-    # 定义返回
-    ret_state, ret_msg = True, f"{cloud_name}-{account_id}-vswitch task写入数据库完成"
 
-    try:
-        with DBContext("w", None, True, **settings) as session:
-            for row in rows:
-                if not row:
-                    continue
-                instance_id = row.get("instance_id")
-                try:
-                    session.add(
-                        insert_or_update(
-                            AssetVSwitchModels,
-                            f"instance_id='{instance_id}'",
-                            cloud_name=cloud_name,
-                            account_id=account_id,
-                            instance_id=instance_id,
-                            vpc_id=row.get("vpc_id"),
-                            vpc_name=row.get("vpc_name", ""),
-                            region=row.get("region"),
-                            zone=row.get("zone"),
-                            name=row.get("name"),
-                            address_count=row.get("address_count"),
-                            cidr_block_v4=row.get("cidr_block_v4"),
-                            cidr_block_v6=row.get("cidr_block_v6"),
-                            route_id=row.get("route_id"),
-                            is_default=row.get("is_default", False),
-                        )
-                    )
-                except Exception as err:
-                    logging.error(err)
-    except Exception as error:
-        ret_state, ret_msg = (
-            False,
-            f"{cloud_name}-{account_id}-vswitch  task写入数据库失败,错误行:{row},详细信息:{error}",
+    def build_row(row: dict) -> dict:
+        return dict(
+            cloud_name=cloud_name,
+            account_id=account_id,
+            instance_id=row.get("instance_id"),
+            is_expired=False,
+            vpc_id=row.get("vpc_id"),
+            vpc_name=row.get("vpc_name", ""),
+            region=row.get("region"),
+            zone=row.get("zone"),
+            name=row.get("name"),
+            address_count=row.get("address_count"),
+            cidr_block_v4=row.get("cidr_block_v4"),
+            cidr_block_v6=row.get("cidr_block_v6"),
+            route_id=row.get("route_id"),
+            is_default=row.get("is_default", False),
         )
-    return ret_state, ret_msg
+
+    return run_upsert_task("vswitch task", cloud_name, account_id, AssetVSwitchModels, rows, build_row)
 
 
 def eip_task(cloud_name: str, account_id: str, rows: list) -> Tuple[bool, str]:
@@ -689,39 +785,25 @@ def eip_task(cloud_name: str, account_id: str, rows: list) -> Tuple[bool, str]:
     :param rows:
     :return:
     """
-    # 定义返回
-    ret_state, ret_msg = True, f"{cloud_name}-{account_id}-eip task写入数据库完成"
 
-    try:
-        with DBContext("w", None, True, **settings) as session:
-            for row in rows:
-                if not row:
-                    continue
-                instance_id = row.get("instance_id")
-                try:
-                    session.add(
-                        insert_or_update(
-                            AssetEIPModels,
-                            f"instance_id='{instance_id}'",
-                            cloud_name=cloud_name,
-                            account_id=account_id,
-                            instance_id=instance_id,
-                            name=row.get("name"),
-                            address=row.get("address"),
-                            region=row.get("region"),
-                            binding_instance_id=row.get("binding_instance_id"),
-                            binding_instance_type=row.get("binding_instance_type"),
-                            state=row.get("state"),
-                            bandwidth=row.get("bandwidth"),
-                            internet_charge_type=row.get("internet_charge_type"),
-                            charge_type=row.get("charge_type", False),
-                        )
-                    )
-                except Exception as err:
-                    logging.error(err)
-    except Exception as error:
-        ret_state, ret_msg = False, f"{cloud_name}-{account_id}-eip  task写入数据库失败,错误行:{row},详细信息:{error}"
-    return ret_state, ret_msg
+    def build_row(row: dict) -> dict:
+        return dict(
+            cloud_name=cloud_name,
+            account_id=account_id,
+            instance_id=row.get("instance_id"),
+            is_expired=False,
+            name=row.get("name"),
+            address=row.get("address"),
+            region=row.get("region"),
+            binding_instance_id=row.get("binding_instance_id"),
+            binding_instance_type=row.get("binding_instance_type"),
+            state=row.get("state"),
+            bandwidth=row.get("bandwidth"),
+            internet_charge_type=row.get("internet_charge_type"),
+            charge_type=row.get("charge_type", False),
+        )
+
+    return run_upsert_task("eip task", cloud_name, account_id, AssetEIPModels, rows, build_row)
 
 
 def security_group_task(cloud_name: str, account_id: str, rows: list) -> Tuple[bool, str]:
@@ -732,36 +814,22 @@ def security_group_task(cloud_name: str, account_id: str, rows: list) -> Tuple[b
     :param rows:
     :return:
     """
-    # 定义返回
-    ret_state, ret_msg = True, f"{cloud_name}-{account_id}-安全组task写入数据库完成"
 
-    try:
-        with DBContext("w", None, True, **settings) as session:
-            for row in rows:
-                if not row:
-                    continue
-                instance_id = row.get("instance_id")
-                try:
-                    session.add(
-                        insert_or_update(
-                            SecurityGroupModels,
-                            f"instance_id='{instance_id}'",
-                            cloud_name=cloud_name,
-                            account_id=account_id,
-                            instance_id=instance_id,
-                            region=row.get("region"),
-                            vpc_id=row.get("vpc_id"),
-                            security_group_name=row.get("security_group_name"),
-                            security_info=row.get("security_info"),
-                            ref_info=row.get("ref_info"),
-                            description=row.get("description"),
-                        )
-                    )
-                except Exception as err:
-                    logging.error(err)
-    except Exception as error:
-        ret_state, ret_msg = False, f"{cloud_name}-{account_id}-安全组task写入数据库失败,错误行:{row},详细信息:{error}"
-    return ret_state, ret_msg
+    def build_row(row: dict) -> dict:
+        return dict(
+            cloud_name=cloud_name,
+            account_id=account_id,
+            instance_id=row.get("instance_id"),
+            is_expired=False,
+            region=row.get("region"),
+            vpc_id=row.get("vpc_id"),
+            security_group_name=row.get("security_group_name"),
+            security_info=row.get("security_info"),
+            ref_info=row.get("ref_info"),
+            description=row.get("description"),
+        )
+
+    return run_upsert_task("安全组task", cloud_name, account_id, SecurityGroupModels, rows, build_row)
 
 
 def image_task(cloud_name: str, account_id: str, rows: list) -> Tuple[bool, str]:
@@ -772,42 +840,25 @@ def image_task(cloud_name: str, account_id: str, rows: list) -> Tuple[bool, str]
     :param rows:
     :return:
     """
-    # 定义返回
-    ret_state, ret_msg = True, f"{cloud_name}-{account_id}-系统镜像task写入数据库完成"
 
-    try:
-        with DBContext("w", None, True, **settings) as session:
-            for row in rows:
-                if not row:
-                    continue
-                instance_id = row.get("instance_id")
-                try:
-                    session.add(
-                        insert_or_update(
-                            AssetImagesModels,
-                            f"instance_id='{instance_id}'",
-                            cloud_name=cloud_name,
-                            account_id=account_id,
-                            instance_id=instance_id,
-                            region=row.get("region"),
-                            name=row.get("name"),
-                            image_type=row.get("image_type"),
-                            image_size=row.get("image_size"),
-                            os_platform=row.get("os_platform"),
-                            os_name=row.get("os_name"),
-                            state=row.get("state"),
-                            arch=row.get("arch"),
-                            description=row.get("description"),
-                        )
-                    )
-                except Exception as err:
-                    logging.error(err)
-    except Exception as error:
-        ret_state, ret_msg = (
-            False,
-            f"{cloud_name}-{account_id}-系统镜像task写入数据库失败,错误行:{row},详细信息:{error}",
+    def build_row(row: dict) -> dict:
+        return dict(
+            cloud_name=cloud_name,
+            account_id=account_id,
+            instance_id=row.get("instance_id"),
+            is_expired=False,
+            region=row.get("region"),
+            name=row.get("name"),
+            image_type=row.get("image_type"),
+            image_size=row.get("image_size"),
+            os_platform=row.get("os_platform"),
+            os_name=row.get("os_name"),
+            state=row.get("state"),
+            arch=row.get("arch"),
+            description=row.get("description"),
         )
-    return ret_state, ret_msg
+
+    return run_upsert_task("系统镜像task", cloud_name, account_id, AssetImagesModels, rows, build_row)
 
 
 def cloud_event_task(cloud_name: str, account_id: str, rows: list) -> Tuple[bool, str]:
@@ -864,45 +915,32 @@ def nat_task(cloud_name: str, account_id: str, rows: list) -> Tuple[bool, str]:
     :param rows:
     :return:
     """
-    # 定义返回
-    ret_state, ret_msg = True, f"{cloud_name}-{account_id}-NAT网关task写入数据库完成"
 
-    try:
-        with DBContext("w", None, True, **settings) as session:
-            for row in rows:
-                if not row:
-                    continue
-                instance_id = row.get("instance_id")
-                try:
-                    session.add(
-                        insert_or_update(
-                            AssetNatModels,
-                            f"instance_id='{instance_id}'",
-                            cloud_name=cloud_name,
-                            account_id=account_id,
-                            instance_id=instance_id,
-                            region=row.get("region"),
-                            name=row.get("name"),
-                            network_type=row.get("network_type"),
-                            network_interface_id=row.get("network_interface_id"),
-                            charge_type=row.get("charge_type"),
-                            outer_ip=row.get("outer_ip"),
-                            zone=row.get("zone"),
-                            description=row.get("description"),
-                            spec=row.get("spec"),
-                            subnet_id=row.get("subnet_id"),
-                            project_name=row.get("project_name"),
-                            vpc_id=row.get("vpc_id"),
-                            state=row.get("state"),
-                            update_time=datetime.datetime.now(),
-                            ext_info=row.get("ext_info"),
-                        )
-                    )
-                except Exception as err:
-                    logging.error(err)
-    except Exception as error:
-        ret_state, ret_msg = False, f"{cloud_name}-{account_id}-NAT网关task写入数据库失败,错误行:{row},详细信息:{error}"
-    return ret_state, ret_msg
+    def build_row(row: dict) -> dict:
+        return dict(
+            cloud_name=cloud_name,
+            account_id=account_id,
+            instance_id=row.get("instance_id"),
+            is_expired=False,
+            region=row.get("region"),
+            name=row.get("name"),
+            network_type=row.get("network_type"),
+            network_interface_id=row.get("network_interface_id"),
+            charge_type=row.get("charge_type"),
+            outer_ip=row.get("outer_ip"),
+            zone=row.get("zone"),
+            description=row.get("description"),
+            spec=row.get("spec"),
+            subnet_id=row.get("subnet_id"),
+            project_name=row.get("project_name"),
+            vpc_id=row.get("vpc_id"),
+            state=row.get("state"),
+            ext_info=row.get("ext_info"),
+        )
+
+    return run_upsert_task(
+        "NAT网关task", cloud_name, account_id, AssetNatModels, rows, build_row, after_write=search_indexer("nat")
+    )
 
 
 def cluster_task(cloud_name: str, account_id: str, rows: list) -> Tuple[bool, str]:
@@ -913,45 +951,30 @@ def cluster_task(cloud_name: str, account_id: str, rows: list) -> Tuple[bool, st
     :param rows:
     :return:
     """
-    # 定义返回
-    ret_state, ret_msg = True, f"{cloud_name}-{account_id}-集群task写入数据库完成"
 
-    try:
-        with DBContext("w", None, True, **settings) as session:
-            for row in rows:
-                if not row:
-                    continue
-                instance_id = row.get("instance_id")
-                try:
-                    session.add(
-                        insert_or_update(
-                            AssetClusterModels,
-                            f"instance_id='{instance_id}'",
-                            cloud_name=cloud_name,
-                            account_id=account_id,
-                            instance_id=instance_id,
-                            region=row.get("region"),
-                            name=row.get("name"),
-                            inner_ip=row.get("inner_ip"),
-                            outer_ip=row.get("outer_ip"),
-                            zone=row.get("zone"),
-                            description=row.get("description"),
-                            version=row.get("version"),
-                            vpc_id=row.get("vpc_id"),
-                            total_node=row.get("total_node"),
-                            total_running_node=row.get("total_running_node"),
-                            tags=row.get("tags"),
-                            state=row.get("state"),
-                            update_time=datetime.datetime.now(),
-                            ext_info=row.get("ext_info"),
-                            cluster_type=row.get("cluster_type"),
-                        )
-                    )
-                except Exception as err:
-                    logging.error(err)
-    except Exception as error:
-        ret_state, ret_msg = False, f"{cloud_name}-{account_id}-集群task写入数据库失败,错误行:{row},详细信息:{error}"
-    return ret_state, ret_msg
+    def build_row(row: dict) -> dict:
+        return dict(
+            cloud_name=cloud_name,
+            account_id=account_id,
+            instance_id=row.get("instance_id"),
+            is_expired=False,
+            region=row.get("region"),
+            name=row.get("name"),
+            inner_ip=row.get("inner_ip"),
+            outer_ip=row.get("outer_ip"),
+            zone=row.get("zone"),
+            description=row.get("description"),
+            version=row.get("version"),
+            vpc_id=row.get("vpc_id"),
+            total_node=row.get("total_node"),
+            total_running_node=row.get("total_running_node"),
+            tags=row.get("tags"),
+            state=row.get("state"),
+            ext_info=row.get("ext_info"),
+            cluster_type=row.get("cluster_type"),
+        )
+
+    return run_upsert_task("集群task", cloud_name, account_id, AssetClusterModels, rows, build_row)
 
 
 def mongodb_task(cloud_name: str, account_id: str, rows: list) -> Tuple[bool, str]:
@@ -962,47 +985,29 @@ def mongodb_task(cloud_name: str, account_id: str, rows: list) -> Tuple[bool, st
     :param rows:
     :return:
     """
-    # 定义返回
-    ret_state, ret_msg = True, f"{cloud_name}-{account_id}-MongoDB task写入数据库完成"
 
-    try:
-        with DBContext("w", None, True, **settings) as session:
-            for row in rows:
-                if not row:
-                    continue
-                instance_id = row.get("instance_id")
-                try:
-                    session.add(
-                        insert_or_update(
-                            AssetMongoModels,
-                            f"instance_id='{instance_id}'",
-                            cloud_name=cloud_name,
-                            account_id=account_id,
-                            instance_id=instance_id,
-                            region=row.get("region"),
-                            name=row.get("name"),
-                            db_class=row.get("db_class"),
-                            db_version=row.get("db_version"),
-                            db_address=row.get("db_address"),
-                            subnet_id=row.get("subnet_id"),
-                            vpc_id=row.get("vpc_id"),
-                            project_name=row.get("project_name"),
-                            state=row.get("state"),
-                            tags=row.get("tags"),
-                            zone=row.get("zone"),
-                            update_time=datetime.datetime.now(),
-                            storage_type=row.get("storage_type"),
-                            ext_info=row.get("ext_info"),
-                        )
-                    )
-                except Exception as err:
-                    logging.error(err)
-    except Exception as error:
-        ret_state, ret_msg = (
-            False,
-            f"{cloud_name}-{account_id}-MongoDB task写入数据库失败,错误行:{row},详细信息:{error}",
+    def build_row(row: dict) -> dict:
+        return dict(
+            cloud_name=cloud_name,
+            account_id=account_id,
+            instance_id=row.get("instance_id"),
+            is_expired=False,
+            region=row.get("region"),
+            name=row.get("name"),
+            db_class=row.get("db_class"),
+            db_version=row.get("db_version"),
+            db_address=row.get("db_address"),
+            subnet_id=row.get("subnet_id"),
+            vpc_id=row.get("vpc_id"),
+            project_name=row.get("project_name"),
+            state=row.get("state"),
+            tags=row.get("tags"),
+            zone=row.get("zone"),
+            storage_type=row.get("storage_type"),
+            ext_info=row.get("ext_info"),
         )
-    return ret_state, ret_msg
+
+    return run_upsert_task("MongoDB task", cloud_name, account_id, AssetMongoModels, rows, build_row)
 
 
 if __name__ == "__main__":
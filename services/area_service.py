@@ -3,12 +3,16 @@
 # @Date: 2024/9/19
 # @Description: CBB区服接口
 import base64
+import heapq
+import itertools
+import logging
+import threading
 import time
 from functools import wraps
-from typing import Any, Dict, List, Optional
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 from pydantic import BaseModel, ValidationError, field_validator, model_validator
+from websdk2.configs import configs
 from websdk2.db_context import DBContextV2 as DBContext
 from websdk2.model_utils import model_to_dict
 
@@ -16,9 +20,14 @@ from libs.api_gateway.cbb.area import AreaAPI
 from libs.api_gateway.cbb.big_area import BigAreaAPI
 from libs.api_gateway.cbb.sign import Signer
 from libs.mycrypt import mc
+from libs.thread_pool import global_executors
 from models import EnvType
 from models.cbb_area import CBBBigAreaModels
 from services.env_service import get_env_by_id, get_all_env_list
+from settings import settings
+
+if configs.can_import:
+    configs.import_dict(**settings)
 
 # todo 存入数据库
 GameBizMapping = {
@@ -377,10 +386,135 @@ def get_big_area_detail(**params):
     return dict(code=0, msg="获取成功", data=big_area_list)
 
 
+class _EnvBigAreas:
+    """单个环境的大区列表，按名称排序，search_keys 与 items 一一对应"""
+
+    __slots__ = ("items", "sort_keys", "search_keys", "fetched_at")
+
+    def __init__(self, big_areas: List[dict]):
+        self.items = sorted(big_areas, key=lambda x: (x.get("name") or "").lower())
+        self.sort_keys = [(item.get("name") or "").lower() for item in self.items]
+        # 名称和大区编号合并成一个小写串，搜索时只做一次子串判断
+        self.search_keys = [
+            f"{sort_key}\n{(item.get('big_area') or '').lower()}" for sort_key, item in zip(self.sort_keys, self.items)
+        ]
+        self.fetched_at = time.time()
+
+
+class BigAreaCache:
+    """
+    GMT大区列表缓存，按 (游戏, 环境) 保存
+    过期后先返回旧数据并在后台刷新，超过最大容忍时间才同步拉取
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[str, int], _EnvBigAreas] = {}
+        self._secrets: Dict[str, str] = {}
+
+    @property
+    def _ttl(self) -> int:
+        return int(configs.get("cbb_big_area_cache_ttl", 60))
+
+    @property
+    def _max_stale(self) -> int:
+        return int(configs.get("cbb_big_area_max_stale", 600))
+
+    def _decrypt(self, cipher: str) -> str:
+        """环境密钥解密结果按密文缓存，密钥修改后密文变化自然失效"""
+        secret = self._secrets.get(cipher)
+        if secret is None:
+            secret = self._secrets[cipher] = mc.my_decrypt(cipher)
+        return secret
+
+    def fetch_env(self, game_appid: str, env: dict, tag_filter=None, big_area: str = None) -> _EnvBigAreas:
+        """从网关拉取一个环境的全部大区，不写缓存"""
+        signer = Signer(secret=self._decrypt(env["app_secret"]), app_id=env["app_id"])
+        big_area_api = BigAreaAPI(signer, env["idip"], game_appid)
+        big_areas = big_area_api.get_big_areas(
+            tag_filter=tag_filter, big_area=big_area, page_no=1,
+            page_size=int(configs.get("cbb_big_area_fetch_size", 10000)),
+        )
+        big_area_list = big_areas.get("body", {}).get("big_areas", [])
+        for area in big_area_list:
+            area["env_id"] = env["id"]
+        return _EnvBigAreas(big_area_list)
+
+    def _fetch(self, game_appid: str, env: dict) -> _EnvBigAreas:
+        entry = self.fetch_env(game_appid, env)
+        with self._lock:
+            self._entries[(game_appid, env["id"])] = entry
+        return entry
+
+    def _refresh(self, game_appid: str, env: dict):
+        try:
+            self._fetch(game_appid, env)
+        except Exception as err:
+            logging.error(f"刷新大区列表失败 {game_appid} {env.get('env_name')}: {err}")
+
+    def get(self, game_appid: str, envs: List[dict], tag_filter=None, big_area: str = None) -> List[_EnvBigAreas]:
+        """
+        获取所有环境的大区列表
+        缺失或过旧的环境并行同步拉取，拉取失败的环境跳过；稍旧的环境直接返回并提交后台刷新
+        按标签或大区编号过滤由网关完成，不走缓存
+        """
+        now = time.time()
+        pool = global_executors.get_pool("cbb", 10)
+        if tag_filter is not None or big_area is not None:
+            return self._collect(game_appid, [
+                (env, pool.submit(self.fetch_env, game_appid, env, tag_filter, big_area)) for env in envs
+            ])
+
+        result, pending = [], []
+        for env in envs:
+            with self._lock:
+                entry = self._entries.get((game_appid, env["id"]))
+            age = now - entry.fetched_at if entry else None
+            if entry is None or age > self._max_stale:
+                pending.append((env, pool.submit(self._fetch, game_appid, env)))
+                continue
+            if age > self._ttl:
+                pool.submit_unique(f"big_area:{game_appid}:{env['id']}", self._refresh, game_appid, env)
+            result.append(entry)
+        return result + self._collect(game_appid, pending)
+
+    @staticmethod
+    def _collect(game_appid: str, pending: list) -> List[_EnvBigAreas]:
+        result = []
+        for env, future in pending:
+            try:
+                result.append(future.result())
+            except Exception as err:
+                logging.error(f"获取大区列表失败 {game_appid} {env.get('env_name')}: {err}")
+        return result
+
+    def invalidate(self, env_id: int):
+        """大区增删改后清除该环境的缓存"""
+        with self._lock:
+            for key in [k for k in self._entries if str(k[1]) == str(env_id)]:
+                self._entries.pop(key, None)
+
+
+big_area_cache = BigAreaCache()
+
+
+def _iter_env_big_areas(entry: _EnvBigAreas, search_value: Optional[str]) -> Iterator[Tuple[str, dict]]:
+    for sort_key, search_key, item in zip(entry.sort_keys, entry.search_keys, entry.items):
+        if search_value is None or search_value in search_key:
+            yield sort_key, item
+
+
+def _count_env_big_areas(entry: _EnvBigAreas, search_value: Optional[str]) -> int:
+    if search_value is None:
+        return len(entry.items)
+    return sum(1 for search_key in entry.search_keys if search_value in search_key)
+
+
 @handle_api_exceptions
 def get_big_area_list_for_gmt(**params):
     """
     获取大区列表.
+    各环境的大区列表已按名称排序，多路归并后只取当前页，不对全量数据排序
     :param params.
     :return: 大区列表.
     """
@@ -394,65 +528,32 @@ def get_big_area_list_for_gmt(**params):
         return dict(code=-1, msg="业务id不能为空", data=[])
     game_appid = get_game_appid(biz_id)
     envs = get_all_env_list()
-    total_big_area_list = []
-    total_big_area_count = 0
-    cbb_big_area_map = {}
-    with DBContext("r") as session:
-        cbb_big_area_objs = session.query(CBBBigAreaModels).filter(CBBBigAreaModels.biz_id == biz_id).all()
-        for cbb_big_area in cbb_big_area_objs:
-            key = f"{cbb_big_area.big_area}:{cbb_big_area.env_id}"
-            cbb_big_area_map[key] = model_to_dict(cbb_big_area)
 
-    # 使用线程池并行获取大区列表
-    def fetch_big_areas(env):
-        try:
-            signer = Signer(secret=mc.my_decrypt(env["app_secret"]), app_id=env["app_id"])
-            big_area_api = BigAreaAPI(signer, env["idip"], game_appid)
-            big_areas = big_area_api.get_big_areas(
-                tag_filter=tag_filter, big_area=big_area, page_no=page, page_size=limit
-            )
-            big_areas_body = big_areas.get("body", {})
-            big_area_list = big_areas_body.get("big_areas", [])
-            for area in big_area_list:
-                area["env_id"] = env["id"]
-            big_area_count = big_areas_body.get("big_area_count", 0)
-            return big_area_list, big_area_count
-        except Exception as e:
-            return [], 0
+    entries = big_area_cache.get(game_appid, envs, tag_filter=tag_filter, big_area=big_area)
 
-    with ThreadPoolExecutor(max_workers=min(10, len(envs))) as executor:
-        future_to_env = {executor.submit(fetch_big_areas, env): env for env in envs}
-        for future in as_completed(future_to_env):
-            big_area_list, big_area_count = future.result()
-            total_big_area_list.extend(big_area_list)
-            total_big_area_count += big_area_count
+    search_value = searchValue.lower() if searchValue is not None else None
+    total_big_area_count = sum(_count_env_big_areas(entry, search_value) for entry in entries)
+    merged = heapq.merge(*[_iter_env_big_areas(entry, search_value) for entry in entries], key=lambda x: x[0])
+    start_index = (page - 1) * limit
+    page_items = [item for _, item in itertools.islice(merged, start_index, start_index + limit)]
 
-    for big_area_item in total_big_area_list:
+    cbb_big_area_map = {}
+    if page_items:
+        with DBContext("r") as session:
+            cbb_big_area_objs = session.query(CBBBigAreaModels).filter(CBBBigAreaModels.biz_id == biz_id).all()
+            for cbb_big_area in cbb_big_area_objs:
+                key = f"{cbb_big_area.big_area}:{cbb_big_area.env_id}"
+                cbb_big_area_map[key] = model_to_dict(cbb_big_area)
+
+    # 复制一份再补充idip，不修改缓存中的数据
+    paginated_list = []
+    for big_area_item in page_items:
+        big_area_item = dict(big_area_item)
         big_area_id = big_area_item.get("big_area")
         env_id = big_area_item.get("env_id", "")
         if big_area_id and env_id:
-            key = f"{big_area_id}:{env_id}"
-            big_area_item.update(
-                {
-                    "idip": cbb_big_area_map.get(key, {}).get("idip"),
-                }
-            )
-    if searchValue is not None:
-        filtered_list = []
-        for item in total_big_area_list:
-            # 在名称和大区编号中搜索
-            if (
-                searchValue.lower() in item.get("name", "").lower()
-                or searchValue.lower() in item.get("big_area", "").lower()
-            ):
-                filtered_list.append(item)
-        total_big_area_list = filtered_list
-        total_big_area_count = len(filtered_list)
-    total_big_area_list.sort(key=lambda x: x.get("name", "").lower())
-    # 手动实现分页逻辑
-    start_index = (page - 1) * limit
-    end_index = start_index + limit
-    paginated_list = total_big_area_list[start_index:end_index] if start_index < len(total_big_area_list) else []
+            big_area_item["idip"] = cbb_big_area_map.get(f"{big_area_id}:{env_id}", {}).get("idip")
+        paginated_list.append(big_area_item)
     return dict(code=0, msg="获取成功", data=paginated_list, count=total_big_area_count)
 
 
@@ -568,6 +669,8 @@ def create_or_update_big_area(**data):
             )
     except Exception as e:
         return dict(code=-1, msg=str(e), data=[])
+    finally:
+        big_area_cache.invalidate(env_id)
     return dict(code=0, msg="操作成功", data=result)
 
 
@@ -597,6 +700,7 @@ def delete_big_area(big_area: str, env_id: int, biz_id: str):
         return dict(code=-1, msg="请先删除大区下的所有区服", data=[])
     # TODO: 删除大区配置
     result = big_area_api.delete_big_area(big_area)
+    big_area_cache.invalidate(env_id)
     return dict(code=0, msg="操作成功", data=result)
 
 
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Date    : 2026/10/16
+Desc    : 资产变更查询
+"""
+
+import datetime
+
+from libs.asset_snapshot import AssetSnapshotDiff, get_model_columns_map
+from libs.utils import human_date
+from models import asset_mapping
+
+
+def get_asset_change_list(**params) -> dict:
+    """
+    分页查询两天快照之间的资源变更
+    asset_type: 资产类型，默认server
+    old_day / new_day: 对比的两天，默认昨天和今天
+    action: add/update/delete，不传返回全部
+    cursor: 上一页返回的 next_cursor
+    """
+    asset_type = params.get("asset_type", "server")
+    if asset_type not in asset_mapping:
+        return dict(code=-1, msg=f"不支持的资产类型: {asset_type}")
+    action = params.get("action")
+    if action and action not in AssetSnapshotDiff.ACTION_NAMES:
+        return dict(code=-1, msg=f"不支持的变更类型: {action}")
+    new_day = params.get("new_day") or human_date()
+    old_day = params.get("old_day") or (datetime.datetime.now() - datetime.timedelta(days=1)).strftime("%Y-%m-%d")
+    try:
+        for day in (old_day, new_day):
+            datetime.datetime.strptime(day, "%Y-%m-%d")
+    except ValueError:
+        return dict(code=-1, msg="日期格式错误，例如：2023-11-01")
+    page_size = min(int(params.get("page_size", 100)), 1000)
+
+    columns_map = get_model_columns_map(asset_mapping[asset_type])
+    diff = AssetSnapshotDiff(asset_type, old_day=old_day, new_day=new_day, columns_map=columns_map)
+    data, next_cursor = [], None
+    for item in diff.iter_changes(start_after=params.get("cursor", "")):
+        if action and item["action"] != action:
+            continue
+        data.append(item)
+        if len(data) >= page_size:
+            next_cursor = item["instance_id"]
+            break
+    return dict(msg="获取成功", code=0, data=data, next_cursor=next_cursor)
@@ -11,6 +11,7 @@ from sqlalchemy import or_
 from typing import *
 from shortuuid import uuid
 from websdk2.db_context import DBContextV2 as DBContext
+from libs.search_index import index_rows
 from models.asset import AssetMySQLModels as mysqlModel
 from websdk2.sqlalchemy_pagination import paginate
 from websdk2.model_utils import CommonOptView
@@ -120,6 +121,8 @@ def add_mysql(data: dict) -> dict:
                                               db_engine=data.get('db_engine'), db_class=data.get('db_class'),
                                               db_version=data.get('db_version'), db_address=db_address,
                                               ext_info=ext_info, is_expired=False)))
+                # 手动录入的资产同步维护搜索索引
+                index_rows(session, "mysql", [dict(instance_id=instance_id, name=name, db_address=db_address)])
             except Exception as err:
                 print(err)
                 return dict(code=-9, msg=f'添加失败 {err}')
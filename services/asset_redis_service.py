@@ -11,6 +11,7 @@ from sqlalchemy import or_
 from typing import *
 from shortuuid import uuid
 from websdk2.db_context import DBContextV2 as DBContext
+from libs.search_index import index_rows
 from models.asset import AssetRedisModels as redisModel
 from websdk2.sqlalchemy_pagination import paginate
 from websdk2.model_utils import CommonOptView
@@ -125,6 +126,9 @@ def add_redis(data: dict) -> dict:
                                               instance_version=data.get('instance_version'),
                                               instance_address=instance_address,
                                               ext_info=ext_info, is_expired=False)))
+                # 手动录入的资产同步维护搜索索引
+                index_rows(session, "redis", [dict(instance_id=instance_id, name=name,
+                                                   instance_address=instance_address)])
             except Exception as err:
                 print(err)
                 return dict(code=-9, msg=f'添加失败 {err}')
@@ -15,11 +15,12 @@ from sqlalchemy import or_, func, insert
 from sqlalchemy.dialects.mysql import insert as mysql_insert
 from typing import *
 from websdk2.db_context import DBContextV2 as DBContext
-from models.asset import AssetServerModels, AgentBindStatus
+from libs.search_index import index_rows
+from models.asset import AssetServerModels, AssetServerRelationModels, AgentBindStatus
 from models.tree import TreeAssetModels
 from models.agent import AgentModels
 from websdk2.sqlalchemy_pagination import paginate
-from websdk2.model_utils import CommonOptView, insert_or_update, queryset_to_list
+from websdk2.model_utils import CommonOptView, insert_or_update
 
 from services import CommonResponse
 
@@ -84,20 +85,32 @@ def get_server_list(**params) -> dict:
     return dict(code=0, msg='获取成功', data=data, count=page.total)
 
 
-def _get_server_by_sg(val: str = None):
-    """模糊查询"""
-    if not val:  return True
-    return or_(
-        AssetServerModels.ext_info['security_group_ids'].like(f'%{val}%'),
-    )
+def join_server_relation(query, rel_type: str, rel_ids: List[str]):
+    """
+    通过主机关联表按安全组/VPC/虚拟子网过滤主机，走关联表索引而不是扫描主机表
+    :param query: 主机查询
+    :param rel_type: security_group/vpc/vswitch
+    :param rel_ids: 关联资源实例ID
+    """
+    return query.join(
+        AssetServerRelationModels, AssetServerRelationModels.server_instance_id == AssetServerModels.instance_id
+    ).filter(AssetServerRelationModels.rel_type == rel_type, AssetServerRelationModels.rel_id.in_(rel_ids))
 
 
-def get_server_for_security_group(sg_id: str) -> dict:
+def get_servers_by_relation(rel_type: str, rel_id: str, **params) -> dict:
+    """根据安全组/VPC/虚拟子网反查主机"""
+    if not rel_id:
+        return dict(code=-1, msg='关联资源ID不能为空')
+    if 'page_size' not in params: params['page_size'] = 300
     with DBContext('r') as session:
-        models: List[AssetServerModels] = session.query(AssetServerModels).filter(_get_server_by_sg(sg_id)).all()
-        queryset = queryset_to_list(models)
-        data = _models_to_list(queryset)
-    return dict(code=0, msg='获取成功', data=data, count=len(queryset))
+        query = join_server_relation(session.query(AssetServerModels), rel_type, [rel_id]).distinct()
+        page = paginate(query, **params)
+        data = _models_to_list(page.items)
+    return dict(code=0, msg='获取成功', data=data, count=page.total)
+
+
+def get_server_for_security_group(sg_id: str, **params) -> dict:
+    return get_servers_by_relation('security_group', sg_id, **params)
 
 
 def mark_server(data: dict) -> dict:
@@ -203,6 +216,9 @@ def upsert_server(data: dict) -> Optional[dict[str, Union[int, str]]]:
                 )
 
                 session.execute(update_stmt)
+                # 手动录入的资产同步维护搜索索引
+                index_rows(session, "server", [dict(instance_id=instance_id, name=name, inner_ip=inner_ip,
+                                                    outer_ip=outer_ip)])
 
             except Exception as err:
                 return dict(code=-1, msg=f'upsert 操作失败 {err}')
@@ -253,6 +269,8 @@ def add_server(server: dict):
                                                      region=server.get('region'), zone=server.get('zone'),
                                                      inner_ip=inner_ip, outer_ip=server.get('outer_ip'),
                                                      ext_info=ext_info, is_expired=False, ownership=ownership)))
+                index_rows(session, "server", [dict(instance_id=instance_id, name=name, inner_ip=inner_ip,
+                                                    outer_ip=server.get('outer_ip'))])
             except Exception as err:
                 print(err)
                 return dict(code=-1, msg=f'批量添加失败 {err}')
@@ -305,6 +323,9 @@ def add_server_batch(data: dict):
                                                  agent_bind_status=server.get('agent_bind_status', 0),
                                                  ext_info=ext_info, is_expired=False  # 新机器标记正常))
                                                  ))
+                    index_rows(session, "server", [dict(instance_id=instance_id, name=name,
+                                                        inner_ip=server.get('inner_ip'),
+                                                        outer_ip=server.get('outer_ip'))])
                 except Exception as err:
                     print(err)
         except Exception as err:
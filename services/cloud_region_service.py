@@ -18,7 +18,7 @@ from models.cloud_region import CloudRegionModels, CloudRegionAssetModels
 from models.tree import TreeAssetModels
 from models.business import BizModels
 from models.asset import AssetServerModels
-from services.asset_server_service import _models_to_list
+from services.asset_server_service import _models_to_list, join_server_relation
 
 
 opt_obj = CommonOptView(CloudRegionModels)
@@ -89,14 +89,9 @@ def update_server_agent_id_by_cloud_region_rules(asset_group_rules: List[List[Di
 
     try:
         with DBContext('w', None, True) as session:
-            # 使用 JSON 字段中的 vpc_id 进行过滤
-            # 兼容5.7版本mysql, 不适用IN查询
-            query = session.query(AssetServerModels).filter()
-            filters = []
-            if vpc_values:
-                filters.append(AssetServerModels.vpc_id.in_(vpc_values))
-
-            servers = query.filter(*filters) if filters else query
+            # 通过主机关联表按VPC过滤，走索引
+            query = session.query(AssetServerModels)
+            servers = join_server_relation(query, "vpc", vpc_values)
             cnt = 0
             for server in servers:
                 # 跳过已同步的AgentID
@@ -311,14 +306,10 @@ def preview_cloud_region_v2(**params) -> dict:
         vpc_values = [query["query_value"][-1] for sublist in asset_group_rules for query in sublist
                       if query["query_name"] == "vpc" and query['status'] == 1]
         try:
-            # 使用JSON字段中的vpc_id进行过滤
             query = session.query(AssetServerModels).filter(_get_server_value(value)).filter_by(**filter_map)
-            # 兼容5.7版本mysql, 不适用IN查询
-            filters = []
             if vpc_values:
-                filters.append(AssetServerModels.vpc_id.in_(vpc_values))
-
-            query = query.filter(*filters) if filters else query
+                # 通过主机关联表按VPC过滤，走索引
+                query = join_server_relation(query, "vpc", vpc_values)
             total = query.count()
             page = paginate(query, order_by=None, **params)
             result = _models_to_list(page.items)
@@ -430,14 +421,10 @@ def get_servers_by_cloud_region_id(region_id: str) -> List[Optional[AssetServerM
         vpc_values = [query["query_value"][-1] for sublist in asset_group_rules for query in sublist
                       if query["query_name"] == "vpc" and query['status'] == 1]
         try:
-            # 使用JSON字段中的vpc_id进行过滤
             query = session.query(AssetServerModels)
-            # 兼容5.7版本mysql, 不适用IN查询
-            filters = []
             if vpc_values:
-                filters.append(AssetServerModels.vpc_id.in_(vpc_values))
-
-            query = query.filter(*filters) if filters else query
+                # 通过主机关联表按VPC过滤，走索引
+                query = join_server_relation(query, "vpc", vpc_values)
             servers = query.all()
             return servers
         except Exception as e:
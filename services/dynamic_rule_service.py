@@ -17,6 +17,7 @@ from models.business import DynamicRulesModels, BizModels
 from websdk2.model_utils import GetInsertOrUpdateObj
 from models import TreeAssetModels
 from models.tree import TreeModels
+from libs.tree_cache import invalidate_tree_cache
 from models import asset_mapping, des_rule_type_mapping, operator_list
 from websdk2.model_utils import CommonOptView
 
@@ -105,6 +106,7 @@ def get_dynamic_rules_asset(**params) -> dict:
             return dict(code=-10, msg=f"获取失败 {err}")
 
 
+@invalidate_tree_cache
 def refresh_asset(data: dict) -> dict:
     # force  yes/no
     rule_id = data.pop('id')
@@ -182,6 +184,7 @@ def refresh_asset(data: dict) -> dict:
     return dict(code=-10, msg=f"绑定出错")
 
 
+@invalidate_tree_cache
 def del_relational_asset(data: dict) -> dict:
     rule_id = data.pop('id')
 
@@ -7,7 +7,9 @@ from websdk2.sqlalchemy_pagination import paginate
 from models.business import BizModels
 from models import AssetServerModels, AssetMySQLModels, AssetRedisModels, AssetLBModels, TreeAssetModels, AssetNatModels
 from models.domain import DomainRecords
-from websdk2.model_utils import CommonOptView
+from websdk2.model_utils import CommonOptView, model_to_dict
+from websdk2.configs import configs
+from libs.search_index import NGRAM_SIZE, SEARCH_KINDS, search_assets
 
 opt_obj = CommonOptView(BizModels)
 
@@ -79,6 +81,10 @@ def get_asset_list(**params) -> dict:
     page_size = 10  # 固定最多查询
     params['page_size'] = page_size
 
+    # 不足三个字符切不出索引片段，仍走模糊查询
+    if configs.get('search_index_enabled', 'yes') == 'yes' and len(value.strip()) >= NGRAM_SIZE:
+        return get_asset_list_by_index(value.strip(), page_size)
+
     with DBContext('r') as session:
         server_data = paginate(session.query(AssetServerModels).filter(_get_server_value(value)), **params)
         mysql_data = paginate(session.query(AssetMySQLModels).filter(_get_mysql_value(value)), **params)
@@ -106,3 +112,29 @@ def get_tree_asset_data(session, value: str = None, params: dict = None) -> List
     tree_asset_data = [TreeAsset(*item)._asdict() for item in page.items]
     return tree_asset_data
 
+
+def get_asset_list_by_index(value: str, limit: int) -> dict:
+    """先查搜索索引再按实例ID回表，耗时与资产总量无关"""
+    with DBContext('r') as session:
+        data = {kind: search_assets(session, kind, value, limit) for kind in SEARCH_KINDS}
+        tree_asset_data = get_tree_asset_data_by_servers(session, [s.id for s in data['server']], limit)
+    return dict(msg='获取成功', code=0, server_data=[model_to_dict(r) for r in data['server']],
+                mysql_data=[model_to_dict(r) for r in data['mysql']],
+                redis_data=[model_to_dict(r) for r in data['redis']],
+                lb_data=[model_to_dict(r) for r in data['lb']], dns_data=[model_to_dict(r) for r in data['dns']],
+                tree_asset_data=tree_asset_data, nat_data=[model_to_dict(r) for r in data['nat']])
+
+
+def get_tree_asset_data_by_servers(session, server_ids: List[int], limit: int) -> List[Dict[str, Any]]:
+    """服务树上挂载了命中主机的节点"""
+    if not server_ids:
+        return []
+    TreeAsset = namedtuple('TreeAsset', ['biz_id', 'biz_en_name', 'biz_cn_name', 'env_name', 'region_name',
+                                         'module_name', 'inner_ip', 'is_enable'])
+    items = session.query(TreeAssetModels.biz_id, BizModels.biz_en_name, BizModels.biz_cn_name,
+                          TreeAssetModels.env_name, TreeAssetModels.region_name, TreeAssetModels.module_name,
+                          AssetServerModels.inner_ip, TreeAssetModels.is_enable). \
+        outerjoin(BizModels, BizModels.biz_id == TreeAssetModels.biz_id). \
+        outerjoin(AssetServerModels, AssetServerModels.id == TreeAssetModels.asset_id). \
+        filter(TreeAssetModels.asset_type == "server", TreeAssetModels.asset_id.in_(server_ids)).limit(limit).all()
+    return [TreeAsset(*item)._asdict() for item in items]
@@ -12,6 +12,7 @@ from sqlalchemy import or_
 from websdk2.sqlalchemy_pagination import paginate
 from websdk2.db_context import DBContextV2 as DBContext
 from models.tree import TreeModels
+from libs.tree_cache import invalidate_tree_cache
 from models.business import BizModels, SetTempModels
 from websdk2.model_utils import CommonOptView
 
@@ -40,6 +41,7 @@ def get_temp_list(**params):
     return dict(msg='获取成功', code=0, data=page.items, count=page.total)
 
 
+@invalidate_tree_cache
 def set_temp_batch(data: dict) -> dict:
     biz_id = data.get('biz_id')
     env_name = data.get('env_name')
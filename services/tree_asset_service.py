@@ -26,11 +26,13 @@ from models.agent import AgentModels
 from models import asset_mapping as mapping
 from services.audit_service import audit_log
 from services.tree_service import generate_tree_message
+from libs.tree_cache import tree_cache, invalidate_tree_cache
 from libs.api_gateway.jumpserver.asset_hosts import jms_asset_host_api
 from services.asset_server_service import _get_server_by_val, _models_to_list
 
 
 @audit_log()
+@invalidate_tree_cache
 def add_tree_asset_by_api(data: dict) -> dict:
     biz_id = data.get('biz_id')
     env_name = data.get('env_name')
@@ -87,6 +89,7 @@ def add_tree_asset_by_api(data: dict) -> dict:
 
 
 @audit_log()
+@invalidate_tree_cache
 def update_tree_asset_by_api(data: dict) -> dict:
     asset_type = data.get('asset_type', None)
     select_ids = data.get('select_ids', None)
@@ -175,6 +178,7 @@ def get_asset_name_by_tree_asset_id(session, asset_type: str, ids: List[int]) ->
 
 # 删除拓扑
 @audit_log()
+@invalidate_tree_cache
 def del_tree_asset(data: dict) -> dict:
     """
     删除主机
@@ -266,6 +270,7 @@ def delete_jms_asset(data: dict):
                     jms_asset_host_api.delete(asset_id=jms_asset_host_obj[0]['id'], org_id=bg.jms_org_id)
 
 
+@invalidate_tree_cache
 def update_tree_leaf(data: dict) -> dict:
     """
     修改树叶子节点
@@ -329,6 +334,7 @@ def update_tree_leaf(data: dict) -> dict:
     return {"code": 0, "msg": "变更成功"}
 
 
+@invalidate_tree_cache
 def del_tree_leaf(data: dict) -> dict:
     """
     修改树叶子节点
@@ -502,6 +508,7 @@ def get_tree_module_list(**params) -> dict:
     return dict(msg='获取成功', code=0, data=module_list)
 
 
+@invalidate_tree_cache
 def register_asset(data: dict) -> dict:
     mock = {
         "biz_id": "88",
@@ -814,7 +821,8 @@ def get_tree_assets(params: Dict[str, Any]) -> Tuple[list or dict, int]:
         tree_query = session.query(TreeAssetModels).filter_by(**params).filter(
             TreeAssetModels.asset_type == asset_type, TreeAssetModels.asset_id.in_(query_ids)
         )
-        tree_data: List[TreeAssetModels] = tree_query.offset(int(page_number)).limit(int(page_size)).all()
+        tree_data: List[TreeAssetModels] = tree_query.order_by(TreeAssetModels.id).offset(
+            int(page_number)).limit(int(page_size)).all()
         tree_count: int = tree_query.count()
         tree_mapping: Dict[TreeAssetModelsPrimaryID, TreeAssetModels] = {i.id: i for i in tree_data}  # 查询的资源
         # TODO 这里拆分到多个方法里面
@@ -861,6 +869,20 @@ def get_tree_assets(params: Dict[str, Any]) -> Tuple[list or dict, int]:
     return result, tree_count
 
 
+def get_all_tree_assets(params: Dict[str, Any], page_size: int = 1000) -> Tuple[list, int]:
+    """
+    分页取出全部Tree资产，不受单页数量限制
+    :return: (资产列表, 总数)，资产列表比总数少说明中途有数据变化或查询失败
+    """
+    items, page_number = [], 1
+    while True:
+        data, count = get_tree_assets(dict(params, page_size=page_size, page_number=page_number))
+        items.extend(data)
+        if not data or len(items) >= count:
+            return items, count
+        page_number += 1
+
+
 def _get_biz_value(value: str = None):
     if not value:
         return True
@@ -15,6 +15,7 @@ from websdk2.db_context import DBContextV2 as DBContext
 from websdk2.model_utils import model_to_dict, queryset_to_list
 
 from libs.tree import Tree
+from libs.tree_cache import tree_cache, invalidate_tree_cache
 from models.tree import TreeModels, TreeAssetModels
 from models.business import BizModels, SetTempModels
 from services.audit_service import audit_log
@@ -68,6 +69,7 @@ def translate_diff(differences):
 
 
 @audit_log()
+@invalidate_tree_cache
 def add_tree_by_api(data) -> dict:
     biz_id = data.get('biz_id', None)
     node_type = data.get('node_type', None)
@@ -142,6 +144,7 @@ def add_tree_by_api(data) -> dict:
 
 
 @audit_log()
+@invalidate_tree_cache
 def put_tree_by_api(data) -> dict:
     tree_id = data.get('id', None)
     biz_id = data.get("biz_id", None)
@@ -209,6 +212,7 @@ def put_tree_by_api(data) -> dict:
     return {"code": 0, "msg": "更新完成", "audit_log_message": f"用户{modify_user}更新服务树{_message}:, 变化: {differences}"}
 
 
+@invalidate_tree_cache
 def patch_tree_by_api(data) -> dict:
     tree_list = data.get('tree_list', None)  # tree_list = ["id":1, "ext_info":{"xx":"xxx"}]
     tree_id = data.get('tree_id', None)
@@ -228,6 +232,7 @@ def patch_tree_by_api(data) -> dict:
 
 
 @audit_log()
+@invalidate_tree_cache
 def del_tree_by_api(data) -> dict:
     tree_id = data.get('id', None)
     biz_id = data.get('biz_id', None)
@@ -281,16 +286,37 @@ def del_tree_by_api(data) -> dict:
     return {"code": 0, "msg": "节点删除成功", "audit_log_message": audit_log_message}
 
 
+def _get_request_biz(session, biz_id: Optional[str]) -> Dict[str, str]:
+    if not biz_id:
+        return get_all_biz(session)
+    return {biz_id: get_biz_name(session=session, biz_id=biz_id)}
+
+
 def get_tree_by_api(**params) -> dict:
+    """
+    服务树优先读取快照缓存，只有版本变化的业务才重新构建
+    """
     biz_id = params.get('biz_id')
     with DBContext('r') as session:
-        if not biz_id:
-            tree_list = get_tree(session, get_all_biz(session))
-        else:
-            tree_list = get_tree(session, {biz_id: get_biz_name(session=session, biz_id=biz_id)})
+        biz_data = _get_request_biz(session, biz_id)
+        tree_list = tree_cache.get_trees(biz_data, lambda missed: get_tree(session, missed))
     return {"code": 0, "msg": "获取成功", "data": tree_list}
 
 
+def get_tree_etag(**params) -> Optional[str]:
+    """
+    根据业务树版本号生成ETag，不构建树，缓存不可用时返回None
+    """
+    biz_id = params.get('biz_id')
+    try:
+        with DBContext('r') as session:
+            biz_data = _get_request_biz(session, biz_id)
+        return tree_cache.etag(biz_data)
+    except Exception as err:
+        logging.error(f"生成服务树ETag失败: {err}")
+        return None
+
+
 def get_tree_count(session, biz_id: Optional[str], asset_type: Optional[str] = 'server') -> Union[int]:
     """
     获取一个业务有多少主机数量
@@ -364,15 +390,47 @@ def get_all_biz(
     return {biz_id: biz_name for biz_id, biz_name in biz_list}
 
 
-def build_tree(session, biz_id: str, biz_name: str) -> Dict[str, Any]:
+def get_biz_asset_counts(session, biz_ids: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    一次分组查询多个业务的节点主机数量，代替逐个业务调用 get_tree_count/get_env_count/get_node_info
+    :param session:
+    :param biz_ids: 业务ID列表，为空时查询全部业务
+    :return: {biz_id: {"count": 主机数, "env_count": {env: 主机数}, "node_info": {env: {set: {module: 数量}}}}}
+    """
+    query = session.query(TreeAssetModels.biz_id, TreeAssetModels.env_name, TreeAssetModels.region_name,
+                          TreeAssetModels.module_name, TreeAssetModels.asset_type, func.count(TreeAssetModels.asset_id))
+    if biz_ids:
+        query = query.filter(TreeAssetModels.biz_id.in_(biz_ids))
+    node_hosts = query.group_by(TreeAssetModels.biz_id, TreeAssetModels.env_name, TreeAssetModels.region_name,
+                                TreeAssetModels.module_name, TreeAssetModels.asset_type).all()
+
+    mappings: Dict[str, Dict[str, Any]] = {}
+    for _biz_id, _env_name, _set_name, _module_name, _asset_type, _count in node_hosts:
+        biz_info = mappings.setdefault(_biz_id, {"count": 0, "env_count": {}, "node_info": {}})
+        # 业务和环境只统计主机，模块统计所有资产，与原有口径一致
+        if _asset_type == 'server':
+            biz_info["count"] += _count
+            biz_info["env_count"][_env_name] = biz_info["env_count"].get(_env_name, 0) + _count
+        modules = biz_info["node_info"].setdefault(_env_name, {}).setdefault(_set_name, {})
+        modules[_module_name] = modules.get(_module_name, 0) + _count
+    return mappings
+
+
+def build_tree(session, biz_id: str, biz_name: str, asset_counts: Optional[Dict[str, Any]] = None,
+               tree_data: Optional[List[TreeModels]] = None) -> Dict[str, Any]:
     """
     生成树
+    :param asset_counts: get_biz_asset_counts 返回的当前业务统计，为空时单独查询
+    :param tree_data: 当前业务的节点，为空时单独查询
     :return:
     """
-    biz_count: int = get_tree_count(biz_id=biz_id, session=session)
-    env_count: dict = get_env_count(biz_id=biz_id, session=session)
-    node_info: dict = get_node_info(biz_id=biz_id, session=session)
-    tree_data = session.query(TreeModels).filter(TreeModels.biz_id == biz_id).all()
+    if asset_counts is None:
+        asset_counts = get_biz_asset_counts(session, [biz_id]).get(biz_id, {})
+    if tree_data is None:
+        tree_data = session.query(TreeModels).filter(TreeModels.biz_id == biz_id).all()
+    biz_count: int = asset_counts.get("count", 0)
+    env_count: dict = asset_counts.get("env_count", {})
+    node_info: dict = asset_counts.get("node_info", {})
     # 一级默认
     the_tree: List[Dict[str, str]] = [
         {
@@ -407,13 +465,23 @@ def get_tree(
 ) -> List[dict]:
     """
     生成业务树信息返回前端
+    节点和主机数量各一次查询取回，再按业务分组建树
     :param session:
     :param biz_data:
     :return:
     """
+    if not biz_data:
+        return []
+    biz_ids = list(biz_data.keys())
+    asset_counts = get_biz_asset_counts(session, biz_ids)
+    tree_nodes: Dict[str, List[TreeModels]] = {}
+    for item in session.query(TreeModels).filter(TreeModels.biz_id.in_(biz_ids)).all():
+        tree_nodes.setdefault(item.biz_id, []).append(item)
+
     tree_list: List[Dict[str, Any]] = []
     for biz_id, biz_name in biz_data.items():
-        tree_list.append(build_tree(session, biz_id, biz_name))
+        tree_list.append(build_tree(session, biz_id, biz_name, asset_counts.get(biz_id, {}),
+                                    tree_nodes.get(biz_id, [])))
     return tree_list
 
 
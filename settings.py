@@ -45,17 +45,47 @@ DEFAULT_CONSUL_HOST = os.getenv("DEFAULT_CONSUL_HOST", "")  # 修改
 DEFAULT_CONSUL_PORT = os.getenv("DEFAULT_CONSUL_PORT", 8500)  # 修改
 DEFAULT_CONSUL_TOKEN = os.getenv("DEFAULT_CONSUL_TOKEN", None)  # 修改
 DEFAULT_CONSUL_SCHEME = os.getenv("DEFAULT_CONSUL_SCHEME", "http")  # 修改
+CONSUL_SYNC_WORKERS = os.getenv("CONSUL_SYNC_WORKERS", 10)  # 差异同步并发注册数
+DOMAIN_SYNC_WORKERS = os.getenv("DOMAIN_SYNC_WORKERS", 5)  # 云解析同步并发域名数
+
+# 后台任务线程池, 格式 名称:线程数, 未配置的线程池使用代码中的默认值 / 每个线程池最大排队任务数
+THREAD_POOL_SIZES = os.getenv(
+    "THREAD_POOL_SIZES", "cloud:10,general:5,biz:2,consul:1,agent:1,domain:1,vswitch:2,jms:2,cloud_manual:3"
+)
+THREAD_POOL_MAX_QUEUE = os.getenv("THREAD_POOL_MAX_QUEUE", 100)
+AGENT_FULL_SYNC_INTERVAL = os.getenv("AGENT_FULL_SYNC_INTERVAL", 3600)  # agent状态全量对账间隔(秒), 期间只按上下线差异更新
+AGENT_EVENT_MAXLEN = os.getenv("AGENT_EVENT_MAXLEN", 100000)  # agent上下线事件流保留条数
+SEARCH_INDEX_ENABLED = os.getenv("SEARCH_INDEX_ENABLED", "yes")  # 全局搜索走倒排索引, 不足3个字符仍走模糊查询
+SEARCH_INDEX_CANDIDATES = os.getenv("SEARCH_INDEX_CANDIDATES", 100)  # 每类资产最多回表校验的候选数
+# VMware属性收集器每页虚拟机数 / 是否保留会话按版本号增量获取变更 / 增量会话重建(全量对账)间隔秒数
+VMWARE_PAGE_SIZE = os.getenv("VMWARE_PAGE_SIZE", 500)
+VMWARE_INCREMENTAL = os.getenv("VMWARE_INCREMENTAL", "yes")
+VMWARE_FULL_SYNC_INTERVAL = os.getenv("VMWARE_FULL_SYNC_INTERVAL", 21600)
+PVE_AGENT_WORKERS = os.getenv("PVE_AGENT_WORKERS", 20)  # PVE guest agent 并发查询数
+PVE_AGENT_TIMEOUT = os.getenv("PVE_AGENT_TIMEOUT", 3)  # PVE guest agent 单台查询超时(秒)
+CLOUD_CREDENTIAL_TTL = os.getenv("CLOUD_CREDENTIAL_TTL", 300)  # 解密后的云账号凭证进程内缓存秒数
+CLOUD_CLIENT_CACHE_SIZE = os.getenv("CLOUD_CLIENT_CACHE_SIZE", 64)  # 每个线程缓存的云SDK客户端数量
+CMP_PRICE_CACHE_TTL = os.getenv("CMP_PRICE_CACHE_TTL", 600)  # 申购询价结果缓存秒数
+CMP_CATALOG_SYNC_INTERVAL = os.getenv("CMP_CATALOG_SYNC_INTERVAL", 21600)  # 申购实例类型目录同步间隔秒数
+CBB_BIG_AREA_CACHE_TTL = os.getenv("CBB_BIG_AREA_CACHE_TTL", 60)  # GMT大区列表缓存秒数，过期后后台刷新
+CBB_BIG_AREA_MAX_STALE = os.getenv("CBB_BIG_AREA_MAX_STALE", 600)  # GMT大区列表最长使用旧数据秒数
+CBB_BIG_AREA_FETCH_SIZE = os.getenv("CBB_BIG_AREA_FETCH_SIZE", 10000)  # 单个环境拉取大区数量上限
 
 # 和其他系统交互使用
 api_gw = os.getenv("CODO_API_GW", "")  # 网关
 settings_auth_key = os.getenv("CODO_AUTH_KEY", "")  # 服务之间认证token
 # 资产变更通知webhook
 asset_change_notify = {}
+ASSET_SNAPSHOT_CHUNK_SIZE = os.getenv("ASSET_SNAPSHOT_CHUNK_SIZE", 1000)  # 资产快照每批读取数量
+ASSET_SNAPSHOT_KEEP_DAYS = os.getenv("ASSET_SNAPSHOT_KEEP_DAYS", 60)  # 资产快照保留天数
+ASSET_CHANGE_CARD_LIMIT = os.getenv("ASSET_CHANGE_CARD_LIMIT", 100)  # 变更通知每类最多展示台数
 
 # JumpServer配置
 JMS_API_BASE_URL = os.getenv("JMS_API_BASE_URL", "")
 JMS_API_KEY_ID = os.getenv("JMS_API_KEY_ID", "")
 JMS_API_KEY_SECRET = os.getenv("JMS_API_KEY_SECRET", "")
+JMS_SYNC_WORKERS = os.getenv("JMS_SYNC_WORKERS", 10)  # 资产对账并发请求数，也是连接池大小
+JMS_SYNC_PRUNE = os.getenv("JMS_SYNC_PRUNE", "no")  # 对账时是否删除服务树中已不存在的主机
 
 # 内网交换机配置
 SWITCH_COMMUNITY = os.getenv("SWITCH_COMMUNITY", "")  # 交换机 公共团体字符串
@@ -67,6 +97,36 @@ SWITCH_SN_OID = os.getenv("SWITCH_SN_OID", "")  # 交换机序列号oid
 KAFKA_BOOTSTRAP_SERVERS = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "")
 KAFKA_CLIENT_ID = os.getenv("KAFKA_CLIENT_ID", "")
 KAFKA_TOPIC = os.getenv("KAFKA_TOPIC", "")
+# 异步批量发送, 攒批等待毫秒 / 每批消息数 / 本地队列上限, broker不可用时消息落盘, 恢复后重发
+KAFKA_ASYNC = os.getenv("KAFKA_ASYNC", "yes")
+KAFKA_LINGER_MS = os.getenv("KAFKA_LINGER_MS", 50)
+KAFKA_BATCH_SIZE = os.getenv("KAFKA_BATCH_SIZE", 500)
+KAFKA_BUFFER_MAX_MESSAGES = os.getenv("KAFKA_BUFFER_MAX_MESSAGES", 10000)
+KAFKA_SPILL_PATH = os.getenv("KAFKA_SPILL_PATH", "/tmp/cmdb_kafka_spill.log")
+KAFKA_SPILL_MAX_MB = os.getenv("KAFKA_SPILL_MAX_MB", 100)
+KAFKA_REPLAY_MAX_ATTEMPTS = os.getenv("KAFKA_REPLAY_MAX_ATTEMPTS", 5)  # 消息投递失败次数上限，超过后写入死信文件
+KAFKA_REPLAY_MAX_BACKOFF = os.getenv("KAFKA_REPLAY_MAX_BACKOFF", 600)  # 落盘消息重发的最大间隔秒数
+
+# 资产同步批量写入配置, 每批写入行数 / 每批IN预查询ID数量
+SYNC_UPSERT_BATCH_SIZE = os.getenv("SYNC_UPSERT_BATCH_SIZE", 500)
+SYNC_PREFETCH_CHUNK_SIZE = os.getenv("SYNC_PREFETCH_CHUNK_SIZE", 1000)
+
+# 资产同步调度, 全局并发上限 / 每个云厂商每秒启动的同步单元数 / 每个账号每秒启动的同步单元数
+SYNC_MAX_CONCURRENCY = os.getenv("SYNC_MAX_CONCURRENCY", 20)
+SYNC_PROVIDER_RATE_LIMIT = os.getenv("SYNC_PROVIDER_RATE_LIMIT", "aliyun:10,qcloud:10,volc:5,aws:10,gcp:5")
+SYNC_ACCOUNT_RATE_LIMIT = os.getenv("SYNC_ACCOUNT_RATE_LIMIT", 5)
+# 异步采集执行云SDK阻塞调用的共享线程数
+SYNC_SDK_MAX_WORKERS = os.getenv("SYNC_SDK_MAX_WORKERS", 64)
+# 异步采集分页写库的共享线程数，写库不占用事件循环线程
+SYNC_WRITE_MAX_WORKERS = os.getenv("SYNC_WRITE_MAX_WORKERS", 8)
+# 增量同步, 开关 / 全量对账间隔(分钟) / 事件回溯重叠时间(分钟, 审计日志投递有延迟)
+SYNC_INCREMENTAL = os.getenv("SYNC_INCREMENTAL", "yes")
+SYNC_FULL_INTERVAL = os.getenv("SYNC_FULL_INTERVAL", 360)
+SYNC_EVENT_OVERLAP = os.getenv("SYNC_EVENT_OVERLAP", 10)
+
+# 服务树快照缓存, Redis快照过期时间(秒) / 进程内LRU缓存的业务数
+TREE_CACHE_TTL = os.getenv("TREE_CACHE_TTL", 600)
+TREE_CACHE_LRU_SIZE = os.getenv("TREE_CACHE_LRU_SIZE", 256)
 
 # Sync GCP to CMDB
 GCP_SYNC = os.getenv("GCP_SYNC", "no")
@@ -105,6 +165,9 @@ settings = dict(
     expire_seconds=expire_seconds,
     api_gw=api_gw,
     asset_change_notify=asset_change_notify,
+    asset_snapshot_chunk_size=ASSET_SNAPSHOT_CHUNK_SIZE,
+    asset_snapshot_keep_days=ASSET_SNAPSHOT_KEEP_DAYS,
+    asset_change_card_limit=ASSET_CHANGE_CARD_LIMIT,
     settings_auth_key=settings_auth_key,
     switch_community=SWITCH_COMMUNITY,
     switch_model_oid=SWITCH_MODEL_OID,
@@ -114,7 +177,49 @@ settings = dict(
     kafka_client_id=KAFKA_CLIENT_ID,
     ignore_tree_alert_keywords=INGORE_TREE_ALERT_KEYWORDS,
     kafka_topic=KAFKA_TOPIC,
+    kafka_async=KAFKA_ASYNC,
+    kafka_linger_ms=KAFKA_LINGER_MS,
+    kafka_batch_size=KAFKA_BATCH_SIZE,
+    kafka_buffer_max_messages=KAFKA_BUFFER_MAX_MESSAGES,
+    kafka_spill_path=KAFKA_SPILL_PATH,
+    kafka_spill_max_mb=KAFKA_SPILL_MAX_MB,
+    kafka_replay_max_attempts=KAFKA_REPLAY_MAX_ATTEMPTS,
+    kafka_replay_max_backoff=KAFKA_REPLAY_MAX_BACKOFF,
     gcp_sync=GCP_SYNC,
+    sync_upsert_batch_size=SYNC_UPSERT_BATCH_SIZE,
+    sync_prefetch_chunk_size=SYNC_PREFETCH_CHUNK_SIZE,
+    sync_max_concurrency=SYNC_MAX_CONCURRENCY,
+    sync_provider_rate_limit=SYNC_PROVIDER_RATE_LIMIT,
+    sync_account_rate_limit=SYNC_ACCOUNT_RATE_LIMIT,
+    sync_sdk_max_workers=SYNC_SDK_MAX_WORKERS,
+    sync_write_max_workers=SYNC_WRITE_MAX_WORKERS,
+    sync_incremental=SYNC_INCREMENTAL,
+    sync_full_interval=SYNC_FULL_INTERVAL,
+    sync_event_overlap=SYNC_EVENT_OVERLAP,
+    tree_cache_ttl=TREE_CACHE_TTL,
+    tree_cache_lru_size=TREE_CACHE_LRU_SIZE,
+    consul_sync_workers=CONSUL_SYNC_WORKERS,
+    domain_sync_workers=DOMAIN_SYNC_WORKERS,
+    thread_pool_sizes=THREAD_POOL_SIZES,
+    thread_pool_max_queue=THREAD_POOL_MAX_QUEUE,
+    agent_full_sync_interval=AGENT_FULL_SYNC_INTERVAL,
+    agent_event_maxlen=AGENT_EVENT_MAXLEN,
+    search_index_enabled=SEARCH_INDEX_ENABLED,
+    search_index_candidates=SEARCH_INDEX_CANDIDATES,
+    vmware_page_size=VMWARE_PAGE_SIZE,
+    vmware_incremental=VMWARE_INCREMENTAL,
+    vmware_full_sync_interval=VMWARE_FULL_SYNC_INTERVAL,
+    pve_agent_workers=PVE_AGENT_WORKERS,
+    pve_agent_timeout=PVE_AGENT_TIMEOUT,
+    cloud_credential_ttl=CLOUD_CREDENTIAL_TTL,
+    cloud_client_cache_size=CLOUD_CLIENT_CACHE_SIZE,
+    cmp_price_cache_ttl=CMP_PRICE_CACHE_TTL,
+    cmp_catalog_sync_interval=CMP_CATALOG_SYNC_INTERVAL,
+    cbb_big_area_cache_ttl=CBB_BIG_AREA_CACHE_TTL,
+    cbb_big_area_max_stale=CBB_BIG_AREA_MAX_STALE,
+    cbb_big_area_fetch_size=CBB_BIG_AREA_FETCH_SIZE,
+    jms_sync_workers=JMS_SYNC_WORKERS,
+    jms_sync_prune=JMS_SYNC_PRUNE,
     volc_billing_threshold=VOLC_BILLING_THRESHOLD,
     qcloud_billing_threshold=QCLOUD_BILLING_THRESHOLD,
     aliyun_billing_threshold=ALIYUN_BILLING_THRESHOLD,
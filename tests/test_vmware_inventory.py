@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Desc  : VMware 属性收集器分页与增量合并，使用录制的响应代替 vCenter
+"""
+
+from types import SimpleNamespace as NS
+
+import pytest
+
+pytest.importorskip("pyVmomi")
+pytest.importorskip("websdk2")
+
+from libs.vmware import host  # noqa: E402
+
+
+def _obj(mo_id, **props):
+    return NS(obj=NS(_moId=mo_id), propSet=[NS(name=k, val=v) for k, v in props.items()])
+
+
+def _update(mo_id, kind, **props):
+    change_set = [NS(name=k, op="assign" if v is not None else "remove", val=v) for k, v in props.items()]
+    return NS(obj=NS(_moId=mo_id), kind=kind, changeSet=change_set)
+
+
+def _update_set(version, updates, truncated=False):
+    return NS(version=version, truncated=truncated, filterSet=[NS(objectSet=updates)])
+
+
+class RecordedCollector:
+    """按调用顺序返回录制好的 RetrievePropertiesEx / WaitForUpdatesEx 响应"""
+
+    def __init__(self, pages=None, update_sets=None):
+        self.pages = list(pages or [])
+        self.update_sets = list(update_sets or [])
+        self.tokens = []
+        self.versions = []
+
+    def RetrievePropertiesEx(self, specs, options):
+        return self.pages.pop(0)
+
+    def ContinueRetrievePropertiesEx(self, token):
+        self.tokens.append(token)
+        return self.pages.pop(0)
+
+    def CreateFilter(self, spec, partialUpdates):
+        return NS()
+
+    def WaitForUpdatesEx(self, version, options):
+        self.versions.append(version)
+        return self.update_sets.pop(0) if self.update_sets else None
+
+
+def _inventory(collector) -> host.VMInventory:
+    inventory = host.VMInventory.__new__(host.VMInventory)
+    inventory.page_size = 2
+    inventory.collector = collector
+    inventory.filter = None
+    inventory.version = None
+    inventory.vms = {}
+    inventory._filter_spec = lambda: None
+    return inventory
+
+
+def test_retrieve_all_follows_tokens():
+    collector = RecordedCollector(pages=[
+        NS(objects=[_obj("vm-1", **{"summary.config.name": "a"}), _obj("vm-2")], token="t1"),
+        NS(objects=[_obj("vm-3")], token=None),
+    ])
+    vms = _inventory(collector).retrieve_all()
+    assert sorted(vms) == ["vm-1", "vm-2", "vm-3"]
+    assert vms["vm-1"] == {"summary.config.name": "a"}
+    assert collector.tokens == ["t1"]
+
+
+def test_wait_updates_merges_enter_modify_leave():
+    collector = RecordedCollector(update_sets=[
+        # 首次同步：全部虚拟机以 enter 返回，分两批(truncated)
+        _update_set("1", [_update("vm-1", "enter", **{"summary.config.name": "a"})], truncated=True),
+        _update_set("2", [
+            _update("vm-2", "enter", **{"summary.config.name": "b", "summary.guest.ipAddress": "10.0.0.2"}),
+        ]),
+        # 第二次同步：vm-1 改名，vm-2 的IP被移除，vm-3 新建后立即删除
+        _update_set("3", [
+            _update("vm-1", "modify", **{"summary.config.name": "a2"}),
+            _update("vm-2", "modify", **{"summary.guest.ipAddress": None}),
+            _update("vm-3", "enter", **{"summary.config.name": "c"}),
+            _update("vm-3", "leave"),
+        ]),
+    ])
+    inventory = _inventory(collector)
+
+    assert inventory.wait_updates() == {"vm-1", "vm-2"}
+    assert inventory.version == "2"
+
+    assert inventory.wait_updates() == {"vm-1", "vm-2"}
+    assert inventory.version == "3"
+    assert inventory.vms == {
+        "vm-1": {"summary.config.name": "a2"},
+        "vm-2": {"summary.config.name": "b"},
+    }
+    assert collector.versions == ["", "1", "2"]
+
+    # 没有变更时 WaitForUpdatesEx 返回 None
+    assert inventory.wait_updates() == set()
+    assert inventory.version == "3"
+
+
+def test_failed_write_drops_incremental_session(monkeypatch):
+    inventory = _inventory(RecordedCollector(update_sets=[
+        _update_set("1", [_update("vm-1", "enter", **{"summary.config.instanceUuid": "uuid-1"})]),
+    ]))
+    closed = []
+    inventory.close = lambda: closed.append(True)
+
+    api = host.VMWareHostAPI("user", "pwd", "account", "vcenter:443")
+    api.incremental = True
+    host._inventories[api._key] = inventory
+    monkeypatch.setattr(api, "_get_inventory", lambda: inventory)
+    monkeypatch.setattr(host, "server_task_batch", lambda **kwargs: (False, "db error"))
+    monkeypatch.setattr(host, "mark_expired_by_sync", lambda **kwargs: None)
+
+    assert api.sync_cmdb() == (False, "db error")
+    assert api._key not in host._inventories
+    assert closed == [True]